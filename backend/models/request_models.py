@@ -3,7 +3,8 @@ Request models for MediSync Healthcare API
 """
 
 from pydantic import BaseModel, validator
-from typing import Optional
+from typing import Optional, List
+from datetime import datetime
 import re
 
 class SendOTPRequest(BaseModel):
@@ -51,8 +52,9 @@ class VerifyOTPRequest(BaseModel):
     
     @validator('otp')
     def validate_otp(cls, v):
-        if not v or len(v) != 6 or not v.isdigit():
-            raise ValueError('OTP must be 6 digits')
+        # Length and alphabet are configurable (OTP_LENGTH, OTP_ALPHABET)
+        if not v or not 4 <= len(v) <= 12 or not (v.isascii() and v.isalnum()):
+            raise ValueError('OTP must be 4-12 letters or digits')
         return v
 
 class PatientLoginRequest(BaseModel):
@@ -203,4 +205,337 @@ class DoctorRegisterRequest(BaseModel):
             raise ValueError('Password must contain at least one lowercase letter')
         if not re.search(r'\d', v):
             raise ValueError('Password must contain at least one digit')
-        return v
\ No newline at end of file
+        return v
+
+
+class SymptomCheckRequest(BaseModel):
+    message: str
+    
+    @validator('message')
+    def validate_message(cls, v):
+        if not v or not v.strip():
+            raise ValueError('Message is required')
+        if len(v) > 2000:
+            raise ValueError('Message must be at most 2000 characters')
+        return v.strip()
+
+class PathologyReportUpload(BaseModel):
+    patient_id: str
+    date: str
+    summary: str
+    lab_name: Optional[str] = None
+    test_type: Optional[str] = None
+    
+    @validator('patient_id', 'summary')
+    def validate_required(cls, v):
+        if not v or not v.strip():
+            raise ValueError('Field is required')
+        return v.strip()
+    
+    @validator('date')
+    def validate_date(cls, v):
+        try:
+            datetime.strptime(v, '%Y-%m-%d')
+        except ValueError:
+            raise ValueError('Date must be in YYYY-MM-DD format')
+        return v
+
+class PathologyBulkUploadRequest(BaseModel):
+    reports: List[PathologyReportUpload]
+    
+    @validator('reports')
+    def validate_reports(cls, v):
+        if not v:
+            raise ValueError('At least one report is required')
+        if len(v) > 10000:
+            raise ValueError('At most 10000 reports per upload')
+        return v
+
+class ConsentCreateRequest(BaseModel):
+    # The requesting doctor is the signed-in session
+    patient_id: str
+    
+    @validator('patient_id')
+    def validate_patient_id(cls, v):
+        if not v or not v.strip():
+            raise ValueError('Patient ID is required')
+        return v.strip()
+
+class ConsentDecisionRequest(BaseModel):
+    # The deciding patient is the signed-in session
+    approve: bool
+
+class RefreshTokenRequest(BaseModel):
+    refresh_token: str
+    
+    @validator('refresh_token')
+    def validate_refresh_token(cls, v):
+        if not v or not v.strip():
+            raise ValueError('Refresh token is required')
+        return v.strip()
+
+class PatientProfileUpdateRequest(BaseModel):
+    name: Optional[str] = None
+    email: Optional[str] = None
+    address: Optional[str] = None
+    age: Optional[int] = None
+    weight: Optional[str] = None
+    height: Optional[str] = None
+    allergies: Optional[str] = None
+    chronic: Optional[str] = None
+    
+    @validator('name')
+    def validate_name(cls, v):
+        if v is None:
+            return v
+        if len(v.strip()) < 2:
+            raise ValueError('Name must be at least 2 characters')
+        return v.strip()
+    
+    @validator('email')
+    def validate_email(cls, v):
+        if v is None:
+            return v
+        email_pattern = r'^[^\s@]+@[^\s@]+\.[^\s@]+$'
+        if not re.match(email_pattern, v):
+            raise ValueError('Invalid email format')
+        return v.lower()
+    
+    @validator('address')
+    def validate_address(cls, v):
+        if v is None:
+            return v
+        if len(v.strip()) < 10:
+            raise ValueError('Address must be at least 10 characters')
+        return v.strip()
+    
+    @validator('age')
+    def validate_age(cls, v):
+        if v is None:
+            return v
+        if not 0 < v < 130:
+            raise ValueError('Age must be between 1 and 129')
+        return v
+
+class DoctorProfileUpdateRequest(BaseModel):
+    name: Optional[str] = None
+    email: Optional[str] = None
+    specialization: Optional[str] = None
+    location: Optional[str] = None
+    
+    @validator('name', 'specialization', 'location')
+    def validate_text(cls, v):
+        if v is None:
+            return v
+        if len(v.strip()) < 2:
+            raise ValueError('Must be at least 2 characters')
+        return v.strip()
+    
+    @validator('email')
+    def validate_email(cls, v):
+        if v is None:
+            return v
+        email_pattern = r'^[^\s@]+@[^\s@]+\.[^\s@]+$'
+        if not re.match(email_pattern, v):
+            raise ValueError('Invalid email format')
+        return v.lower()
+
+class RecordCreateRequest(BaseModel):
+    title: str
+    description: Optional[str] = None
+    prescription: Optional[str] = None
+    tests_recommended: Optional[str] = None
+    notes: Optional[str] = None
+    doctorName: Optional[str] = None
+    date: Optional[str] = None
+    fileUrl: Optional[str] = None
+    
+    @validator('title')
+    def validate_title(cls, v):
+        if not v or not v.strip():
+            raise ValueError('Title is required')
+        if len(v) > 200:
+            raise ValueError('Title must be at most 200 characters')
+        return v.strip()
+    
+    # Every field is capped: 20000 characters are at most 10000 tokens, well inside the search index's per-field limit
+    @validator('description', 'prescription', 'tests_recommended', 'notes')
+    def validate_text(cls, v):
+        if v is not None and len(v) > 20000:
+            raise ValueError('Field must be at most 20000 characters')
+        return v
+    
+    @validator('doctorName', 'fileUrl')
+    def validate_short_text(cls, v):
+        if v is not None and len(v) > 2000:
+            raise ValueError('Field must be at most 2000 characters')
+        return v
+    
+    @validator('date')
+    def validate_date(cls, v):
+        if v is not None:
+            try:
+                datetime.strptime(v, '%Y-%m-%d')
+            except ValueError:
+                raise ValueError('Date must be in YYYY-MM-DD format')
+        return v
+
+class RecordUpdateRequest(RecordCreateRequest):
+    title: Optional[str] = None
+    
+    @validator('title')
+    def validate_title(cls, v):
+        if v is not None and not v.strip():
+            raise ValueError('Title cannot be empty')
+        if v is not None and len(v) > 200:
+            raise ValueError('Title must be at most 200 characters')
+        return v.strip() if v is not None else v
+
+class TimingToggleRequest(BaseModel):
+    enabled: bool
+
+class ProfileRequest(BaseModel):
+    requests: int = 20
+    sort: str = "cumulative"
+    limit: int = 30
+    
+    @validator('requests')
+    def validate_requests(cls, v):
+        if not 1 <= v <= 1000:
+            raise ValueError('Requests must be between 1 and 1000')
+        return v
+    
+    @validator('sort')
+    def validate_sort(cls, v):
+        if v not in ['cumulative', 'tottime', 'ncalls']:
+            raise ValueError('Sort must be cumulative, tottime or ncalls')
+        return v
+    
+    @validator('limit')
+    def validate_limit(cls, v):
+        if not 1 <= v <= 200:
+            raise ValueError('Limit must be between 1 and 200')
+        return v
+
+class SMSEmulatorConfigRequest(BaseModel):
+    latency: Optional[float] = None
+    latency_distribution: Optional[str] = None
+    jitter: Optional[float] = None
+    spike_rate: Optional[float] = None
+    spike_latency: Optional[float] = None
+    error_rate: Optional[float] = None
+    throttle_rate: Optional[float] = None
+    max_rps: Optional[float] = None
+    
+    @validator('latency', 'jitter', 'spike_latency')
+    def validate_seconds(cls, v):
+        if v is not None and not 0 <= v <= 60:
+            raise ValueError('Must be between 0 and 60')
+        return v
+    
+    @validator('latency_distribution')
+    def validate_distribution(cls, v):
+        if v is not None and v not in ['fixed', 'uniform', 'exponential', 'lognormal']:
+            raise ValueError('Latency distribution must be fixed, uniform, exponential or lognormal')
+        return v
+    
+    @validator('spike_rate', 'error_rate', 'throttle_rate')
+    def validate_rate(cls, v):
+        if v is not None and not 0 <= v <= 1:
+            raise ValueError('Rate must be between 0 and 1')
+        return v
+    
+    @validator('max_rps')
+    def validate_max_rps(cls, v):
+        if v is not None and v < 0:
+            raise ValueError('Max RPS must not be negative')
+        return v
+
+class MemorySnapshotRequest(BaseModel):
+    frames: int = 1
+    limit: int = 20
+    
+    @validator('frames')
+    def validate_frames(cls, v):
+        if not 1 <= v <= 25:
+            raise ValueError('Frames must be between 1 and 25')
+        return v
+    
+    @validator('limit')
+    def validate_limit(cls, v):
+        if not 1 <= v <= 200:
+            raise ValueError('Limit must be between 1 and 200')
+        return v
+
+class VitalReadingInput(BaseModel):
+    metric: str
+    value: str
+    recorded_at: Optional[float] = None
+    
+    @validator('metric', 'value')
+    def validate_required(cls, v):
+        if not v or not v.strip():
+            raise ValueError('Field is required')
+        if len(v) > 50:
+            raise ValueError('Field must be at most 50 characters')
+        return v.strip()
+    
+    @validator('recorded_at')
+    def validate_recorded_at(cls, v):
+        if v is not None and not 0 <= v <= 2 ** 40:
+            raise ValueError('recorded_at must be a Unix timestamp in seconds')
+        return v
+
+class VitalsRecordRequest(BaseModel):
+    readings: List[VitalReadingInput]
+    
+    @validator('readings')
+    def validate_readings(cls, v):
+        if not v:
+            raise ValueError('At least one reading is required')
+        if len(v) > 10000:
+            raise ValueError('At most 10000 readings per upload')
+        return v
+
+class AppointmentBookRequest(BaseModel):
+    doctor_id: str
+    start: int
+    duration_minutes: Optional[int] = None
+    
+    @validator('doctor_id')
+    def validate_doctor_id(cls, v):
+        if not v or not v.strip():
+            raise ValueError('Doctor ID is required')
+        return v.strip()
+    
+    @validator('duration_minutes')
+    def validate_duration(cls, v):
+        if v is not None and not 1 <= v <= 480:
+            raise ValueError('Duration must be between 1 and 480 minutes')
+        return v
+
+class AppointmentAutoBookRequest(BaseModel):
+    specialization: str
+    city: str
+    after: Optional[int] = None
+    duration_minutes: Optional[int] = None
+    
+    @validator('specialization', 'city')
+    def validate_required(cls, v):
+        if not v or not v.strip():
+            raise ValueError('Field is required')
+        if len(v) > 100:
+            raise ValueError('Field must be at most 100 characters')
+        return v.strip()
+    
+    @validator('after')
+    def validate_after(cls, v):
+        if v is not None and not 0 <= v <= 2 ** 40:
+            raise ValueError('after must be a Unix timestamp in seconds')
+        return v
+    
+    @validator('duration_minutes')
+    def validate_duration(cls, v):
+        if v is not None and not 1 <= v <= 480:
+            raise ValueError('Duration must be between 1 and 480 minutes')
+        return v
@@ -3,17 +3,24 @@ Response models for MediSync Healthcare API
 """
 
 from pydantic import BaseModel
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 
 class SendOTPResponse(BaseModel):
     success: bool
     message: str
     expires_in: int  # seconds
 
+class SessionTokens(BaseModel):
+    access_token: str
+    refresh_token: str
+    token_type: str
+    expires_in: int  # seconds
+
 class VerifyOTPResponse(BaseModel):
     success: bool
     message: str
     user_data: Optional[Dict[str, Any]] = None
+    tokens: Optional[SessionTokens] = None
 
 class RegisterResponse(BaseModel):
     success: bool
@@ -28,4 +35,209 @@ class LoginResponse(BaseModel):
 class ErrorResponse(BaseModel):
     success: bool = False
     message: str
-    error_code: Optional[str] = None
\ No newline at end of file
+    error_code: Optional[str] = None
+
+class HospitalResult(BaseModel):
+    name: str
+    address: str
+    phone: str
+    specialty: str
+    rating: str
+    latitude: float
+    longitude: float
+    distance_km: float
+    distance: str  # human readable, e.g. "0.8 km"
+
+class HospitalSearchResponse(BaseModel):
+    success: bool
+    count: int
+    hospitals: List[HospitalResult]
+
+class SymptomMatch(BaseModel):
+    symptom: str
+    severity: int  # 1 (self care) to 5 (emergency)
+    matched_terms: List[str]
+
+class SymptomCheckResponse(BaseModel):
+    success: bool
+    response: str
+    triage_level: str
+    matches: List[SymptomMatch]
+
+class DoctorSearchResult(BaseModel):
+    id: str
+    name: str
+    specialization: str
+    location: str
+    score: float
+
+class DoctorSearchResponse(BaseModel):
+    success: bool
+    total: int
+    page: int
+    page_size: int
+    results: List[DoctorSearchResult]
+
+class DoctorSuggestion(BaseModel):
+    value: str
+    count: int
+
+class DoctorSuggestResponse(BaseModel):
+    success: bool
+    suggestions: List[DoctorSuggestion]
+
+class PathologyIngestResponse(BaseModel):
+    success: bool
+    reports_ingested: int
+    results_parsed: int
+    # Results for new analyte names once the ad-hoc analyte table is full
+    results_skipped: int = 0
+    flags: Dict[str, int]  # low / normal / high / unknown
+    elapsed_ms: float
+
+class PathologyTrendPoint(BaseModel):
+    date: str
+    value: float
+    unit: str
+    flag: str
+    lab_name: Optional[str] = None
+
+class PathologyTrendResponse(BaseModel):
+    success: bool
+    patient_id: str
+    analyte: str
+    reference_range: Optional[Dict[str, Any]] = None
+    points: List[PathologyTrendPoint]
+
+class ConsentRequestData(BaseModel):
+    id: str
+    doctor_id: str
+    patient_id: str
+    status: str  # pending / approved / denied / expired / revoked
+    created_at: float
+    decided_at: Optional[float] = None
+    # When an approval stops granting access
+    expires_at: Optional[float] = None
+
+class ConsentResponse(BaseModel):
+    success: bool
+    request: ConsentRequestData
+
+class ConsentListResponse(BaseModel):
+    success: bool
+    requests: List[ConsentRequestData]
+
+class MedicalRecord(BaseModel):
+    id: str
+    patient_id: str
+    date: str
+    title: str
+    description: str
+    prescription: str
+    tests_recommended: str
+    notes: str
+    doctorName: str
+    fileUrl: str
+    author_id: Optional[str] = None
+    created_at: float
+    updated_at: float
+    version: int
+
+class RecordResponse(BaseModel):
+    success: bool
+    record: MedicalRecord
+
+class RecordListResponse(BaseModel):
+    success: bool
+    records: List[MedicalRecord]
+
+class RecordSearchHit(BaseModel):
+    score: float
+    record: MedicalRecord
+
+class RecordSearchResponse(BaseModel):
+    success: bool
+    total: int
+    results: List[RecordSearchHit]
+
+class VitalsRecordResponse(BaseModel):
+    success: bool
+    recorded: int
+    errors: List[Dict[str, Any]]  # index / error of each rejected reading
+
+class VitalsLatestResponse(BaseModel):
+    success: bool
+    patient_id: str
+    vitals: Dict[str, Dict[str, Any]]  # metric -> value / unit / recorded_at / count
+
+class VitalBucket(BaseModel):
+    start: int
+    count: int
+    min: float
+    max: float
+    avg: float
+
+class VitalsSeriesResponse(BaseModel):
+    success: bool
+    patient_id: str
+    metric: str
+    unit: str
+    start: int
+    end: int
+    bucket_seconds: int
+    total: int
+    buckets: List[VitalBucket]
+
+class VitalReading(BaseModel):
+    time: int
+    value: float
+
+class VitalsReadingsResponse(BaseModel):
+    success: bool
+    patient_id: str
+    metric: str
+    unit: str
+    total: int
+    readings: List[VitalReading]
+
+class AppointmentSlot(BaseModel):
+    doctor_id: str
+    doctor_name: Optional[str] = None
+    specialization: Optional[str] = None
+    location: Optional[str] = None
+    start: int  # Unix seconds
+    end: int
+
+class AppointmentSlotResponse(BaseModel):
+    success: bool
+    slot: Optional[AppointmentSlot] = None  # None when nothing is free within the booking horizon
+
+class Appointment(BaseModel):
+    id: str
+    doctor_id: str
+    patient_id: str
+    start: int
+    end: int
+    status: str  # booked / cancelled
+    created_at: float
+    cancelled_at: Optional[float] = None
+
+class AppointmentResponse(BaseModel):
+    success: bool
+    appointment: Appointment
+
+class AppointmentListResponse(BaseModel):
+    success: bool
+    appointments: List[Appointment]
+
+class SessionResponse(BaseModel):
+    success: bool
+    tokens: SessionTokens
+
+class SessionInfoResponse(BaseModel):
+    success: bool
+    user_id: str
+    role: str
+    phone: str
+    session_id: str
+    expires_at: int
@@ -3,37 +3,195 @@ MediSync Healthcare Platform - FastAPI Backend Server
 Handles OTP verification using Twilio for patient and doctor authentication
 """
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Depends, Header, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, Response
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from contextlib import asynccontextmanager
 import uvicorn
 from dotenv import load_dotenv
+from typing import Optional, Dict, Any, Union
+import asyncio
+import hmac
+from urllib.parse import parse_qsl
 import os
 
 from services.otp_service import OTPService
+from services.sms_service import SMSUnavailableError, EmulatorProvider
+from services.abuse_service import AbuseDetectionService, AbuseBlockedError, AbuseChallengeError
+from services.client_address import ClientAddressResolver
+from services.persistence_service import PersistenceService
+from services.delivery_service import DeliveryStatusService
 from services.auth_service import AuthService
+from services.hospital_service import HospitalService
+from services.symptom_service import SymptomService
+from services.chat_service import ChatService, RuleBasedResponder
+from services.doctor_search_service import DoctorSearchService
+from services.pathology_service import PathologyService
+from services.notification_hub import NotificationHub
+from services.consent_service import ConsentService
+from services.session_service import SessionService
+from services.profile_service import ProfileService
+from services.export_service import ExportService, ExportSnapshot, parse_range
+from services.timing_service import TimingService, TimingMiddleware, TimedRoute, span
+from services.idempotency_service import IdempotencyService, IdempotencyMiddleware
+from services.record_service import RecordService
+from services.record_search_service import RecordSearchService
+from services.memory_service import MemoryService
+from services.vitals_service import VitalsService, METRICS as VITAL_METRICS
+from services.appointment_service import AppointmentService, SlotConflictError
+from services.event_bus import (
+    EventBus, Event, PatientRegistered, DoctorRegistered, OTPVerified, ProfileUpdated, RecordSaved
+)
 from models.request_models import (
     SendOTPRequest, VerifyOTPRequest, PatientRegisterRequest, 
-    DoctorRegisterRequest, PatientLoginRequest, DoctorLoginRequest
+    DoctorRegisterRequest, PatientLoginRequest, DoctorLoginRequest,
+    SymptomCheckRequest, PathologyBulkUploadRequest, ConsentCreateRequest,
+    ConsentDecisionRequest, RefreshTokenRequest, PatientProfileUpdateRequest,
+    DoctorProfileUpdateRequest, TimingToggleRequest, ProfileRequest,
+    RecordCreateRequest, RecordUpdateRequest, SMSEmulatorConfigRequest, MemorySnapshotRequest,
+    VitalsRecordRequest, AppointmentBookRequest, AppointmentAutoBookRequest
 )
 from models.response_models import (
     SendOTPResponse, VerifyOTPResponse, RegisterResponse, 
-    LoginResponse, ErrorResponse
+    LoginResponse, ErrorResponse, HospitalSearchResponse, SymptomCheckResponse,
+    DoctorSearchResponse, DoctorSuggestResponse, PathologyIngestResponse,
+    PathologyTrendResponse, ConsentResponse, ConsentListResponse, SessionResponse,
+    SessionInfoResponse, RecordResponse, RecordListResponse, RecordSearchResponse,
+    VitalsRecordResponse, VitalsLatestResponse, VitalsSeriesResponse, VitalsReadingsResponse,
+    AppointmentSlotResponse, AppointmentResponse, AppointmentListResponse
 )
 
 # Load environment variables
 load_dotenv()
 
 # Initialize services
-otp_service = OTPService()
-auth_service = AuthService()
+event_bus = EventBus()
+delivery_service = DeliveryStatusService()
+abuse_service = AbuseDetectionService()
+client_address = ClientAddressResolver()
+persistence_service = PersistenceService()
+otp_service = OTPService(delivery_service=delivery_service, abuse_service=abuse_service, event_bus=event_bus)
+auth_service = AuthService(persistence=persistence_service, event_bus=event_bus)
+# Local Twilio emulator, only when SMS_PROVIDERS explicitly includes "emulator"
+sms_emulator = next((health.provider.emulator for health in otp_service.sms_router.providers
+                     if isinstance(health.provider, EmulatorProvider)), None)
+record_service = RecordService(persistence=persistence_service)
+appointment_service = AppointmentService(persistence=persistence_service)
+vitals_service = VitalsService()
+hospital_service = HospitalService()
+symptom_service = SymptomService()
+chat_service = ChatService(RuleBasedResponder(symptom_service))
+pathology_service = PathologyService()
+notification_hub = NotificationHub()
+consent_service = ConsentService(notification_hub)
+session_service = SessionService()
+profile_service = ProfileService(auth_service)
+export_service = ExportService(auth_service, pathology_service, consent_service, record_service, vitals_service)
+timing_service = TimingService()
+idempotency_service = IdempotencyService()
+memory_service = MemoryService()
+# Pending OTPs and registrations can be dropped when over budget (the user just starts again);
+# registered users and records are only warned about
+memory_service.register("otp_store", otp_service.otp_store, otp_service.evict_oldest)
+memory_service.register("temp_patient_data", auth_service.temp_patient_data,
+                        lambda count: auth_service.evict_pending_registrations("temp_patient_data", count))
+memory_service.register("temp_doctor_data", auth_service.temp_doctor_data,
+                        lambda count: auth_service.evict_pending_registrations("temp_doctor_data", count))
+memory_service.register("patients", auth_service.patients)
+memory_service.register("doctors", auth_service.doctors)
+memory_service.register("records", record_service.records)
+memory_service.register("refresh_tokens", session_service.refresh_tokens)
+memory_service.register("vitals", vitals_service.series)
+memory_service.register("appointments", appointment_service.appointments)
+
+# Event subscribers: side effects that should not hold up the response
+def audit_log(event: Event):
+    """Log registrations and successful verifications"""
+    if isinstance(event, PatientRegistered):
+        print(f"✅ Patient registration completed for {event.patient['phone']}")
+    elif isinstance(event, DoctorRegistered):
+        print(f"✅ Doctor registration completed for {event.doctor['phone']}")
+    elif isinstance(event, OTPVerified):
+        print(f"✅ OTP verified successfully for {event.phone} (Type: {event.otp_type})")
+
+def index_doctor(event: Union[DoctorRegistered, ProfileUpdated]):
+    """Keep the doctor search index in step with registrations and profile edits"""
+    if isinstance(event, DoctorRegistered):
+        doctor_search_service.add_doctor(event.doctor)
+    elif event.role == "doctor":
+        doctor_search_service.add_doctor(event.profile)
+
+def list_doctor(event: Union[DoctorRegistered, ProfileUpdated]):
+    """Keep the bookable doctors grouped by their current specialization and city"""
+    if isinstance(event, DoctorRegistered):
+        appointment_service.add_doctor(event.doctor)
+    elif event.role == "doctor":
+        appointment_service.add_doctor(event.profile)
+
+event_bus.subscribe("audit_log", [PatientRegistered, DoctorRegistered, OTPVerified], audit_log)
+event_bus.subscribe("doctor_search", [DoctorRegistered, ProfileUpdated], index_doctor)
+event_bus.subscribe("appointments", [DoctorRegistered, ProfileUpdated], list_doctor)
+event_bus.subscribe("record_search", [RecordSaved], lambda event: record_search_service.add_record(event.record))
+event_bus.subscribe("vitals", [ProfileUpdated],
+                    lambda event: vitals_service.record_profile(event.profile) if event.role == "patient" else None)
+
+bearer_scheme = HTTPBearer(auto_error=False)
+
+async def require_session(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer_scheme)
+) -> Dict[str, Any]:
+    """Dependency for authenticated endpoints: verifies the bearer token signature, no user lookup"""
+    claims = session_service.verify(credentials.credentials) if credentials else None
+    if claims is None:
+        raise HTTPException(
+            status_code=401,
+            detail="Invalid or expired session",
+            headers={"WWW-Authenticate": "Bearer"}
+        )
+    return claims
+
+async def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Admin endpoints need X-Admin-Token to match ADMIN_TOKEN; without ADMIN_TOKEN they are closed"""
+    expected = os.getenv("ADMIN_TOKEN")
+    if not expected:
+        raise HTTPException(status_code=503, detail="Admin endpoints are disabled (set ADMIN_TOKEN)")
+    if not (x_admin_token and hmac.compare_digest(x_admin_token.encode(), expected.encode())):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+# Built from the stores by restore_state(), once they are restored
+record_search_service: RecordSearchService
+doctor_search_service: DoctorSearchService
+
+def restore_state():
+    """Restore persisted stores, then build what is derived from them (e.g. the doctor search index)"""
+    global record_search_service, doctor_search_service
+    persistence_service.load()
+    record_search_service = RecordSearchService(record_service.records)
+    doctor_search_service = DoctorSearchService(auth_service.doctors.values())
+    for doctor in auth_service.doctors.values():
+        appointment_service.add_doctor(doctor)
+    for patient in auth_service.patients.values():
+        vitals_service.record_profile(patient)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan handler"""
     print("🚀 MediSync Backend Server starting...")
-    print("📱 Twilio SMS service initialized")
+    # Before serving, and not at import, so importing the app never touches STATE_DIR
+    restore_state()
+    print(f"📱 SMS providers: {', '.join(p.name for p in otp_service.sms_router.providers)}")
+    event_bus.start()
+    delivery_service.start()
+    persistence_service.start()
+    memory_service.start()
     yield
+    # Deliver queued events while the services they touch are still up
+    await event_bus.stop()
+    await delivery_service.stop()
+    await otp_service.sms_router.close()
+    await persistence_service.stop()
+    await memory_service.stop()
     print("🔄 MediSync Backend Server shutting down...")
 
 # Create FastAPI app
@@ -43,6 +201,16 @@ app = FastAPI(
     version="1.0.0",
     lifespan=lifespan
 )
+# Split route time into FastAPI's own work and the endpoint body when timing is on
+app.router.route_class = TimedRoute
+
+# Retried send-otp/register POSTs with the same Idempotency-Key get the first response back
+app.add_middleware(
+    IdempotencyMiddleware,
+    idempotency_service=idempotency_service,
+    routes=["/api/patient/send-otp", "/api/patient/register", "/api/doctor/send-otp", "/api/doctor/register"],
+    client_key=lambda scope: client_address.for_scope(scope) or "",
+)
 
 # CORS middleware
 app.add_middleware(
@@ -51,7 +219,10 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "ETag", "Idempotent-Replayed", "Content-Disposition", "Content-Range", "Accept-Ranges",
+                    "X-Abuse-Challenge", "Retry-After"],
 )
+app.add_middleware(TimingMiddleware, timing_service=timing_service)
 
 @app.get("/")
 async def root():
@@ -66,15 +237,33 @@ async def health_check():
         "service": "MediSync Healthcare API",
         "version": "1.0.0",
         "twilio_configured": bool(os.getenv("TWILIO_ACCOUNT_SID")),
-        "otp_service": "active"
+        "otp_service": "active",
+        "sms_providers": otp_service.sms_router.get_stats()
     }
 
+def retry_later(e: Union[SMSUnavailableError, AbuseBlockedError]) -> HTTPException:
+    """Fast 429/503 with Retry-After when the SMS path or abuse detection refuses new work"""
+    headers = {"Retry-After": str(e.retry_after)}
+    if isinstance(e, AbuseChallengeError):
+        # Solving it lets the client retry now rather than after Retry-After
+        headers["X-Abuse-Challenge"] = e.challenge
+    return HTTPException(status_code=e.status_code, detail=str(e), headers=headers)
+
+def client_ip(request: Request) -> Optional[str]:
+    """Address of the client (behind TRUSTED_PROXIES, from CLIENT_IP_HEADER), used as the abuse-detection IP key"""
+    return client_address.for_request(request)
+
+def abuse_challenge(x_abuse_challenge_response: Optional[str] = Header(None)) -> Optional[str]:
+    """Solved X-Abuse-Challenge ("token:solution"), for requests over a phone-prefix limit"""
+    return x_abuse_challenge_response
+
 # Patient Authentication Endpoints
 @app.post("/api/patient/send-otp", response_model=SendOTPResponse)
-async def send_patient_otp(request: SendOTPRequest):
+async def send_patient_otp(request: SendOTPRequest, ip: Optional[str] = Depends(client_ip),
+                           challenge: Optional[str] = Depends(abuse_challenge)):
     """Send OTP for patient login"""
     try:
-        result = await otp_service.send_otp(request.phone, "patient_login")
+        result = await otp_service.send_otp(request.phone, "patient_login", ip, challenge)
         response_data = {
             "success": True,
             "message": "OTP sent successfully to your phone",
@@ -84,14 +273,17 @@ async def send_patient_otp(request: SendOTPRequest):
         if result.get('demo_otp'):
             response_data["message"] += f" (Demo OTP: {result['demo_otp']})"
         return response_data
+    except (SMSUnavailableError, AbuseBlockedError) as e:
+        raise retry_later(e)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.post("/api/patient/verify-otp", response_model=VerifyOTPResponse)
-async def verify_patient_otp(request: VerifyOTPRequest):
+async def verify_patient_otp(request: VerifyOTPRequest, ip: Optional[str] = Depends(client_ip),
+                             challenge: Optional[str] = Depends(abuse_challenge)):
     """Verify OTP for patient login"""
     try:
-        is_valid = await otp_service.verify_otp(request.phone, request.otp, "patient_login")
+        is_valid = await otp_service.verify_otp(request.phone, request.otp, "patient_login", ip, challenge)
         if not is_valid:
             raise HTTPException(status_code=400, detail="Invalid or expired OTP")
         
@@ -101,23 +293,30 @@ async def verify_patient_otp(request: VerifyOTPRequest):
         return VerifyOTPResponse(
             success=True,
             message="OTP verified successfully",
-            user_data=patient_data
+            user_data=patient_data,
+            tokens=session_service.create_session(patient_data, "patient") if patient_data else None
         )
+    except AbuseBlockedError as e:
+        raise retry_later(e)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.post("/api/patient/register", response_model=RegisterResponse)
-async def register_patient(request: PatientRegisterRequest):
+async def register_patient(request: PatientRegisterRequest, ip: Optional[str] = Depends(client_ip),
+                           challenge: Optional[str] = Depends(abuse_challenge)):
     """Register new patient and send OTP"""
     try:
         # Validate registration data
-        await auth_service.validate_patient_registration(request)
+        with span("validate_registration"):
+            await auth_service.validate_patient_registration(request)
         
         # Send OTP for registration verification
-        result = await otp_service.send_otp(request.phone, "patient_register")
+        with span("send_otp"):
+            result = await otp_service.send_otp(request.phone, "patient_register", ip, challenge)
         
         # Store registration data temporarily
-        await auth_service.store_temp_patient_data(request.phone, request.dict())
+        with span("store_temp_data"):
+            await auth_service.store_temp_patient_data(request.phone, request.dict())
         
         response_data = {
             "success": True,
@@ -128,14 +327,17 @@ async def register_patient(request: PatientRegisterRequest):
         if result.get('demo_otp'):
             response_data["message"] += f" (Demo OTP: {result['demo_otp']})"
         return response_data
+    except (SMSUnavailableError, AbuseBlockedError) as e:
+        raise retry_later(e)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.post("/api/patient/verify-register-otp", response_model=VerifyOTPResponse)
-async def verify_patient_register_otp(request: VerifyOTPRequest):
+async def verify_patient_register_otp(request: VerifyOTPRequest, ip: Optional[str] = Depends(client_ip),
+                                      challenge: Optional[str] = Depends(abuse_challenge)):
     """Verify OTP for patient registration"""
     try:
-        is_valid = await otp_service.verify_otp(request.phone, request.otp, "patient_register")
+        is_valid = await otp_service.verify_otp(request.phone, request.otp, "patient_register", ip, challenge)
         if not is_valid:
             raise HTTPException(status_code=400, detail="Invalid or expired OTP")
         
@@ -145,17 +347,21 @@ async def verify_patient_register_otp(request: VerifyOTPRequest):
         return VerifyOTPResponse(
             success=True,
             message="Registration completed successfully",
-            user_data=patient_data
+            user_data=patient_data,
+            tokens=session_service.create_session(patient_data, "patient") if patient_data else None
         )
+    except AbuseBlockedError as e:
+        raise retry_later(e)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 # Doctor Authentication Endpoints
 @app.post("/api/doctor/send-otp", response_model=SendOTPResponse)
-async def send_doctor_otp(request: SendOTPRequest):
+async def send_doctor_otp(request: SendOTPRequest, ip: Optional[str] = Depends(client_ip),
+                          challenge: Optional[str] = Depends(abuse_challenge)):
     """Send OTP for doctor login"""
     try:
-        result = await otp_service.send_otp(request.phone, "doctor_login")
+        result = await otp_service.send_otp(request.phone, "doctor_login", ip, challenge)
         response_data = {
             "success": True,
             "message": "OTP sent successfully to your registered phone",
@@ -165,14 +371,17 @@ async def send_doctor_otp(request: SendOTPRequest):
         if result.get('demo_otp'):
             response_data["message"] += f" (Demo OTP: {result['demo_otp']})"
         return response_data
+    except (SMSUnavailableError, AbuseBlockedError) as e:
+        raise retry_later(e)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.post("/api/doctor/verify-otp", response_model=VerifyOTPResponse)
-async def verify_doctor_otp(request: VerifyOTPRequest):
+async def verify_doctor_otp(request: VerifyOTPRequest, ip: Optional[str] = Depends(client_ip),
+                            challenge: Optional[str] = Depends(abuse_challenge)):
     """Verify OTP for doctor login"""
     try:
-        is_valid = await otp_service.verify_otp(request.phone, request.otp, "doctor_login")
+        is_valid = await otp_service.verify_otp(request.phone, request.otp, "doctor_login", ip, challenge)
         if not is_valid:
             raise HTTPException(status_code=400, detail="Invalid or expired OTP")
         
@@ -182,23 +391,30 @@ async def verify_doctor_otp(request: VerifyOTPRequest):
         return VerifyOTPResponse(
             success=True,
             message="Login successful",
-            user_data=doctor_data
+            user_data=doctor_data,
+            tokens=session_service.create_session(doctor_data, "doctor") if doctor_data else None
         )
+    except AbuseBlockedError as e:
+        raise retry_later(e)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.post("/api/doctor/register", response_model=RegisterResponse)
-async def register_doctor(request: DoctorRegisterRequest):
+async def register_doctor(request: DoctorRegisterRequest, ip: Optional[str] = Depends(client_ip),
+                          challenge: Optional[str] = Depends(abuse_challenge)):
     """Register new doctor and send OTP"""
     try:
         # Validate registration data
-        await auth_service.validate_doctor_registration(request)
+        with span("validate_registration"):
+            await auth_service.validate_doctor_registration(request)
         
         # Send OTP for registration verification
-        result = await otp_service.send_otp(request.phone, "doctor_register")
+        with span("send_otp"):
+            result = await otp_service.send_otp(request.phone, "doctor_register", ip, challenge)
         
         # Store registration data temporarily
-        await auth_service.store_temp_doctor_data(request.phone, request.dict())
+        with span("store_temp_data"):
+            await auth_service.store_temp_doctor_data(request.phone, request.dict())
         
         response_data = {
             "success": True,
@@ -209,14 +425,17 @@ async def register_doctor(request: DoctorRegisterRequest):
         if result.get('demo_otp'):
             response_data["message"] += f" (Demo OTP: {result['demo_otp']})"
         return response_data
+    except (SMSUnavailableError, AbuseBlockedError) as e:
+        raise retry_later(e)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.post("/api/doctor/verify-register-otp", response_model=VerifyOTPResponse)
-async def verify_doctor_register_otp(request: VerifyOTPRequest):
+async def verify_doctor_register_otp(request: VerifyOTPRequest, ip: Optional[str] = Depends(client_ip),
+                                     challenge: Optional[str] = Depends(abuse_challenge)):
     """Verify OTP for doctor registration"""
     try:
-        is_valid = await otp_service.verify_otp(request.phone, request.otp, "doctor_register")
+        is_valid = await otp_service.verify_otp(request.phone, request.otp, "doctor_register", ip, challenge)
         if not is_valid:
             raise HTTPException(status_code=400, detail="Invalid or expired OTP")
         
@@ -226,10 +445,720 @@ async def verify_doctor_register_otp(request: VerifyOTPRequest):
         return VerifyOTPResponse(
             success=True,
             message="Doctor registration completed successfully",
-            user_data=doctor_data
+            user_data=doctor_data,
+            tokens=session_service.create_session(doctor_data, "doctor") if doctor_data else None
         )
+    except AbuseBlockedError as e:
+        raise retry_later(e)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+# Session Endpoints
+@app.post("/api/auth/refresh", response_model=SessionResponse)
+async def refresh_session(request: RefreshTokenRequest):
+    """Rotate a refresh token for a new access/refresh token pair"""
+    try:
+        tokens = session_service.refresh(request.refresh_token)
+        return SessionResponse(success=True, tokens=tokens)
+    except Exception as e:
+        raise HTTPException(status_code=401, detail=str(e))
+
+@app.post("/api/auth/logout")
+async def logout(session: Dict[str, Any] = Depends(require_session)):
+    """Revoke the current session's access and refresh tokens"""
+    session_service.revoke_session(session['sid'])
+    return {"success": True, "message": "Logged out successfully"}
+
+@app.get("/api/auth/me", response_model=SessionInfoResponse)
+async def get_session_info(session: Dict[str, Any] = Depends(require_session)):
+    """Get the identity carried by the current access token"""
+    return SessionInfoResponse(
+        success=True,
+        user_id=session['sub'],
+        role=session['role'],
+        phone=session['phone'],
+        session_id=session['sid'],
+        expires_at=session['exp']
+    )
+
+# Profile Endpoints
+def profile_response(role: str, phone: str, if_none_match: Optional[str]) -> Response:
+    """Serve a cached profile body with its ETag, or 304 when the client copy is current"""
+    result = profile_service.get_profile(role, phone, if_none_match)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    etag, body = result
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if body is None:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+def require_role(session: Dict[str, Any], role: str):
+    if session['role'] != role:
+        raise HTTPException(status_code=403, detail=f"Only {role}s can access this profile")
+
+@app.get("/api/patient/profile")
+async def get_patient_profile(
+    session: Dict[str, Any] = Depends(require_session),
+    if_none_match: Optional[str] = Header(None)
+):
+    """Get the signed-in patient's profile (supports If-None-Match)"""
+    require_role(session, "patient")
+    return profile_response("patient", session['phone'], if_none_match)
+
+@app.patch("/api/patient/profile")
+async def update_patient_profile(
+    request: PatientProfileUpdateRequest,
+    session: Dict[str, Any] = Depends(require_session)
+):
+    """Update the signed-in patient's profile"""
+    require_role(session, "patient")
+    try:
+        await auth_service.update_patient_profile(session['phone'], request.dict(exclude_none=True))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    profile_service.invalidate("patient", session['phone'])
+    return profile_response("patient", session['phone'], None)
+
+@app.get("/api/doctor/profile")
+async def get_doctor_profile(
+    session: Dict[str, Any] = Depends(require_session),
+    if_none_match: Optional[str] = Header(None)
+):
+    """Get the signed-in doctor's profile (supports If-None-Match)"""
+    require_role(session, "doctor")
+    return profile_response("doctor", session['phone'], if_none_match)
+
+@app.patch("/api/doctor/profile")
+async def update_doctor_profile(
+    request: DoctorProfileUpdateRequest,
+    session: Dict[str, Any] = Depends(require_session)
+):
+    """Update the signed-in doctor's profile"""
+    require_role(session, "doctor")
+    try:
+        await auth_service.update_doctor_profile(session['phone'], request.dict(exclude_none=True))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    profile_service.invalidate("doctor", session['phone'])
+    return profile_response("doctor", session['phone'], None)
+
+# Patient Data Export Endpoints
+async def export_response(snapshot: ExportSnapshot, range_header: Optional[str], if_range: Optional[str]) -> Response:
+    """Stream an export archive, or one byte range of it when the client is resuming"""
+    headers = {
+        "ETag": snapshot.etag,
+        "Accept-Ranges": "bytes",
+        "Content-Disposition": f'attachment; filename="{export_service.filename(snapshot)}"',
+        "Cache-Control": "private, no-store"
+    }
+    # A Range only applies to the archive the client already has part of
+    if range_header and (if_range is None or if_range.strip() == snapshot.etag):
+        total = await asyncio.to_thread(export_service.archive_size, snapshot)
+        try:
+            byte_range = parse_range(range_header, total)
+        except ValueError:
+            raise HTTPException(status_code=416, detail="Requested range not satisfiable",
+                                headers={"Content-Range": f"bytes */{total}"})
+        if byte_range is not None:
+            start, end = byte_range
+            headers["Content-Range"] = f"bytes {start}-{end}/{total}"
+            headers["Content-Length"] = str(end - start + 1)
+            return StreamingResponse(export_service.byte_range(snapshot, start, end), status_code=206,
+                                     media_type="application/zip", headers=headers)
+    # No Content-Length: the archive is sent with chunked transfer as it is generated
+    return StreamingResponse(export_service.full(snapshot), media_type="application/zip", headers=headers)
+
+@app.get("/api/patient/export")
+async def export_patient_data(
+    session: Dict[str, Any] = Depends(require_session),
+    range_header: Optional[str] = Header(None, alias="Range"),
+    if_range: Optional[str] = Header(None)
+):
+    """Download everything held about the signed-in patient as a ZIP of NDJSON files (supports Range)"""
+    require_role(session, "patient")
+    snapshot = export_service.snapshot(session['phone'])
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return await export_response(snapshot, range_header, if_range)
+
+# Doctor Directory Endpoints
+@app.get("/api/doctors/search", response_model=DoctorSearchResponse)
+async def search_doctors(
+    q: Optional[str] = Query(None, max_length=200),
+    specialization: Optional[str] = Query(None, max_length=100),
+    location: Optional[str] = Query(None, max_length=100),
+    page: int = Query(1, ge=1),
+    page_size: int = Query(20, ge=1, le=100)
+):
+    """Search doctors by specialization and location (prefixes allowed), ranked by match"""
+    result = doctor_search_service.search(q, specialization, location, page, page_size)
+    return {"success": True, **result}
+
+@app.get("/api/doctors/suggest", response_model=DoctorSuggestResponse)
+async def suggest_doctor_fields(
+    field: str = Query(..., pattern="^(specialization|location)$"),
+    prefix: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(10, ge=1, le=50)
+):
+    """Typeahead suggestions for specialization or location"""
+    return {
+        "success": True,
+        "suggestions": doctor_search_service.suggest(field, prefix, limit)
+    }
+
+# Patient Consent Endpoints
+def require_consent_party(session: Dict[str, Any], request_id: str) -> Dict[str, Any]:
+    """The consent request, if the session is its doctor or its patient"""
+    consent = consent_service.get_request(request_id)
+    if consent is None or session['sub'] not in (consent['doctor_id'], consent['patient_id']):
+        raise HTTPException(status_code=404, detail="Consent request not found")
+    return consent
+
+def require_own_patient_id(session: Dict[str, Any], patient_id: str):
+    if session['role'] != 'patient' or session['sub'] != patient_id:
+        raise HTTPException(status_code=403, detail="Patients can only see their own consent requests")
+
+@app.post("/api/consent/requests", response_model=ConsentResponse)
+async def create_consent_request(request: ConsentCreateRequest, session: Dict[str, Any] = Depends(require_session)):
+    """The signed-in doctor asks a patient for access to their records"""
+    if session['role'] != 'doctor':
+        raise HTTPException(status_code=403, detail="Only doctors can request consent")
+    consent = consent_service.create_request(session['sub'], request.patient_id)
+    return {"success": True, "request": consent}
+
+@app.get("/api/consent/requests/{request_id}/wait", response_model=ConsentResponse)
+async def wait_for_consent(
+    request_id: str,
+    timeout: float = Query(25, ge=0, le=60),
+    session: Dict[str, Any] = Depends(require_session)
+):
+    """Long-poll until the patient decides or the timeout elapses (status may still be pending)"""
+    require_consent_party(session, request_id)
+    consent = await consent_service.wait_for_decision(request_id, timeout)
+    if consent is None:
+        raise HTTPException(status_code=404, detail="Consent request not found")
+    return {"success": True, "request": consent}
+
+@app.post("/api/consent/requests/{request_id}/decision", response_model=ConsentResponse)
+async def decide_consent(
+    request_id: str,
+    request: ConsentDecisionRequest,
+    session: Dict[str, Any] = Depends(require_session)
+):
+    """The signed-in patient approves or denies a consent request made to them"""
+    if session['role'] != 'patient':
+        raise HTTPException(status_code=403, detail="Only patients can decide consent requests")
+    try:
+        consent = consent_service.decide(request_id, session['sub'], request.approve)
+        return {"success": True, "request": consent}
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/api/consent/requests/{request_id}/revoke", response_model=ConsentResponse)
+async def revoke_consent(request_id: str, session: Dict[str, Any] = Depends(require_session)):
+    """The signed-in patient withdraws an approval; the doctor loses record access immediately"""
+    if session['role'] != 'patient':
+        raise HTTPException(status_code=403, detail="Only patients can revoke consent")
+    try:
+        return {"success": True, "request": consent_service.revoke(request_id, session['sub'])}
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/api/consent/patients/{patient_id}/pending", response_model=ConsentListResponse)
+async def get_pending_consents(patient_id: str, session: Dict[str, Any] = Depends(require_session)):
+    """List the signed-in patient's pending consent requests"""
+    require_own_patient_id(session, patient_id)
+    return {"success": True, "requests": consent_service.get_pending(patient_id)}
+
+@app.get("/api/consent/patients/{patient_id}/stream")
+async def stream_consent_events(patient_id: str, session: Dict[str, Any] = Depends(require_session)):
+    """Stream the signed-in patient's pending and new consent requests as Server-Sent Events"""
+    require_own_patient_id(session, patient_id)
+    return StreamingResponse(
+        consent_service.patient_events(patient_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# Patient data access shared by the pathology and medical record endpoints
+def require_record_access(session: Dict[str, Any], patient_id: str):
+    """Patients reach their own records; doctors need the patient's approval, unexpired and not revoked"""
+    if session['role'] == 'patient' and session['sub'] == patient_id:
+        return
+    if session['role'] == 'doctor' and consent_service.has_access(session['sub'], patient_id):
+        return
+    raise HTTPException(status_code=403, detail="No consent to access this patient's records")
+
+# Pathology Report Endpoints
+@app.post("/api/pathology/reports/bulk", response_model=PathologyIngestResponse)
+async def upload_pathology_reports(
+    request: PathologyBulkUploadRequest,
+    session: Dict[str, Any] = Depends(require_session)
+):
+    """Ingest a batch of lab reports and flag results against reference ranges"""
+    # Every patient in the batch must be reachable, or nothing is stored
+    for patient_id in {report.patient_id for report in request.reports}:
+        require_record_access(session, patient_id)
+    try:
+        reports = [report.dict() for report in request.reports]
+        result = await asyncio.to_thread(pathology_service.ingest_reports, reports)
+        return {"success": True, **result}
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/api/pathology/patients/{patient_id}/trend", response_model=PathologyTrendResponse)
+async def get_pathology_trend(
+    patient_id: str,
+    analyte: str = Query(..., min_length=1, max_length=100),
+    session: Dict[str, Any] = Depends(require_session)
+):
+    """Get a patient's results for one analyte over time"""
+    require_record_access(session, patient_id)
+    trend = pathology_service.get_trend(patient_id, analyte)
+    if trend is None:
+        raise HTTPException(status_code=404, detail="No results found for this patient and analyte")
+    return {"success": True, **trend}
+
+# Medical Record Endpoints
+@app.get("/api/records/patients/{patient_id}", response_model=RecordListResponse)
+async def get_patient_records(
+    patient_id: str,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    session: Dict[str, Any] = Depends(require_session)
+):
+    """List a patient's medical records, newest first"""
+    require_record_access(session, patient_id)
+    return {"success": True, "records": record_service.get_patient_records(patient_id, limit)}
+
+@app.post("/api/records/patients/{patient_id}", response_model=RecordResponse)
+async def create_patient_record(
+    patient_id: str,
+    request: RecordCreateRequest,
+    session: Dict[str, Any] = Depends(require_session)
+):
+    """Add a medical record for a patient"""
+    require_record_access(session, patient_id)
+    record = record_service.create_record(patient_id, request.dict(), session['sub'])
+    await event_bus.publish(RecordSaved(record))
+    return {"success": True, "record": record}
+
+@app.put("/api/records/patients/{patient_id}/{record_id}", response_model=RecordResponse)
+async def update_patient_record(
+    patient_id: str,
+    record_id: str,
+    request: RecordUpdateRequest,
+    session: Dict[str, Any] = Depends(require_session)
+):
+    """Update a medical record's fields"""
+    require_record_access(session, patient_id)
+    try:
+        record = record_service.update_record(patient_id, record_id, request.dict(exclude_none=True))
+    except Exception as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    await event_bus.publish(RecordSaved(record))
+    return {"success": True, "record": record}
+
+@app.get("/api/records/patients/{patient_id}/search", response_model=RecordSearchResponse)
+async def search_patient_records(
+    patient_id: str,
+    q: str = Query(..., min_length=1, max_length=500),
+    limit: int = Query(20, ge=1, le=100),
+    session: Dict[str, Any] = Depends(require_session)
+):
+    """Search a patient's records by diagnosis, prescription or test name; "quoted phrases" match exactly"""
+    require_record_access(session, patient_id)
+    result = record_search_service.search(q, patient_id, limit)
+    hits = []
+    for hit in result['results']:
+        record = record_service.get_record(hit['record_id'])
+        if record is not None:
+            hits.append({"score": hit['score'], "record": record})
+    return {"success": True, "total": result['total'], "results": hits}
+
+# Vitals Endpoints
+def require_vital_metric(metric: str):
+    if metric not in VITAL_METRICS:
+        raise HTTPException(status_code=400, detail=f"Unknown vital metric (use {', '.join(VITAL_METRICS)})")
+
+@app.post("/api/vitals/patients/{patient_id}", response_model=VitalsRecordResponse)
+async def record_patient_vitals(
+    patient_id: str,
+    request: VitalsRecordRequest,
+    session: Dict[str, Any] = Depends(require_session)
+):
+    """Record readings such as {"metric": "weight", "value": "65 kg"}; blood_pressure "120/80" records both parts"""
+    require_record_access(session, patient_id)
+    result = vitals_service.record_many(patient_id, [reading.dict() for reading in request.readings])
+    if not result['recorded']:
+        raise HTTPException(status_code=400, detail=result['errors'][0]['error'])
+    return {"success": True, **result}
+
+@app.get("/api/vitals/patients/{patient_id}", response_model=VitalsLatestResponse)
+async def get_latest_vitals(patient_id: str, session: Dict[str, Any] = Depends(require_session)):
+    """Latest reading of each of a patient's vitals"""
+    require_record_access(session, patient_id)
+    return {"success": True, "patient_id": patient_id, "vitals": vitals_service.latest(patient_id)}
+
+@app.get("/api/vitals/patients/{patient_id}/{metric}", response_model=VitalsSeriesResponse)
+async def get_vitals_trend(
+    patient_id: str,
+    metric: str,
+    start: Optional[float] = Query(None, ge=0),
+    end: Optional[float] = Query(None, ge=0),
+    buckets: int = Query(100, ge=1, le=5000),
+    bucket_seconds: Optional[int] = Query(None, ge=1),
+    session: Dict[str, Any] = Depends(require_session)
+):
+    """Min, max and average per time bucket, for trend charts over any range"""
+    require_record_access(session, patient_id)
+    require_vital_metric(metric)
+    if start is not None and end is not None and end < start:
+        raise HTTPException(status_code=400, detail="end must not be before start")
+    try:
+        trend = vitals_service.downsample(patient_id, metric, start, end, buckets, bucket_seconds)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if trend is None:
+        raise HTTPException(status_code=404, detail=f"No {metric} readings for this patient")
+    return {"success": True, **trend}
+
+@app.get("/api/vitals/patients/{patient_id}/{metric}/readings", response_model=VitalsReadingsResponse)
+async def get_vitals_readings(
+    patient_id: str,
+    metric: str,
+    start: Optional[float] = Query(None, ge=0),
+    end: Optional[float] = Query(None, ge=0),
+    limit: int = Query(1000, ge=1, le=10000),
+    session: Dict[str, Any] = Depends(require_session)
+):
+    """Raw readings in a time range, oldest first (the most recent limit when there are more)"""
+    require_record_access(session, patient_id)
+    require_vital_metric(metric)
+    readings = vitals_service.get_readings(patient_id, metric, start, end, limit)
+    if readings is None:
+        raise HTTPException(status_code=404, detail=f"No {metric} readings for this patient")
+    return {"success": True, **readings}
+
+# Appointment Endpoints
+@app.get("/api/appointments/first-free", response_model=AppointmentSlotResponse)
+async def find_first_free_slot(
+    specialization: str = Query(..., min_length=1, max_length=100),
+    city: str = Query(..., min_length=1, max_length=100),
+    after: Optional[int] = Query(None, ge=0, le=2 ** 40),
+    duration_minutes: Optional[int] = Query(None, ge=1, le=480)
+):
+    """Earliest free slot with any doctor of a specialization in a city, at or after a time (default now)"""
+    try:
+        return {"success": True, "slot": appointment_service.first_free_slot(specialization, city, after, duration_minutes)}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/api/appointments/doctors/{doctor_id}/first-free", response_model=AppointmentSlotResponse)
+async def find_doctor_first_free_slot(
+    doctor_id: str,
+    after: Optional[int] = Query(None, ge=0, le=2 ** 40),
+    duration_minutes: Optional[int] = Query(None, ge=1, le=480)
+):
+    """One doctor's earliest free slot at or after a time (default now)"""
+    if doctor_id not in appointment_service.doctors:
+        raise HTTPException(status_code=404, detail="Doctor not found")
+    try:
+        return {"success": True, "slot": appointment_service.next_free(doctor_id, after, duration_minutes)}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def require_patient_booking(session: Dict[str, Any]):
+    if session['role'] != 'patient':
+        raise HTTPException(status_code=403, detail="Only patients can book appointments")
+
+@app.post("/api/appointments", response_model=AppointmentResponse)
+async def book_appointment(request: AppointmentBookRequest, session: Dict[str, Any] = Depends(require_session)):
+    """Book a slot with a doctor; 409 if it was taken first or lies outside working hours"""
+    require_patient_booking(session)
+    try:
+        appointment = appointment_service.book(request.doctor_id, session['sub'], request.start, request.duration_minutes)
+    except SlotConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return {"success": True, "appointment": appointment}
+
+@app.post("/api/appointments/first-available", response_model=AppointmentResponse)
+async def book_first_available(request: AppointmentAutoBookRequest, session: Dict[str, Any] = Depends(require_session)):
+    """Book the earliest free slot with any doctor of a specialization in a city"""
+    require_patient_booking(session)
+    try:
+        appointment = appointment_service.book_first_available(
+            request.specialization, request.city, session['sub'], request.after, request.duration_minutes)
+    except SlotConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"success": True, "appointment": appointment}
+
+@app.get("/api/appointments", response_model=AppointmentListResponse)
+async def get_my_appointments(
+    include_past: bool = Query(False),
+    limit: int = Query(100, ge=1, le=1000),
+    session: Dict[str, Any] = Depends(require_session)
+):
+    """The signed-in patient's or doctor's booked appointments, soonest first"""
+    return {"success": True, "appointments": appointment_service.get_appointments(session['sub'], include_past, limit)}
+
+@app.delete("/api/appointments/{appointment_id}", response_model=AppointmentResponse)
+async def cancel_appointment(appointment_id: str, session: Dict[str, Any] = Depends(require_session)):
+    """Cancel an appointment as its patient or doctor, freeing the slot"""
+    try:
+        appointment = appointment_service.cancel(appointment_id, session['sub'])
+    except SlotConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return {"success": True, "appointment": appointment}
+
+# Emergency Hospital Finder Endpoints
+@app.get("/api/hospitals/nearby", response_model=HospitalSearchResponse)
+async def get_nearby_hospitals(
+    lat: float = Query(..., ge=-90, le=90),
+    lng: float = Query(..., ge=-180, le=180),
+    limit: int = Query(10, ge=1, le=100),
+    radius_km: Optional[float] = Query(None, gt=0, le=20000),
+    specialty: Optional[str] = None
+):
+    """Find the nearest hospitals, optionally within a radius and filtered by specialty"""
+    hospitals = hospital_service.find_nearby(lat, lng, limit, radius_km, specialty)
+    return {
+        "success": True,
+        "count": len(hospitals),
+        "hospitals": hospitals
+    }
+
+@app.post("/api/hospitals/reload", dependencies=[Depends(require_admin)])
+async def reload_hospitals():
+    """Rebuild the hospital spatial index from the dataset on disk"""
+    try:
+        total = await asyncio.to_thread(hospital_service.reload)
+        return {"success": True, "total_facilities": total}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to reload hospitals: {str(e)}")
+
+# AI Symptom Checker Endpoints
+@app.post("/api/ai/symptom-check", response_model=SymptomCheckResponse)
+async def check_symptoms(request: SymptomCheckRequest):
+    """Match all known symptoms in a message and return severity-ranked triage advice"""
+    result = symptom_service.check_symptoms(request.message)
+    return {"success": True, **result}
+
+@app.get("/api/ai/chat/stream")
+async def stream_chat(message: str = Query(..., min_length=1, max_length=2000)):
+    """Stream the chat response as Server-Sent Events (start, delta..., done)"""
+    # Reserved before returning, so concurrent requests cannot all pass the capacity check
+    slot = chat_service.reserve()
+    if slot is None:
+        raise HTTPException(
+            status_code=503,
+            detail="Chat is busy. Please try again shortly.",
+            headers={"Retry-After": "1"}
+        )
+    try:
+        return StreamingResponse(
+            chat_service.stream(message.strip(), slot),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+    except Exception:
+        slot.release()
+        raise
+
+# SMS Delivery Status Endpoints
+@app.post("/api/sms/status-callback", status_code=204)
+async def sms_status_callback(request: Request):
+    """Twilio-style delivery status callback: acknowledged at once, applied in batches"""
+    params = dict(parse_qsl((await request.body()).decode()))
+    
+    callback_url = os.getenv("TWILIO_STATUS_CALLBACK_URL")
+    if callback_url:
+        from twilio.request_validator import RequestValidator
+        validator = RequestValidator(os.getenv("TWILIO_AUTH_TOKEN", ""))
+        if not validator.validate(callback_url, params, request.headers.get("X-Twilio-Signature", "")):
+            raise HTTPException(status_code=403, detail="Invalid callback signature")
+    
+    message_id = params.get("MessageSid") or params.get("SmsSid")
+    status = params.get("MessageStatus") or params.get("SmsStatus")
+    if not message_id or not status:
+        raise HTTPException(status_code=400, detail="MessageSid and MessageStatus are required")
+    if not delivery_service.enqueue(message_id, status, params.get("ErrorCode")):
+        raise HTTPException(status_code=503, detail="Callback buffer is full", headers={"Retry-After": "1"})
+    return Response(status_code=204)
+
+# Admin Endpoints
+@app.get("/api/admin/timing", dependencies=[Depends(require_admin)])
+async def get_request_timings(path: Optional[str] = None, limit: int = Query(50, ge=1, le=1000)):
+    """Recent per-stage request timings and their p50/p95"""
+    return {"success": True, **timing_service.get_timings(path, limit)}
+
+@app.post("/api/admin/timing", dependencies=[Depends(require_admin)])
+async def set_request_timing(request: TimingToggleRequest):
+    """Turn stage timing and Server-Timing headers on or off"""
+    timing_service.enabled = request.enabled
+    return {"success": True, "enabled": timing_service.enabled}
+
+@app.get("/api/admin/sms", dependencies=[Depends(require_admin)])
+async def get_sms_status():
+    """SMS router admission, circuit breaker and provider health metrics"""
+    return {"success": True, **otp_service.sms_router.get_stats()}
+
+@app.get("/api/admin/sms/delivery", dependencies=[Depends(require_admin)])
+async def get_sms_delivery_stats(
+    prefix: Optional[str] = Query(None, max_length=16),
+    phone: Optional[str] = Query(None, max_length=20),
+    limit: int = Query(20, ge=1, le=500)
+):
+    """Delivery rate and latency per carrier prefix, plus recently tracked messages"""
+    return {
+        "success": True,
+        "stats": delivery_service.get_stats(),
+        "prefixes": delivery_service.get_prefix_stats(prefix),
+        "recent": delivery_service.recent_messages(phone, limit)
+    }
+
+def require_emulator():
+    if sms_emulator is None:
+        raise HTTPException(status_code=409, detail="SMS emulator is disabled (set SMS_PROVIDERS=emulator)")
+    return sms_emulator
+
+@app.get("/api/admin/sms/emulator", dependencies=[Depends(require_admin)])
+async def get_sms_emulator(
+    to: Optional[str] = Query(None, max_length=20),
+    limit: int = Query(50, ge=1, le=1000)
+):
+    """Messages captured by the SMS emulator, newest first, with its counters and fault settings"""
+    emulator = require_emulator()
+    return {"success": True, **emulator.get_stats(), "messages": emulator.messages(to, limit)}
+
+@app.put("/api/admin/sms/emulator", dependencies=[Depends(require_admin)])
+async def configure_sms_emulator(request: SMSEmulatorConfigRequest):
+    """Change the emulator's latency, error and throttling injection while it runs"""
+    emulator = require_emulator()
+    try:
+        return {"success": True, "config": emulator.configure(**request.dict(exclude_none=True))}
+    except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+@app.delete("/api/admin/sms/emulator/messages", dependencies=[Depends(require_admin)])
+async def clear_sms_emulator():
+    """Forget the emulator's captured messages"""
+    return {"success": True, "cleared": require_emulator().clear()}
+
+@app.get("/api/admin/otp", dependencies=[Depends(require_admin)])
+async def get_otp_stats():
+    """Active OTPs and code generator statistics: randomness drawn, rejected and buffered"""
+    return {"success": True, "active": otp_service.get_active_otps_count(), **otp_service.generator.get_stats()}
+
+@app.get("/api/admin/abuse", dependencies=[Depends(require_admin)])
+async def get_abuse_stats(top: int = Query(10, ge=1, le=64)):
+    """Blocked sends/verifications and the heaviest IPs, phones and prefixes"""
+    return {"success": True, **abuse_service.get_stats(top)}
+
+@app.get("/api/admin/persistence", dependencies=[Depends(require_admin)])
+async def get_persistence_status():
+    """WAL, snapshot and restore statistics for the persisted in-memory stores"""
+    return {"success": True, **persistence_service.get_stats()}
+
+@app.post("/api/admin/persistence/snapshot", dependencies=[Depends(require_admin)])
+async def take_snapshot():
+    """Write a snapshot now instead of waiting for the background interval"""
+    if not persistence_service.enabled:
+        raise HTTPException(status_code=409, detail="Persistence is disabled (set STATE_DIR)")
+    written = await persistence_service.snapshot()
+    return {"success": True, "written": written, **persistence_service.get_stats()}
+
+@app.get("/api/admin/idempotency", dependencies=[Depends(require_admin)])
+async def get_idempotency_stats():
+    """Stored, replayed and in-flight Idempotency-Key responses"""
+    return {"success": True, **idempotency_service.get_stats()}
+
+@app.get("/api/admin/patients/{phone}/export", dependencies=[Depends(require_admin)])
+async def export_patient_data_admin(
+    phone: str,
+    range_header: Optional[str] = Header(None, alias="Range"),
+    if_range: Optional[str] = Header(None)
+):
+    """Export a patient's data on behalf of a regulator or support request (supports Range)"""
+    snapshot = export_service.snapshot(phone)
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail="Patient not found")
+    return await export_response(snapshot, range_header, if_range)
+
+@app.get("/api/admin/export", dependencies=[Depends(require_admin)])
+async def get_export_stats():
+    """Export counts, resumed ranges and bytes streamed"""
+    return {"success": True, **export_service.get_stats()}
+
+@app.get("/api/admin/records/index", dependencies=[Depends(require_admin)])
+async def get_record_index_stats():
+    """Record search index segments, postings and query statistics"""
+    return {"success": True, **record_service.get_stats(), **record_search_service.get_stats()}
+
+@app.get("/api/admin/vitals", dependencies=[Depends(require_admin)])
+async def get_vitals_stats():
+    """Vitals series, readings, blocks and compression ratio"""
+    return {"success": True, **vitals_service.get_stats()}
+
+@app.get("/api/admin/appointments", dependencies=[Depends(require_admin)])
+async def get_appointment_stats():
+    """Bookings, conflicts, cancellations and doctors scanned per first-free search"""
+    return {"success": True, **appointment_service.get_stats()}
+
+@app.get("/api/admin/events", dependencies=[Depends(require_admin)])
+async def get_event_bus_stats():
+    """Events published, per-subscriber queue depth, delivery lag, retries and dead letters"""
+    return {"success": True, **event_bus.get_stats()}
+
+@app.get("/api/admin/memory", dependencies=[Depends(require_admin)])
+async def get_memory_report(exact: bool = Query(False)):
+    """Entries and deep size of the in-memory stores, process RSS, budgets and watchdog alerts"""
+    return {"success": True, **memory_service.report(exact), "watchdog": memory_service.get_stats()}
+
+@app.post("/api/admin/memory/snapshot", dependencies=[Depends(require_admin)])
+async def take_memory_snapshot(request: MemorySnapshotRequest):
+    """Take a tracemalloc snapshot (starting tracing if needed) and list the top allocation sites"""
+    return {"success": True, **memory_service.take_snapshot(request.frames, request.limit)}
+
+@app.get("/api/admin/memory/diff", dependencies=[Depends(require_admin)])
+async def get_memory_diff(
+    from_id: int = Query(..., alias="from"),
+    to_id: Optional[int] = Query(None, alias="to"),
+    group_by: str = Query("lineno", pattern="^(lineno|filename|traceback)$"),
+    limit: int = Query(20, ge=1, le=200)
+):
+    """Allocation growth between two snapshots, largest first"""
+    try:
+        return {"success": True, **memory_service.diff(from_id, to_id, group_by, limit)}
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=e.args[0])
+
+@app.delete("/api/admin/memory/tracing", dependencies=[Depends(require_admin)])
+async def stop_memory_tracing():
+    """Stop tracemalloc (it slows every allocation) and drop the kept snapshots"""
+    return {"success": True, "dropped_snapshots": memory_service.stop_tracing()}
+
+@app.post("/api/admin/profile", dependencies=[Depends(require_admin)])
+async def start_profiling(request: ProfileRequest):
+    """Profile the next N requests with cProfile; fetch the result with GET"""
+    try:
+        timing_service.arm_profiler(request.requests, request.sort, request.limit)
+        return {"success": True, **timing_service.get_profile()}
+    except Exception as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@app.get("/api/admin/profile", dependencies=[Depends(require_admin)])
+async def get_profiling_result():
+    """Status of the profiling window and the aggregated stats once complete"""
+    return {"success": True, **timing_service.get_profile()}
+
 if __name__ == "__main__":
     uvicorn.run("server:app", host="0.0.0.0", port=8001, reload=True)
\ No newline at end of file
@@ -0,0 +1,323 @@
+"""
+Abuse Detection Service for MediSync Healthcare Platform
+Handles memory-bounded OTP abuse detection with decaying count-min sketches
+"""
+
+import hashlib
+import hmac
+import math
+import os
+import secrets
+import time
+from typing import Dict, List, Optional, Any, Hashable, Tuple
+
+import numpy as np
+
+_MASK64 = (1 << 64) - 1
+
+
+class AbuseBlockedError(Exception):
+    """An OTP send or verify was refused by abuse detection; carries the HTTP status and Retry-After"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.status_code = 429
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class AbuseChallengeError(AbuseBlockedError):
+    """
+    A phone-prefix limit was reached: instead of a hard block, the request may go
+    ahead once it carries a solved challenge (or after Retry-After)
+    """
+
+    def __init__(self, message: str, retry_after: float, challenge: str):
+        super().__init__(message, retry_after)
+        self.challenge = challenge
+
+
+class CountMinSketch:
+    """
+    Count-min sketch with exponential time decay and a top-k heavy-hitters table
+
+    Counts are stored in "scaled" units: an event at time t adds
+    2 ** ((t - epoch) / half_life), and reads divide by the current weight.
+    Decay therefore costs nothing per event; the table is rescaled only
+    when the weight grows large. Estimates never undercount; with width w
+    they overcount by at most e/w of the total (decayed) volume with
+    probability 1 - e ** -depth.
+    """
+
+    def __init__(self, width: int = 1 << 16, depth: int = 4, half_life: float = 900.0,
+                 top_k: int = 64, seed: int = 0x5EED):
+        if width & (width - 1):
+            raise ValueError("Sketch width must be a power of two")
+        self.width = width
+        self.depth = depth
+        self.half_life = half_life
+        self.top_k = top_k
+        self.table = np.zeros((depth, width), dtype=np.float64)
+        # Flat view over the same memory: indexing a memoryview is far cheaper than numpy scalar access
+        self._cells = memoryview(self.table.reshape(-1))
+
+        self._mask = width - 1
+        self._bases = [row * width for row in range(depth)]
+        # Odd per-sketch multiplier: mixes the key hash and keeps two sketches from sharing collisions
+        self._salt = int(np.random.default_rng(seed).integers(1, 1 << 63)) | 1
+
+        self._epoch = time.monotonic()
+        # key -> scaled estimate of the heaviest keys seen
+        self.heavy: Dict[Hashable, float] = {}
+        self._heavy_min: Optional[Hashable] = None
+
+    def _weight(self, now: float) -> float:
+        exponent = (now - self._epoch) / self.half_life
+        if exponent > 32:
+            # Rescale before the weights lose precision
+            shift = math.floor(exponent)
+            factor = 2.0 ** -shift
+            self.table *= factor
+            for key in self.heavy:
+                self.heavy[key] *= factor
+            self._epoch += shift * self.half_life
+            exponent -= shift
+        return 2.0 ** exponent
+
+    def _cells_for(self, key: Hashable) -> List[int]:
+        """Flat table index of key's counter in each row.
+
+        Rows are derived from one 64-bit hash as h1 + i * h2 (Kirsch-Mitzenmacher),
+        which keeps the count-min error bounds without hashing the key per row.
+        """
+        h = (hash(key) * self._salt) & _MASK64
+        h1, h2 = h & 0xFFFFFFFF, (h >> 32) | 1
+        mask = self._mask
+        return [((h1 + i * h2) & mask) + base for i, base in enumerate(self._bases)]
+
+    def _columns_bulk(self, hashes: np.ndarray):
+        """Vectorized _cells_for: yields (row, column array) for each row"""
+        h = hashes.astype(np.uint64, copy=False) * np.uint64(self._salt)
+        h2 = (h >> np.uint64(32)) | np.uint64(1)
+        column = h & np.uint64(0xFFFFFFFF)
+        mask = np.uint64(self._mask)
+        for row in range(self.depth):
+            yield row, (column & mask).astype(np.intp)
+            column += h2
+
+    def add(self, key: Hashable, count: float = 1.0, now: Optional[float] = None) -> float:
+        """Count an event for key (conservative update); returns the key's decayed estimate"""
+        weight = self._weight(time.monotonic() if now is None else now)
+        indexes = self._cells_for(key)
+        cells = self._cells
+        target = min([cells[i] for i in indexes]) + count * weight
+        for i in indexes:
+            if cells[i] < target:
+                cells[i] = target
+        self._offer(key, target)
+        return target / weight
+
+    def estimate(self, key: Hashable, now: Optional[float] = None) -> float:
+        """Decayed event count for key"""
+        weight = self._weight(time.monotonic() if now is None else now)
+        cells = self._cells
+        return min([cells[i] for i in self._cells_for(key)]) / weight
+
+    def add_hashes(self, hashes: np.ndarray, now: Optional[float] = None):
+        """Bulk-count events by key hash (hash(key) masked to 64 bits, so counts land where add() puts them).
+
+        Plain rather than conservative update, and no heavy-hitter tracking.
+        """
+        weight = self._weight(time.monotonic() if now is None else now)
+        for row, columns in self._columns_bulk(hashes):
+            self.table[row] += np.bincount(columns, minlength=self.width) * weight
+
+    def estimate_hashes(self, hashes: np.ndarray, now: Optional[float] = None) -> np.ndarray:
+        weight = self._weight(time.monotonic() if now is None else now)
+        estimates = None
+        for row, columns in self._columns_bulk(hashes):
+            values = self.table[row, columns]
+            estimates = values if estimates is None else np.minimum(estimates, values)
+        return estimates / weight
+
+    def _offer(self, key: Hashable, scaled: float):
+        heavy = self.heavy
+        if key in heavy:
+            heavy[key] = scaled
+            if key == self._heavy_min:
+                self._heavy_min = None
+            return
+        if len(heavy) < self.top_k:
+            heavy[key] = scaled
+            self._heavy_min = None
+            return
+        if self._heavy_min is None:
+            self._heavy_min = min(heavy, key=heavy.__getitem__)
+        if scaled > heavy[self._heavy_min]:
+            del heavy[self._heavy_min]
+            heavy[key] = scaled
+            self._heavy_min = None
+
+    def top(self, n: int = 10, now: Optional[float] = None) -> List[Tuple[Hashable, float]]:
+        """Heaviest keys with their decayed counts"""
+        weight = self._weight(time.monotonic() if now is None else now)
+        ranked = sorted(self.heavy.items(), key=lambda item: item[1], reverse=True)[:n]
+        return [(key, scaled / weight) for key, scaled in ranked]
+
+    @property
+    def memory_bytes(self) -> int:
+        return self.table.nbytes
+
+
+class AbuseDetectionService:
+    """
+    Decaying counts of OTP sends and failed verifications per IP, per phone
+    and per (phone prefix, otp_type), each checked against a limit before
+    the send or verify goes ahead.
+
+    Memory is fixed by the sketch size no matter how many IPs or phones are
+    seen, and every check or update is a handful of hash lookups. Unlike the
+    per-OTP attempt counter, failures survive sending a new OTP, and the
+    prefix keys catch brute force spread over many phones and IPs.
+
+    IP and phone limits block outright. A prefix is shared by many innocent
+    users, so blocking it would let an attacker lock them all out; over the
+    prefix limit a request instead needs a proof-of-work challenge solved
+    (step-up). The challenge is an HMAC-signed token bound to the phone and
+    valid for challenge_ttl seconds; the client finds a string s such that
+    sha256(token + ":" + s) starts with challenge_bits zero bits and sends
+    "token:s". That costs a human one short pause and a brute-force run one
+    pause per phone.
+    """
+
+    def __init__(self, width: Optional[int] = None, depth: int = 4, half_life: Optional[float] = None,
+                 limits: Optional[Dict[str, Dict[str, float]]] = None, prefix_digits: int = 4,
+                 challenge_bits: Optional[int] = None, challenge_ttl: Optional[float] = None,
+                 challenge_secret: Optional[str] = None):
+        width = width or int(os.getenv('ABUSE_SKETCH_WIDTH', str(1 << 16)))
+        half_life = half_life or float(os.getenv('ABUSE_HALF_LIFE', '900'))  # 15 minutes
+        self.sends = CountMinSketch(width, depth, half_life)
+        self.failures = CountMinSketch(width, depth, half_life)
+        self.prefix_digits = prefix_digits
+        self.limits = limits or {
+            "send": {
+                "ip": float(os.getenv('ABUSE_SEND_LIMIT_IP', '100')),
+                "phone": float(os.getenv('ABUSE_SEND_LIMIT_PHONE', '15')),
+                "prefix": float(os.getenv('ABUSE_SEND_LIMIT_PREFIX', '1000'))
+            },
+            "verify": {
+                "ip": float(os.getenv('ABUSE_FAIL_LIMIT_IP', '50')),
+                "phone": float(os.getenv('ABUSE_FAIL_LIMIT_PHONE', '10')),
+                "prefix": float(os.getenv('ABUSE_FAIL_LIMIT_PREFIX', '200'))
+            }
+        }
+        self.challenge_bits = challenge_bits or int(os.getenv('ABUSE_CHALLENGE_BITS', '16'))
+        self.challenge_ttl = challenge_ttl or float(os.getenv('ABUSE_CHALLENGE_TTL', '300'))
+        # A random secret means challenges issued before a restart stop validating, which is harmless
+        self._challenge_key = (challenge_secret or os.getenv('ABUSE_CHALLENGE_SECRET')
+                               or secrets.token_urlsafe(32)).encode()
+        self.stats = {"sends": 0, "failures": 0, "blocked_sends": 0, "blocked_verifies": 0,
+                      "challenges_issued": 0, "challenges_passed": 0}
+
+        print(f"✅ Abuse Detection Service initialized ({(self.sends.memory_bytes + self.failures.memory_bytes) // 1024} KiB)")
+
+    def _keys(self, ip: Optional[str], phone: str, otp_type: str) -> List[Tuple[str, Hashable]]:
+        country = 3 if phone.startswith('+91') else 2
+        keys = [("phone", ("phone", phone)), ("prefix", ("prefix", phone[:country + self.prefix_digits], otp_type))]
+        if ip:
+            keys.insert(0, ("ip", ("ip", ip)))
+        return keys
+
+    # Step-up challenges
+    def _sign(self, phone: str, bits: int, expires: int, nonce: str) -> str:
+        message = f"{phone}|{bits}|{expires}|{nonce}".encode('utf-8', 'surrogateescape')
+        return hmac.new(self._challenge_key, message, hashlib.sha256).hexdigest()[:32]
+
+    def issue_challenge(self, phone: str) -> str:
+        """A challenge token for phone, formatted bits.expires.nonce.signature"""
+        expires = int(time.time() + self.challenge_ttl)
+        nonce = secrets.token_hex(8)
+        self.stats["challenges_issued"] += 1
+        return f"{self.challenge_bits}.{expires}.{nonce}.{self._sign(phone, self.challenge_bits, expires, nonce)}"
+
+    def verify_challenge(self, phone: str, response: Optional[str]) -> bool:
+        """Whether response is "token:solution" for an unexpired token issued for phone"""
+        if not response:
+            return False
+        token, _, solution = response.partition(':')
+        try:
+            bits, expires, nonce, signature = token.split('.')
+            bits, expires = int(bits), int(expires)
+        except ValueError:
+            return False
+        # Compare bytes: compare_digest rejects non-ASCII str with TypeError instead of a mismatch
+        expected = self._sign(phone, bits, expires, nonce).encode()
+        if (not self.challenge_bits <= bits <= 256 or expires < time.time() or not solution
+                or not hmac.compare_digest(signature.encode('utf-8', 'surrogateescape'), expected)):
+            return False
+        digest = int.from_bytes(hashlib.sha256(response.encode('utf-8', 'surrogateescape')).digest(), 'big')
+        return digest >> (256 - bits) == 0
+
+    def _check(self, sketch: CountMinSketch, limits: Dict[str, float], ip: Optional[str],
+               phone: str, otp_type: str, action: str, challenge: Optional[str]):
+        now = time.monotonic()
+        for kind, key in self._keys(ip, phone, otp_type):
+            count = sketch.estimate(key, now)
+            if count >= limits[kind]:
+                # Time until the decayed count falls back under the limit
+                retry_after = sketch.half_life * math.log2(count / limits[kind]) + 1
+                message = f"Too many OTP {action} attempts. Please try again later."
+                if kind == "prefix":
+                    if self.verify_challenge(phone, challenge):
+                        self.stats["challenges_passed"] += 1
+                        continue
+                    print(f"🧩 Challenge required for {action} to {phone} ({kind} limit, ~{count:.0f} events)")
+                    raise AbuseChallengeError(message, retry_after, self.issue_challenge(phone))
+                print(f"🚫 Blocked {action} for {phone} ({kind} limit, ~{count:.0f} events)")
+                raise AbuseBlockedError(message, retry_after)
+
+    def check_send(self, ip: Optional[str], phone: str, otp_type: str, challenge: Optional[str] = None):
+        """
+        Raise AbuseBlockedError if this send would exceed an IP or phone limit, or
+        AbuseChallengeError if it exceeds the prefix limit and challenge is not a
+        solved challenge for this phone
+        """
+        try:
+            self._check(self.sends, self.limits["send"], ip, phone, otp_type, "send", challenge)
+        except AbuseBlockedError:
+            self.stats["blocked_sends"] += 1
+            raise
+
+    def record_send(self, ip: Optional[str], phone: str, otp_type: str):
+        now = time.monotonic()
+        for _, key in self._keys(ip, phone, otp_type):
+            self.sends.add(key, now=now)
+        self.stats["sends"] += 1
+
+    def check_verify(self, ip: Optional[str], phone: str, otp_type: str, challenge: Optional[str] = None):
+        """
+        Raise AbuseBlockedError if too many verifications have failed for this IP or
+        phone, or AbuseChallengeError if for its prefix and challenge is not solved
+        """
+        try:
+            self._check(self.failures, self.limits["verify"], ip, phone, otp_type, "verification", challenge)
+        except AbuseBlockedError:
+            self.stats["blocked_verifies"] += 1
+            raise
+
+    def record_failure(self, ip: Optional[str], phone: str, otp_type: str):
+        now = time.monotonic()
+        for _, key in self._keys(ip, phone, otp_type):
+            self.failures.add(key, now=now)
+        self.stats["failures"] += 1
+
+    def get_stats(self, top: int = 10) -> Dict[str, Any]:
+        """Get detector statistics and the heaviest senders and failers"""
+        def describe(entries):
+            return [{"key": list(key), "count": round(count, 2)} for key, count in entries]
+
+        return {
+            **self.stats,
+            "memory_bytes": self.sends.memory_bytes + self.failures.memory_bytes,
+            "top_senders": describe(self.sends.top(top)),
+            "top_failures": describe(self.failures.top(top))
+        }
@@ -0,0 +1,412 @@
+"""
+Appointment Service for MediSync Healthcare Platform
+Handles doctor scheduling: per-doctor calendars of booked intervals, first-free-slot search and conflict-free booking
+"""
+
+import bisect
+import os
+from array import array
+import re
+import secrets
+import time
+from typing import Dict, List, Optional, Any, Iterable, Tuple
+
+import numpy as np
+
+from services.doctor_search_service import tokenize
+from services.persistence_service import PersistenceService
+from services.striped_locks import StripedLock
+
+DAY = 86400
+WEEKDAYS = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+HOURS_PATTERN = re.compile(r"^\s*(\d{1,2}):(\d{2})\s*-\s*(\d{1,2}):(\d{2})\s*$")
+OFFSET_PATTERN = re.compile(r"^([+-])(\d{2}):(\d{2})$")
+
+
+class SlotConflictError(Exception):
+    """The requested interval overlaps another booking, or lies outside working hours"""
+
+
+def parse_days(text: str) -> Tuple[int, ...]:
+    """Working weekdays (Monday = 0) from "Mon-Sat" or "Mon,Wed,Fri" """
+    days = set()
+    for part in filter(None, (p.strip().lower() for p in text.split(','))):
+        first, _, last = part.partition('-')
+        try:
+            start = WEEKDAYS.index(first.strip()[:3])
+            end = WEEKDAYS.index(last.strip()[:3]) if last else start
+        except ValueError:
+            raise ValueError(f"Unknown weekday in {text}")
+        days.update((start + i) % 7 for i in range((end - start) % 7 + 1))
+    return tuple(sorted(days))
+
+
+class DoctorCalendar:
+    """
+    One doctor's booked time as sorted, non-overlapping runs
+
+    Touching bookings are merged into one run, so a fully booked day is a
+    single interval and a free-slot search steps over it in one bisect
+    instead of one step per appointment. Runs are kept in int64 arrays
+    (8 bytes an entry, no int objects), which bisect searches directly.
+    """
+
+    def __init__(self, doctor_id: str):
+        self.doctor_id = doctor_id
+        self.starts = array('q')
+        self.ends = array('q')
+        self.booked = 0
+        # (duration, from, to): no free slot of that duration starts in [from, to).
+        # Bookings keep it true; a cancellation clears it.
+        self.hint: Optional[Tuple[int, int, int]] = None
+
+    def load(self, starts: np.ndarray, ends: np.ndarray):
+        """Replace the calendar with non-overlapping bookings in bulk, merging touching ones in one pass"""
+        order = np.argsort(starts, kind='stable')
+        starts, ends = np.asarray(starts, dtype=np.int64)[order], np.asarray(ends, dtype=np.int64)[order]
+        # A run starts wherever a booking does not begin exactly where the previous one ended
+        breaks = np.flatnonzero(np.r_[True, starts[1:] != ends[:-1]]) if len(starts) else np.empty(0, dtype=np.int64)
+        self.starts = array('q', starts[breaks].tobytes())
+        self.ends = array('q', ends[np.r_[breaks[1:] - 1, len(ends) - 1]].tobytes() if len(breaks) else b'')
+        self.booked = len(starts)
+        self.hint = None
+
+    def conflict(self, start: int, end: int) -> Optional[int]:
+        """End of the run overlapping [start, end), if any"""
+        i = bisect.bisect_right(self.ends, start)
+        if i < len(self.starts) and self.starts[i] < end:
+            return self.ends[i]
+        return None
+
+    def add(self, start: int, end: int):
+        i = bisect.bisect_right(self.ends, start)
+        # Merge with the run ending exactly at start and the one starting exactly at end
+        if i > 0 and self.ends[i - 1] == start:
+            i -= 1
+            start = self.starts[i]
+            del self.starts[i], self.ends[i]
+        if i < len(self.starts) and self.starts[i] == end:
+            end = self.ends[i]
+            del self.starts[i], self.ends[i]
+        self.starts.insert(i, start)
+        self.ends.insert(i, end)
+        self.booked += 1
+
+    def remove(self, start: int, end: int):
+        i = bisect.bisect_right(self.ends, start)
+        run_start, run_end = self.starts[i], self.ends[i]
+        del self.starts[i], self.ends[i]
+        # Whatever of the run lies either side of the freed interval stays booked
+        for piece in ((end, run_end), (run_start, start)):
+            if piece[0] < piece[1]:
+                self.starts.insert(i, piece[0])
+                self.ends.insert(i, piece[1])
+        self.booked -= 1
+        self.hint = None
+
+
+class AppointmentService:
+    def __init__(self, doctors: Iterable[Dict[str, Any]] = (), persistence: Optional[PersistenceService] = None,
+                 slot_minutes: Optional[int] = None, hours: Optional[str] = None, days: Optional[str] = None,
+                 utc_offset: Optional[str] = None, horizon_days: Optional[int] = None):
+        """Initialize scheduling with the working hours from APPOINTMENT_* variables"""
+        self.slot = 60 * (slot_minutes or int(os.getenv('APPOINTMENT_SLOT_MINUTES', '15')))
+        match = HOURS_PATTERN.match(hours or os.getenv('APPOINTMENT_HOURS', '09:00-17:00'))
+        if match is None:
+            raise ValueError("Working hours must look like 09:00-17:00")
+        open_h, open_m, close_h, close_m = map(int, match.groups())
+        # Seconds after local midnight
+        self.open, self.close = open_h * 3600 + open_m * 60, close_h * 3600 + close_m * 60
+        self.days = frozenset(parse_days(days or os.getenv('APPOINTMENT_DAYS', 'Mon-Sat')))
+        match = OFFSET_PATTERN.match(utc_offset or os.getenv('APPOINTMENT_UTC_OFFSET', '+05:30'))
+        if match is None:
+            raise ValueError("UTC offset must look like +05:30")
+        self.offset = (1 if match.group(1) == '+' else -1) * (int(match.group(2)) * 3600 + int(match.group(3)) * 60)
+        self.horizon = DAY * (horizon_days or int(os.getenv('APPOINTMENT_HORIZON_DAYS', '365')))
+        if not self.days or self.close - self.open < self.slot:
+            raise ValueError("Working hours leave no room for a single slot")
+
+        # appointment id -> appointment (cancelled ones are kept, with their status)
+        self.appointments: Dict[str, Dict[str, Any]] = {}
+        # Built on first use from the store, after any restore
+        self._calendars: Optional[Dict[str, DoctorCalendar]] = None
+        self._by_user: Optional[Dict[str, List[str]]] = None
+        # Doctor directory: (specialization, city) -> doctor ids, doctor id -> summary
+        self.groups: Dict[Tuple[str, str], List[str]] = {}
+        self.doctors: Dict[str, Dict[str, Any]] = {}
+        self._locks = StripedLock()
+        self.stats = {"booked": 0, "cancelled": 0, "conflicts": 0, "searches": 0, "doctors_scanned": 0}
+
+        self.persistence = persistence
+        if persistence is not None:
+            persistence.register("appointments", self.appointments)
+
+        for doctor in doctors:
+            self.add_doctor(doctor)
+
+        print(f"✅ Appointment Service initialized ({len(self.doctors)} doctors, {self.slot // 60} min slots)")
+
+    @staticmethod
+    def _group_key(specialization: str, city: str) -> Tuple[str, str]:
+        return ' '.join(tokenize(specialization)), ' '.join(tokenize(city))
+
+    def add_doctor(self, doctor: Dict[str, Any]):
+        """List a doctor under their specialization and city, moving them if either changed"""
+        doctor_id = doctor['id']
+        previous = self.doctors.get(doctor_id)
+        key = self._group_key(doctor.get('specialization', ''), doctor.get('location', ''))
+        if previous is not None and previous['group'] != key:
+            self.groups[previous['group']].remove(doctor_id)
+        if previous is None or previous['group'] != key:
+            self.groups.setdefault(key, []).append(doctor_id)
+        self.doctors[doctor_id] = {"id": doctor_id, "name": doctor.get('name'), "group": key,
+                                   "specialization": doctor.get('specialization'), "location": doctor.get('location')}
+
+    def _calendar_index(self) -> Dict[str, DoctorCalendar]:
+        if self._calendars is None:
+            self._calendars = {}
+            booked: Dict[str, Tuple[List[int], List[int]]] = {}
+            for appointment in self.appointments.values():
+                if appointment['status'] == 'booked':
+                    starts, ends = booked.setdefault(appointment['doctor_id'], ([], []))
+                    starts.append(appointment['start'])
+                    ends.append(appointment['end'])
+            for doctor_id, (starts, ends) in booked.items():
+                self._calendars[doctor_id] = DoctorCalendar(doctor_id)
+                self._calendars[doctor_id].load(np.array(starts), np.array(ends))
+        return self._calendars
+
+    def _calendar(self, doctor_id: str) -> DoctorCalendar:
+        calendars = self._calendar_index()
+        calendar = calendars.get(doctor_id)
+        if calendar is None:
+            calendar = calendars[doctor_id] = DoctorCalendar(doctor_id)
+        return calendar
+
+    def _persist(self, appointment_id: str):
+        if self.persistence is not None:
+            self.persistence.record("appointments", appointment_id)
+
+    # Working hours
+    def _align(self, t: int) -> int:
+        """t rounded up to the slot grid, which starts at local midnight"""
+        local = t + self.offset
+        return -(-local // self.slot) * self.slot - self.offset
+
+    def _window(self, t: int) -> Tuple[int, int, bool]:
+        """Start and end of working hours on t's local day, and whether it is a working day"""
+        day = (t + self.offset) // DAY
+        midnight = day * DAY - self.offset
+        # 1970-01-01 was a Thursday
+        return midnight + self.open, midnight + self.close, (day + 3) % 7 in self.days
+
+    def _in_hours(self, start: int, end: int) -> bool:
+        opens, closes, working = self._window(start)
+        return working and opens <= start and end <= closes
+
+    def _duration(self, duration_minutes: Optional[int]) -> int:
+        duration = 60 * duration_minutes if duration_minutes else self.slot
+        if duration % self.slot or not 0 < duration <= self.close - self.open:
+            raise ValueError(f"Duration must be a multiple of {self.slot // 60} minutes within one working day")
+        return duration
+
+    def _lower_bound(self, calendar: Optional[DoctorCalendar], t: int, duration: int) -> int:
+        """Earliest start the doctor could be free from, by the calendar's hint"""
+        hint = calendar.hint if calendar is not None else None
+        if hint is not None and hint[0] == duration and hint[1] <= t < hint[2]:
+            return hint[2]
+        return t
+
+    def _first_free(self, calendar: Optional[DoctorCalendar], after: int, duration: int, before: int) -> Optional[int]:
+        """
+        First free start at or after after (slot-aligned) and before before
+
+        Each step jumps to the next working day or past a whole booked run,
+        and the calendar's hint skips ground an earlier search already
+        covered. Whatever is searched, found or not, extends the hint.
+        """
+        origin = after
+        t = self._lower_bound(calendar, after, duration)
+        if calendar is not None and t != after:
+            origin = calendar.hint[1]
+        found = None
+        while t < before:
+            opens, closes, working = self._window(t)
+            if not working or t + duration > closes:
+                t = self._next_opening(opens - self.open + DAY)
+                continue
+            if t < opens:
+                t = opens
+            busy_until = calendar.conflict(t, t + duration) if calendar is not None else None
+            if busy_until is None:
+                found = t
+                break
+            t = self._align(busy_until)
+        if calendar is not None:
+            # Everything jumped over was closed or booked, even past before
+            calendar.hint = (duration, origin, t)
+        return found
+
+    def _next_opening(self, midnight: int) -> int:
+        """Opening time of the first working day starting at the local midnight given"""
+        for _ in range(7):
+            opens, _, working = self._window(midnight)
+            if working:
+                return opens
+            midnight += DAY
+        return midnight
+
+    def next_free(self, doctor_id: str, after: Optional[int] = None,
+                  duration_minutes: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """One doctor's first free slot at or after after (default now), within the booking horizon"""
+        duration = self._duration(duration_minutes)
+        after = self._align(int(max(after or 0, time.time())))
+        start = self._first_free(self._calendar_index().get(doctor_id), after, duration, after + self.horizon)
+        return self._slot(doctor_id, start, duration) if start is not None else None
+
+    def first_free_slot(self, specialization: str, city: str, after: Optional[int] = None,
+                        duration_minutes: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """
+        Earliest free slot with any doctor of a specialization in a city
+
+        Doctors are tried in order of the earliest time they could be free,
+        and the search stops once no remaining doctor could beat the best
+        slot found, so a busy group is not walked doctor by doctor. Ties go
+        to the doctor listed first.
+        """
+        duration = self._duration(duration_minutes)
+        after = self._align(int(max(after or 0, time.time())))
+        horizon = after + self.horizon
+        # No doctor can be free before the first opening at or after after
+        floor = self._first_free(None, after, duration, horizon)
+        if floor is None:
+            return None
+
+        calendars = self._calendar_index()
+        candidates = []
+        for position, doctor_id in enumerate(self.groups.get(self._group_key(specialization, city), ())):
+            calendar = calendars.get(doctor_id)
+            candidates.append((self._lower_bound(calendar, floor, duration), position, doctor_id, calendar))
+        candidates.sort()
+
+        self.stats["searches"] += 1
+        best, best_doctor = horizon, None
+        for bound, _, doctor_id, calendar in candidates:
+            if bound >= best:
+                break
+            self.stats["doctors_scanned"] += 1
+            start = self._first_free(calendar, floor, duration, best)
+            if start is not None:
+                best, best_doctor = start, doctor_id
+                if best == floor:
+                    break
+        return self._slot(best_doctor, best, duration) if best_doctor is not None else None
+
+    def _slot(self, doctor_id: str, start: int, duration: int) -> Dict[str, Any]:
+        doctor = self.doctors.get(doctor_id, {})
+        return {"doctor_id": doctor_id, "doctor_name": doctor.get('name'),
+                "specialization": doctor.get('specialization'), "location": doctor.get('location'),
+                "start": start, "end": start + duration}
+
+    # Booking
+    def book(self, doctor_id: str, patient_id: str, start: float,
+             duration_minutes: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Book [start, start + duration) with a doctor, atomically
+
+        The conflict check and the insert happen under the doctor's lock, so
+        two patients racing for one slot cannot both get it.
+        """
+        duration = self._duration(duration_minutes)
+        start = int(start)
+        end = start + duration
+        if doctor_id not in self.doctors:
+            raise Exception("Doctor not found")
+        if start != self._align(start) or not self._in_hours(start, end):
+            raise SlotConflictError(f"Slot must start on the {self.slot // 60}-minute grid within working hours")
+        now = time.time()
+        if start < now or start > now + self.horizon:
+            raise SlotConflictError("Slot must be in the future and within the booking horizon")
+
+        with self._locks.for_key(doctor_id):
+            calendar = self._calendar(doctor_id)
+            if calendar.conflict(start, end) is not None:
+                self.stats["conflicts"] += 1
+                raise SlotConflictError("Slot is already booked")
+            calendar.add(start, end)
+            appointment = {
+                "id": f"appt_{secrets.token_hex(8)}",
+                "doctor_id": doctor_id,
+                "patient_id": patient_id,
+                "start": start,
+                "end": end,
+                "status": "booked",
+                "created_at": now
+            }
+            self.appointments[appointment['id']] = appointment
+            self._persist(appointment['id'])
+        self._user_index().setdefault(patient_id, []).append(appointment['id'])
+        self._user_index().setdefault(doctor_id, []).append(appointment['id'])
+        self.stats["booked"] += 1
+        return dict(appointment)
+
+    def book_first_available(self, specialization: str, city: str, patient_id: str, after: Optional[int] = None,
+                             duration_minutes: Optional[int] = None) -> Dict[str, Any]:
+        """Book the earliest free slot in a specialization and city, searching again if it is taken meanwhile"""
+        for _ in range(5):
+            slot = self.first_free_slot(specialization, city, after, duration_minutes)
+            if slot is None:
+                raise SlotConflictError("No free slot within the booking horizon")
+            try:
+                return self.book(slot['doctor_id'], patient_id, slot['start'], duration_minutes)
+            except SlotConflictError:
+                continue
+        raise SlotConflictError("Slots are being booked too fast; please retry")
+
+    def cancel(self, appointment_id: str, user_id: str) -> Dict[str, Any]:
+        """Cancel a booked appointment on behalf of its patient or doctor, freeing the slot"""
+        appointment = self.appointments.get(appointment_id)
+        if appointment is None or user_id not in (appointment['patient_id'], appointment['doctor_id']):
+            raise Exception("Appointment not found")
+        with self._locks.for_key(appointment['doctor_id']):
+            if appointment['status'] != 'booked':
+                raise SlotConflictError("Appointment is already cancelled")
+            self._calendar(appointment['doctor_id']).remove(appointment['start'], appointment['end'])
+            appointment['status'] = 'cancelled'
+            appointment['cancelled_at'] = time.time()
+            self._persist(appointment_id)
+        self.stats["cancelled"] += 1
+        return dict(appointment)
+
+    def _user_index(self) -> Dict[str, List[str]]:
+        """Patient or doctor id -> their appointment ids, in booking order; built on first use"""
+        if self._by_user is None:
+            self._by_user = {}
+            for appointment in sorted(self.appointments.values(), key=lambda a: a['created_at']):
+                self._by_user.setdefault(appointment['patient_id'], []).append(appointment['id'])
+                self._by_user.setdefault(appointment['doctor_id'], []).append(appointment['id'])
+        return self._by_user
+
+    def get_appointments(self, user_id: str, include_past: bool = False, limit: int = 100) -> List[Dict[str, Any]]:
+        """A patient's or doctor's booked appointments, soonest first (upcoming only unless include_past)"""
+        now = time.time()
+        found = [
+            self.appointments[appointment_id] for appointment_id in self._user_index().get(user_id, [])
+            if self.appointments[appointment_id]['status'] == 'booked'
+            and (include_past or self.appointments[appointment_id]['end'] > now)
+        ]
+        return [dict(appointment) for appointment in sorted(found, key=lambda a: a['start'])[:limit]]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get scheduling statistics"""
+        calendars = self._calendar_index()
+        return {
+            **self.stats,
+            "doctors": len(self.doctors),
+            "groups": len(self.groups),
+            "appointments": len(self.appointments),
+            "booked_intervals": sum(calendar.booked for calendar in calendars.values()),
+            "runs": sum(len(calendar.starts) for calendar in calendars.values()),
+            "avg_doctors_scanned": round(self.stats["doctors_scanned"] / self.stats["searches"], 2)
+            if self.stats["searches"] else None
+        }
@@ -5,11 +5,15 @@ Handles user data management and authentication logic
 
 import time
 import hashlib
+import heapq
 from typing import Dict, Optional, Any
 from models.request_models import PatientRegisterRequest, DoctorRegisterRequest
+from services.persistence_service import PersistenceService
+from services.event_bus import EventBus, PatientRegistered, DoctorRegistered, ProfileUpdated
+from services.striped_locks import StripedLock
 
 class AuthService:
-    def __init__(self):
+    def __init__(self, persistence: Optional[PersistenceService] = None, event_bus: Optional[EventBus] = None):
         """Initialize authentication service"""
         # In-memory storage for demo purposes
         # In production, use proper database
@@ -22,9 +26,22 @@ class AuthService:
         self.temp_patient_data: Dict[str, Dict] = {}
         self.temp_doctor_data: Dict[str, Dict] = {}
         
+        # Check-then-act updates on one phone number hold that phone's stripe
+        self._locks = StripedLock()
+        
         # Mock existing users for testing
         self._initialize_mock_data()
         
+        # Optional write-ahead log + snapshots so the stores survive restarts
+        self.persistence = persistence
+        if persistence is not None:
+            for name in ("patients", "doctors", "temp_patient_data", "temp_doctor_data"):
+                persistence.register(name, getattr(self, name))
+        
+        # Side effects of registrations and profile changes (logging, search indexing)
+        # run in event bus subscribers, after the request has been answered
+        self.event_bus = event_bus
+        
         print("✅ Auth Service initialized")
     
     def _initialize_mock_data(self):
@@ -44,7 +61,8 @@ class AuthService:
             "gender": "Female",
             "address": "123 Main St, Mumbai, Maharashtra 400001",
             "password_hash": self._hash_password("password123"),
-            "created_at": time.time()
+            "created_at": time.time(),
+            "version": 1
         }
         
         # Mock doctor data
@@ -56,11 +74,21 @@ class AuthService:
             "specialization": "Cardiology",
             "location": "Mumbai",
             "password_hash": self._hash_password("doctor123"),
-            "created_at": time.time()
+            "created_at": time.time(),
+            "version": 1
         }
         
         print("📄 Mock data initialized")
     
+    async def _publish(self, event):
+        if self.event_bus is not None:
+            await self.event_bus.publish(event)
+    
+    def _persist(self, store: str, phone: str):
+        """Log a changed (or removed) record to the write-ahead log"""
+        if self.persistence is not None:
+            self.persistence.record(store, phone)
+    
     def _hash_password(self, password: str) -> str:
         """Hash password using SHA-256"""
         return hashlib.sha256(password.encode()).hexdigest()
@@ -96,24 +124,38 @@ class AuthService:
     
     async def store_temp_patient_data(self, phone: str, data: Dict[str, Any]):
         """Store temporary patient registration data"""
-        self.temp_patient_data[phone] = {
-            **data,
-            'timestamp': time.time()
-        }
+        with self._locks.for_key(phone):
+            # Pending registrations are persisted, so keep only the hash like a completed profile
+            pending = {key: value for key, value in data.items() if key != 'password'}
+            self.temp_patient_data[phone] = {
+                **pending,
+                'password_hash': self._hash_password(data['password']),
+                'timestamp': time.time()
+            }
+            self._persist("temp_patient_data", phone)
         print(f"📝 Stored temp patient data for {phone}")
     
     async def complete_patient_registration(self, phone: str) -> Dict[str, Any]:
         """Complete patient registration after OTP verification"""
-        if phone not in self.temp_patient_data:
+        with self._locks.for_key(phone):
+            patient_data = self._complete_patient_registration(phone)
+        await self._publish(PatientRegistered(patient_data))
+        return patient_data
+    
+    def _complete_patient_registration(self, phone: str) -> Dict[str, Any]:
+        # Consume the pending registration first: a concurrent completion finds nothing
+        temp_data = self.temp_patient_data.pop(phone, None)
+        if temp_data is None:
             raise Exception("Registration data not found. Please start registration again.")
-        
-        temp_data = self.temp_patient_data[phone]
+        self._persist("temp_patient_data", phone)
         
         # Check if temp data is expired (30 minutes)
         if time.time() - temp_data['timestamp'] > 1800:
-            del self.temp_patient_data[phone]
             raise Exception("Registration session expired. Please start again.")
         
+        if phone in self.patients:
+            raise Exception("Phone number already registered")
+        
         # Create patient record
         patient_id = self._generate_user_id("patient")
         patient_data = {
@@ -123,29 +165,32 @@ class AuthService:
             "phone": temp_data['phone'],
             "gender": temp_data['gender'],
             "address": temp_data['address'],
-            "password_hash": self._hash_password(temp_data['password']),
+            "password_hash": temp_data['password_hash'],
             "age": 25,  # Default for demo
             "sex": temp_data['gender'],
             "weight": "N/A",
             "height": "N/A",
             "allergies": "None",
             "chronic": "None",
-            "created_at": time.time()
+            "created_at": time.time(),
+            "version": 1
         }
         
         # Store patient
         self.patients[phone] = patient_data
-        
-        # Clean up temp data
-        del self.temp_patient_data[phone]
-        
-        print(f"✅ Patient registration completed for {phone}")
+        self._persist("patients", phone)
         
         # Return safe data
         safe_data = patient_data.copy()
         safe_data.pop('password_hash', None)
         return safe_data
     
+    async def update_patient_profile(self, phone: str, updates: Dict[str, Any]) -> Dict[str, Any]:
+        """Update patient profile fields and bump the record version"""
+        patient_data = self._update_profile("patients", phone, updates, "Patient")
+        await self._publish(ProfileUpdated("patient", patient_data))
+        return patient_data
+    
     # Doctor Authentication Methods
     async def get_doctor_by_phone(self, phone: str) -> Optional[Dict[str, Any]]:
         """Get doctor data by phone number"""
@@ -181,24 +226,38 @@ class AuthService:
     
     async def store_temp_doctor_data(self, phone: str, data: Dict[str, Any]):
         """Store temporary doctor registration data"""
-        self.temp_doctor_data[phone] = {
-            **data,
-            'timestamp': time.time()
-        }
+        with self._locks.for_key(phone):
+            # Pending registrations are persisted, so keep only the hash like a completed profile
+            pending = {key: value for key, value in data.items() if key != 'password'}
+            self.temp_doctor_data[phone] = {
+                **pending,
+                'password_hash': self._hash_password(data['password']),
+                'timestamp': time.time()
+            }
+            self._persist("temp_doctor_data", phone)
         print(f"📝 Stored temp doctor data for {phone}")
     
     async def complete_doctor_registration(self, phone: str) -> Dict[str, Any]:
         """Complete doctor registration after OTP verification"""
-        if phone not in self.temp_doctor_data:
+        with self._locks.for_key(phone):
+            doctor_data = self._complete_doctor_registration(phone)
+        await self._publish(DoctorRegistered(doctor_data))
+        return doctor_data
+    
+    def _complete_doctor_registration(self, phone: str) -> Dict[str, Any]:
+        # Consume the pending registration first: a concurrent completion finds nothing
+        temp_data = self.temp_doctor_data.pop(phone, None)
+        if temp_data is None:
             raise Exception("Registration data not found. Please start registration again.")
-        
-        temp_data = self.temp_doctor_data[phone]
+        self._persist("temp_doctor_data", phone)
         
         # Check if temp data is expired (30 minutes)
         if time.time() - temp_data['timestamp'] > 1800:
-            del self.temp_doctor_data[phone]
             raise Exception("Registration session expired. Please start again.")
         
+        if phone in self.doctors:
+            raise Exception("Phone number already registered")
+        
         # Create doctor record
         doctor_id = self._generate_user_id("doctor")
         doctor_data = {
@@ -208,23 +267,70 @@ class AuthService:
             "phone": temp_data['phone'],
             "specialization": temp_data['specialization'],
             "location": temp_data['location'],
-            "password_hash": self._hash_password(temp_data['password']),
-            "created_at": time.time()
+            "password_hash": temp_data['password_hash'],
+            "created_at": time.time(),
+            "version": 1
         }
         
         # Store doctor
         self.doctors[phone] = doctor_data
-        
-        # Clean up temp data
-        del self.temp_doctor_data[phone]
-        
-        print(f"✅ Doctor registration completed for {phone}")
+        self._persist("doctors", phone)
         
         # Return safe data
         safe_data = doctor_data.copy()
         safe_data.pop('password_hash', None)
         return safe_data
     
+    async def update_doctor_profile(self, phone: str, updates: Dict[str, Any]) -> Dict[str, Any]:
+        """Update doctor profile fields and bump the record version"""
+        doctor_data = self._update_profile("doctors", phone, updates, "Doctor")
+        await self._publish(ProfileUpdated("doctor", doctor_data))
+        return doctor_data
+    
+    def _update_profile(self, store_name: str, phone: str, updates: Dict[str, Any], label: str) -> Dict[str, Any]:
+        with self._locks.for_key(phone):
+            return self._apply_profile_update(store_name, phone, updates, label)
+    
+    def _apply_profile_update(self, store_name: str, phone: str, updates: Dict[str, Any], label: str) -> Dict[str, Any]:
+        store: Dict[str, Dict] = getattr(self, store_name)
+        record = store.get(phone)
+        if not record:
+            raise Exception(f"{label} not found")
+        
+        if 'email' in updates:
+            for other in store.values():
+                if other is not record and other['email'] == updates['email']:
+                    raise Exception("Email address already registered")
+        
+        record.update(updates)
+        # Every write bumps the version, which is what profile ETags are derived from
+        record['version'] = record.get('version', 0) + 1
+        record['updated_at'] = time.time()
+        self._persist(store_name, phone)
+        print(f"📝 {label} profile updated for {phone} (v{record['version']})")
+        
+        safe_data = record.copy()
+        safe_data.pop('password_hash', None)
+        return safe_data
+    
+    def evict_pending_registrations(self, store_name: str, count: int) -> int:
+        """
+        Drop up to count pending registrations from temp_patient_data or
+        temp_doctor_data, oldest first; used by the memory watchdog
+
+        The user has to register again, which beats running out of memory.
+        """
+        store = getattr(self, store_name)
+        evicted = 0
+        for phone, data in heapq.nsmallest(count, list(store.items()), key=lambda item: item[1]['timestamp']):
+            with self._locks.for_key(phone):
+                if store.get(phone) is not data:
+                    continue
+                del store[phone]
+                self._persist(store_name, phone)
+            evicted += 1
+        return evicted
+    
     # Utility methods
     def get_stats(self) -> Dict[str, int]:
         """Get service statistics"""
@@ -0,0 +1,151 @@
+"""
+Chat Service for MediSync Healthcare Platform
+Handles streaming chat responses to the AI chat widget over Server-Sent Events
+"""
+
+import asyncio
+import itertools
+import json
+import os
+import re
+from contextlib import aclosing
+from typing import Dict, Optional, Any, AsyncIterator
+
+_END = object()
+
+
+class ChatSlot:
+    """One reserved session slot; releasing it twice is a no-op.
+
+    An unused slot is also released when it is garbage collected, e.g. when a
+    response is dropped before its stream ever starts.
+    """
+
+    def __init__(self, service: "ChatService"):
+        self._service = service
+
+    def release(self):
+        if self._service is not None:
+            self._service.active_sessions -= 1
+            self._service = None
+
+    __del__ = release
+
+
+class RuleBasedResponder:
+    """Streams the symptom checker's advice clause by clause.
+
+    Any object with an async ``stream(message)`` generator can be plugged
+    into ``ChatService`` in its place (e.g. an LLM-backed responder).
+    """
+
+    def __init__(self, symptom_service, chunk_delay: float = 0.0):
+        self.symptom_service = symptom_service
+        self.chunk_delay = chunk_delay
+
+    async def stream(self, message: str) -> AsyncIterator[str]:
+        result = self.symptom_service.check_symptoms(message)
+        for chunk in re.findall(r"[^,.;!?]+[,.;!?]*\s*", result['response']):
+            yield chunk
+            # Yield control between chunks so one long answer never starves other sessions
+            await asyncio.sleep(self.chunk_delay)
+
+
+class ChatService:
+    def __init__(self, responder, max_sessions: Optional[int] = None, queue_size: Optional[int] = None):
+        """Initialize chat service with a pluggable responder"""
+        self.responder = responder
+        self.max_sessions = max_sessions or int(os.getenv('CHAT_MAX_SESSIONS', '5000'))
+        # Chunks buffered per session before the responder is paused (backpressure)
+        self.queue_size = queue_size or int(os.getenv('CHAT_STREAM_QUEUE_SIZE', '16'))
+
+        self.active_sessions = 0
+        self._session_ids = itertools.count(1)
+        self.stats = {
+            "sessions_started": 0,
+            "sessions_completed": 0,
+            "sessions_cancelled": 0,
+            "sessions_rejected": 0,
+            "sessions_failed": 0
+        }
+
+        print("✅ Chat Service initialized")
+
+    def at_capacity(self) -> bool:
+        """Check whether a new session would exceed the concurrency limit"""
+        return self.active_sessions >= self.max_sessions
+
+    def reserve(self) -> Optional[ChatSlot]:
+        """Take a session slot now, before any await, or None at capacity"""
+        if self.at_capacity():
+            self.stats["sessions_rejected"] += 1
+            return None
+        self.active_sessions += 1
+        return ChatSlot(self)
+
+    @staticmethod
+    def format_event(data: Dict[str, Any], event: Optional[str] = None) -> str:
+        """Encode one Server-Sent Events message"""
+        prefix = f"event: {event}\n" if event else ""
+        return f"{prefix}data: {json.dumps(data)}\n\n"
+
+    async def stream(self, message: str, slot: Optional[ChatSlot] = None) -> AsyncIterator[str]:
+        """
+        Stream a chat response as Server-Sent Events
+
+        The responder runs in its own task and feeds a bounded queue, so a
+        slow client pauses the responder instead of buffering the whole
+        answer. Closing the generator (e.g. when the client disconnects)
+        cancels the responder task. The session runs in slot, taken with
+        reserve() when the request is accepted, or in one reserved here; it
+        is released when the stream ends.
+        """
+        slot = slot or self.reserve()
+        if slot is None:
+            yield self.format_event({"message": "Chat is busy. Please try again shortly."}, "error")
+            return
+
+        self.stats["sessions_started"] += 1
+        session_id = next(self._session_ids)
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+
+        async def produce():
+            try:
+                async with aclosing(self.responder.stream(message)) as chunks:
+                    async for chunk in chunks:
+                        await queue.put(chunk)
+                await queue.put(_END)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                await queue.put(e)
+
+        producer = asyncio.create_task(produce())
+        outcome = "sessions_cancelled"
+        try:
+            # Sent before the responder runs so the client sees its first byte immediately
+            yield self.format_event({"session_id": session_id}, "start")
+            while True:
+                item = await queue.get()
+                if item is _END:
+                    break
+                if isinstance(item, Exception):
+                    outcome = "sessions_failed"
+                    print(f"❌ Chat responder error: {str(item)}")
+                    yield self.format_event({"message": "Failed to generate a response"}, "error")
+                    return
+                yield self.format_event({"delta": item})
+            yield self.format_event({"session_id": session_id}, "done")
+            outcome = "sessions_completed"
+        finally:
+            producer.cancel()
+            slot.release()
+            self.stats[outcome] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get service statistics"""
+        return {
+            "active_sessions": self.active_sessions,
+            "max_sessions": self.max_sessions,
+            **self.stats
+        }
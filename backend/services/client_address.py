@@ -0,0 +1,64 @@
+"""
+Client Address for MediSync Healthcare Platform
+Handles finding the real client IP behind trusted reverse proxies, for abuse detection and idempotency keys
+"""
+
+import ipaddress
+import os
+from typing import Any, Dict, Iterable, List, Optional
+
+
+class ClientAddressResolver:
+    """
+    The client's address: the peer itself, unless the peer is a trusted proxy
+
+    Behind a proxy every request arrives from the proxy's address, so keying
+    limits on the peer lumps all users together. A forwarding header cannot
+    be taken at face value either, since any client can send one. The header
+    is therefore only read when the peer is in TRUSTED_PROXIES, and then from
+    the right: each hop a trusted proxy appended is skipped until the first
+    address that is not a trusted proxy, which is the one the outermost
+    trusted proxy saw. Entries further left are client-supplied and ignored.
+    """
+
+    def __init__(self, trusted_proxies: Optional[Iterable[str]] = None, header: Optional[str] = None):
+        """Initialize from TRUSTED_PROXIES (comma-separated IPs or CIDRs) and CLIENT_IP_HEADER"""
+        if trusted_proxies is None:
+            trusted_proxies = [entry for entry in os.getenv('TRUSTED_PROXIES', '').split(',') if entry.strip()]
+        self.trusted = [ipaddress.ip_network(entry.strip(), strict=False) for entry in trusted_proxies]
+        self.header = (header or os.getenv('CLIENT_IP_HEADER', 'X-Forwarded-For')).lower()
+        self._header_bytes = self.header.encode('latin-1')
+
+    def _is_trusted(self, address: str) -> bool:
+        try:
+            ip = ipaddress.ip_address(address)
+        except ValueError:
+            return False
+        return any(ip in network for network in self.trusted)
+
+    def resolve(self, peer: Optional[str], forwarded: List[str]) -> Optional[str]:
+        """Client address given the peer and the forwarding header's values, in the order received"""
+        if peer is None or not self.trusted or not self._is_trusted(peer):
+            return peer
+        hops = [hop.strip() for value in forwarded for hop in value.split(',')]
+        client = peer
+        for hop in reversed(hops):
+            try:
+                ipaddress.ip_address(hop)
+            except ValueError:
+                # Garbage is not an address to key on; keep the last proxy that forwarded it
+                break
+            client = hop
+            if not self._is_trusted(hop):
+                break
+        return client
+
+    def for_request(self, request: Any) -> Optional[str]:
+        """Client address of a Starlette request"""
+        return self.resolve(request.client.host if request.client else None, request.headers.getlist(self.header))
+
+    def for_scope(self, scope: Dict[str, Any]) -> Optional[str]:
+        """Client address of a raw ASGI scope"""
+        peer = scope.get("client")
+        forwarded = [value.decode('latin-1') for name, value in scope["headers"] if name == self._header_bytes]
+        return self.resolve(peer[0] if peer else None, forwarded)
@@ -0,0 +1,196 @@
+"""
+Consent Service for MediSync Healthcare Platform
+Handles doctor requests for patient record access and patient decisions
+"""
+
+import itertools
+import os
+import time
+from typing import Dict, List, Optional, Any, AsyncIterator
+
+from services.notification_hub import NotificationHub, format_sse
+
+
+class ConsentService:
+    def __init__(self, hub: NotificationHub, request_ttl: Optional[int] = None, access_ttl: Optional[int] = None):
+        """Initialize consent service on top of a notification hub"""
+        self.hub = hub
+        # Pending requests expire after 10 minutes by default
+        self.request_ttl = request_ttl or int(os.getenv('CONSENT_REQUEST_TTL', '600'))
+        # Approved access lasts a day by default, unless the patient revokes it sooner
+        self.access_ttl = access_ttl or int(os.getenv('CONSENT_ACCESS_TTL', '86400'))
+
+        self.requests: Dict[str, Dict[str, Any]] = {}
+        self.pending_by_patient: Dict[str, Dict[str, None]] = {}
+        # Every request ever made to a patient, oldest first (their access log)
+        self.requests_by_patient: Dict[str, List[str]] = {}
+        self._ids = itertools.count(1)
+
+        print("✅ Consent Service initialized")
+
+    @staticmethod
+    def patient_topic(patient_id: str) -> str:
+        return f"consent:patient:{patient_id}"
+
+    @staticmethod
+    def request_topic(request_id: str) -> str:
+        return f"consent:request:{request_id}"
+
+    def _public(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        return dict(request)
+
+    def _set_status(self, request: Dict[str, Any], status: str):
+        request['status'] = status
+        request['decided_at'] = time.time()
+        pending = self.pending_by_patient.get(request['patient_id'])
+        if pending is not None:
+            pending.pop(request['id'], None)
+            if not pending:
+                del self.pending_by_patient[request['patient_id']]
+        self.hub.publish(self.request_topic(request['id']), self._public(request))
+        self.hub.publish(self.patient_topic(request['patient_id']),
+                         {"event": "consent_resolved", "request": self._public(request)})
+
+    def _expire_if_stale(self, request: Dict[str, Any]):
+        if request['status'] == 'pending' and time.time() - request['created_at'] > self.request_ttl:
+            self._set_status(request, 'expired')
+
+    def create_request(self, doctor_id: str, patient_id: str) -> Dict[str, Any]:
+        """Create (or return the already pending) consent request from a doctor to a patient"""
+        for request_id in list(self.pending_by_patient.get(patient_id, {})):
+            request = self.requests[request_id]
+            self._expire_if_stale(request)
+            if request['status'] == 'pending' and request['doctor_id'] == doctor_id:
+                return self._public(request)
+
+        request_id = f"consent_{int(time.time())}_{next(self._ids)}"
+        request = {
+            "id": request_id,
+            "doctor_id": doctor_id,
+            "patient_id": patient_id,
+            "status": "pending",
+            "created_at": time.time(),
+            "decided_at": None,
+            "expires_at": None
+        }
+        self.requests[request_id] = request
+        self.pending_by_patient.setdefault(patient_id, {})[request_id] = None
+        self.requests_by_patient.setdefault(patient_id, []).append(request_id)
+
+        self.hub.publish(self.patient_topic(patient_id),
+                         {"event": "consent_requested", "request": self._public(request)})
+        print(f"🔐 Consent requested by {doctor_id} for {patient_id}")
+        return self._public(request)
+
+    def get_request(self, request_id: str) -> Optional[Dict[str, Any]]:
+        """Get a consent request by id"""
+        request = self.requests.get(request_id)
+        if request is None:
+            return None
+        self._expire_if_stale(request)
+        return self._public(request)
+
+    def decide(self, request_id: str, patient_id: str, approve: bool) -> Dict[str, Any]:
+        """Record the patient's decision and wake every waiter on the request"""
+        request = self.requests.get(request_id)
+        if request is None or request['patient_id'] != patient_id:
+            raise Exception("Consent request not found")
+
+        self._expire_if_stale(request)
+        if request['status'] != 'pending':
+            raise Exception(f"Consent request is already {request['status']}")
+
+        if approve:
+            request['expires_at'] = time.time() + self.access_ttl
+        self._set_status(request, 'approved' if approve else 'denied')
+        print(f"🔐 Consent {request['status']} by {patient_id} for {request['doctor_id']}")
+        return self._public(request)
+
+    def revoke(self, request_id: str, patient_id: str) -> Dict[str, Any]:
+        """Withdraw an approval before it expires; the doctor loses access at once"""
+        request = self.requests.get(request_id)
+        if request is None or request['patient_id'] != patient_id:
+            raise Exception("Consent request not found")
+        if request['status'] != 'approved' or request['expires_at'] <= time.time():
+            raise Exception("Only an active approval can be revoked")
+
+        request['expires_at'] = time.time()
+        self._set_status(request, 'revoked')
+        print(f"🔐 Consent revoked by {patient_id} for {request['doctor_id']}")
+        return self._public(request)
+
+    def get_pending(self, patient_id: str) -> List[Dict[str, Any]]:
+        """List a patient's pending consent requests"""
+        pending = []
+        for request_id in list(self.pending_by_patient.get(patient_id, {})):
+            request = self.requests[request_id]
+            self._expire_if_stale(request)
+            if request['status'] == 'pending':
+                pending.append(self._public(request))
+        return pending
+
+    def has_access(self, doctor_id: str, patient_id: str) -> bool:
+        """Whether the patient has approved a consent request from this doctor that has not expired or been revoked"""
+        now = time.time()
+        for request_id in self.requests_by_patient.get(patient_id, ()):
+            request = self.requests[request_id]
+            if request['doctor_id'] == doctor_id and request['status'] == 'approved' and request['expires_at'] > now:
+                return True
+        return False
+
+    def get_history(self, patient_id: str) -> List[Dict[str, Any]]:
+        """
+        Every consent request made to a patient, oldest first
+
+        Read-only: stale pending requests are reported as expired without
+        publishing anything, so this is safe to call off the event loop.
+        """
+        history = []
+        for request_id in list(self.requests_by_patient.get(patient_id, ())):
+            request = self._public(self.requests[request_id])
+            if request['status'] == 'pending' and time.time() - request['created_at'] > self.request_ttl:
+                request['status'] = 'expired'
+            history.append(request)
+        return history
+
+    async def wait_for_decision(self, request_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+        """
+        Long-poll for a decision on a consent request
+
+        Returns as soon as the request is no longer pending, or with the
+        still-pending request once the timeout elapses.
+        """
+        request = self.get_request(request_id)
+        if request is None or request['status'] != 'pending':
+            return request
+
+        # No await between the check above and subscribing, so no decision can be missed
+        deadline = time.monotonic() + min(timeout, self.request_ttl)
+        with self.hub.subscribe(self.request_topic(request_id)) as subscription:
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or await subscription.get(remaining) is None:
+                    return self.get_request(request_id)
+                current = self.get_request(request_id)
+                if current['status'] != 'pending':
+                    return current
+
+    async def patient_events(self, patient_id: str, heartbeat: float = 15.0) -> AsyncIterator[str]:
+        """Stream a patient's pending requests, then new requests and resolutions, as SSE"""
+        with self.hub.subscribe(self.patient_topic(patient_id)) as subscription:
+            for request in self.get_pending(patient_id):
+                yield format_sse(request, "consent_requested")
+            while True:
+                message = await subscription.get(heartbeat)
+                if message is None:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield format_sse(message['request'], message['event'])
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get service statistics"""
+        return {
+            "total_requests": len(self.requests),
+            "pending_patients": len(self.pending_by_patient),
+            **self.hub.get_stats()
+        }
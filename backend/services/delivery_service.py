@@ -0,0 +1,228 @@
+"""
+Delivery Status Service for MediSync Healthcare Platform
+Handles SMS delivery-status callbacks: immediate acknowledgement, batched application
+and per-carrier-prefix delivery aggregates
+"""
+
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Dict, List, Optional, Any, Tuple
+
+# Later statuses never move a message back to an earlier one (callbacks can arrive out of order)
+STATUS_RANK = {
+    "accepted": 0, "queued": 0, "sending": 1, "sent": 2,
+    "delivered": 3, "undelivered": 3, "failed": 3, "read": 4
+}
+DELIVERED = ("delivered", "read")
+
+
+class DeliveryStatusService:
+    def __init__(self, batch_size: Optional[int] = None, batch_interval: Optional[float] = None,
+                 buffer_size: Optional[int] = None, prefix_digits: Optional[int] = None,
+                 track_ttl: Optional[float] = None):
+        """Initialize delivery status tracking"""
+        self.batch_size = batch_size or int(os.getenv('DELIVERY_BATCH_SIZE', '1000'))
+        self.batch_interval = batch_interval or float(os.getenv('DELIVERY_BATCH_INTERVAL', '0.5'))
+        self.buffer_size = buffer_size or int(os.getenv('DELIVERY_BUFFER_SIZE', '100000'))
+        # "+91" plus the first digits of the subscriber number identify the carrier series
+        self.prefix_digits = prefix_digits or int(os.getenv('DELIVERY_PREFIX_DIGITS', '4'))
+        self.track_ttl = track_ttl or float(os.getenv('DELIVERY_TRACK_TTL', '3600'))
+
+        # message id -> {phone, prefix, provider, status, sent_at, updated_at, error_code}, oldest first
+        self.messages: Dict[str, Dict[str, Any]] = {}
+        # Callbacks that arrived before their send was tracked: id -> (status, error_code, received_at)
+        # of the furthest status seen, least recently updated first. One entry per id, so a flood of
+        # callbacks for one unknown id costs no more memory than a single one
+        self.orphans: Dict[str, Tuple[str, Optional[str], float]] = {}
+        self.prefixes: Dict[str, Dict[str, Any]] = {}
+
+        self._buffer: deque = deque()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._worker: Optional[asyncio.Task] = None
+        self.stats = {"received": 0, "applied": 0, "batches": 0, "ignored": 0, "rejected": 0}
+
+        print("✅ Delivery Status Service initialized")
+
+    def carrier_prefix(self, phone: str) -> str:
+        country = 3 if phone.startswith('+91') else 2
+        return phone[:country + self.prefix_digits]
+
+    def track(self, message_id: str, phone: str, provider: str):
+        """Start tracking a sent message so its callbacks can be matched by id"""
+        now = time.time()
+        prefix = self.carrier_prefix(phone)
+        self.messages[message_id] = {
+            "phone": phone,
+            "prefix": prefix,
+            "provider": provider,
+            "status": "accepted",
+            "sent_at": now,
+            "updated_at": now,
+            "error_code": None
+        }
+        self._prefix_stats(prefix)["tracked"] += 1
+        orphan = self.orphans.pop(message_id, None)
+        if orphan is not None:
+            self._apply(message_id, *orphan)
+
+    def _prefix_stats(self, prefix: str) -> Dict[str, Any]:
+        stats = self.prefixes.get(prefix)
+        if stats is None:
+            stats = self.prefixes[prefix] = {
+                "tracked": 0, "delivered": 0, "failed": 0, "latencies": deque(maxlen=1000)
+            }
+        return stats
+
+    def enqueue(self, message_id: str, status: str, error_code: Optional[str] = None) -> bool:
+        """Accept one callback for later batched application; False when the buffer is full"""
+        if len(self._buffer) >= self.buffer_size:
+            self.stats["rejected"] += 1
+            return False
+        self._buffer.append((message_id, status.lower(), error_code, time.time()))
+        self.stats["received"] += 1
+        if len(self._buffer) >= self.batch_size and self._wakeup is not None:
+            self._wakeup.set()
+        return True
+
+    def apply_batch(self) -> int:
+        """Apply every buffered callback; returns how many were applied"""
+        buffer, self._buffer = self._buffer, deque()
+        for message_id, status, error_code, received_at in buffer:
+            self._apply(message_id, status, error_code, received_at)
+        self.stats["batches"] += 1
+        self._expire()
+        return len(buffer)
+
+    def _apply(self, message_id: str, status: str, error_code: Optional[str], received_at: float):
+        rank = STATUS_RANK.get(status)
+        record = self.messages.get(message_id)
+        if rank is None:
+            self.stats["ignored"] += 1
+            return
+        if record is None:
+            self._keep_orphan(message_id, status, rank, error_code, received_at)
+            return
+
+        current = STATUS_RANK[record["status"]]
+        if rank < current or (rank == current and record["status"] not in ("accepted", "queued")):
+            # Stale or duplicate callback
+            self.stats["ignored"] += 1
+            return
+
+        record["status"] = status
+        record["updated_at"] = received_at
+        record["error_code"] = error_code
+        self.stats["applied"] += 1
+
+        if rank >= 3 and current < 3:
+            stats = self._prefix_stats(record["prefix"])
+            if status in DELIVERED:
+                stats["delivered"] += 1
+                stats["latencies"].append(received_at - record["sent_at"])
+            else:
+                stats["failed"] += 1
+
+    def _keep_orphan(self, message_id: str, status: str, rank: int, error_code: Optional[str], received_at: float):
+        """Remember the furthest status of an untracked message; earlier ones add nothing once it is tracked"""
+        previous = self.orphans.get(message_id)
+        if previous is None:
+            if len(self.orphans) >= self.buffer_size:
+                self.stats["ignored"] += 1
+                return
+        else:
+            # The same stale/duplicate rule as for tracked messages; either way one of the two is dropped
+            self.stats["ignored"] += 1
+            current = STATUS_RANK[previous[0]]
+            if rank < current or (rank == current and previous[0] not in ("accepted", "queued")):
+                return
+            # Re-inserted at the end, so the dict stays ordered by received_at for _expire
+            del self.orphans[message_id]
+        self.orphans[message_id] = (status, error_code, received_at)
+
+    def _expire(self):
+        cutoff = time.time() - self.track_ttl
+        while self.messages:
+            message_id = next(iter(self.messages))
+            if self.messages[message_id]["sent_at"] >= cutoff:
+                break
+            del self.messages[message_id]
+        while self.orphans:
+            message_id = next(iter(self.orphans))
+            if self.orphans[message_id][2] >= cutoff:
+                break
+            del self.orphans[message_id]
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.batch_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if self._buffer:
+                self.apply_batch()
+
+    def start(self):
+        """Start the batch applier on the running event loop"""
+        if self._worker is None or self._worker.done():
+            self._wakeup = asyncio.Event()
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Stop the batch applier, applying whatever is still buffered"""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        if self._buffer:
+            self.apply_batch()
+
+    def get_message(self, message_id: str) -> Optional[Dict[str, Any]]:
+        record = self.messages.get(message_id)
+        return {"message_id": message_id, **record} if record else None
+
+    def recent_messages(self, phone: Optional[str] = None, limit: int = 20) -> List[Dict[str, Any]]:
+        """Most recently tracked messages, newest first"""
+        found = []
+        for message_id in reversed(self.messages):
+            record = self.messages[message_id]
+            if phone is None or record["phone"] == phone:
+                found.append({"message_id": message_id, **record})
+                if len(found) >= limit:
+                    break
+        return found
+
+    def get_prefix_stats(self, prefix: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Delivery rate and latency per carrier prefix, worst delivery rate first"""
+        rows = []
+        for name, stats in self.prefixes.items():
+            if prefix is not None and not name.startswith(prefix):
+                continue
+            finished = stats["delivered"] + stats["failed"]
+            latencies = sorted(stats["latencies"])
+            rows.append({
+                "prefix": name,
+                "tracked": stats["tracked"],
+                "delivered": stats["delivered"],
+                "failed": stats["failed"],
+                "pending": stats["tracked"] - finished,
+                "delivery_rate": round(stats["delivered"] / finished, 4) if finished else None,
+                "latency_p50_s": round(latencies[len(latencies) // 2], 3) if latencies else None,
+                "latency_p95_s": round(latencies[int(len(latencies) * 0.95)], 3) if latencies else None
+            })
+        rows.sort(key=lambda r: (r["delivery_rate"] if r["delivery_rate"] is not None else 1.0, r["prefix"]))
+        return rows
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get service statistics"""
+        return {
+            **self.stats,
+            "buffered": len(self._buffer),
+            "tracked_messages": len(self.messages),
+            "orphaned": len(self.orphans)
+        }
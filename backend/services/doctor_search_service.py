@@ -0,0 +1,256 @@
+"""
+Doctor Search Service for MediSync Healthcare Platform
+Handles doctor directory search using inverted indexes over specialization and location
+"""
+
+import bisect
+import re
+from typing import Dict, List, Optional, Any, Iterable, Set
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Field weights used when ranking; a full-token match scores double a prefix match
+FIELDS = {"specialization": 2.0, "location": 1.0}
+EXACT_SCORE = 2.0
+PREFIX_SCORE = 1.0
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase text and split into alphanumeric tokens"""
+    return TOKEN_PATTERN.findall((text or '').lower())
+
+
+class FieldIndex:
+    """Inverted index for one field with a sorted vocabulary for prefix lookups"""
+
+    def __init__(self):
+        self.postings: Dict[str, Set[int]] = {}
+        self.vocabulary: List[str] = []
+        # Distinct field values for typeahead: normalized value -> [display value, doctor count]
+        self.values: Dict[str, List] = {}
+        self.value_postings: Dict[str, Set[str]] = {}
+
+    def add(self, doc_id: int, value: str):
+        tokens = tokenize(value)
+        for token in set(tokens):
+            posting = self.postings.get(token)
+            if posting is None:
+                posting = self.postings[token] = set()
+                bisect.insort(self.vocabulary, token)
+            posting.add(doc_id)
+
+        normalized = ' '.join(tokens)
+        if not normalized:
+            return
+        entry = self.values.get(normalized)
+        if entry is None:
+            self.values[normalized] = [value.strip(), 1]
+            for token in set(tokens):
+                self.value_postings.setdefault(token, set()).add(normalized)
+        else:
+            entry[1] += 1
+
+    def remove(self, doc_id: int, value: str):
+        tokens = tokenize(value)
+        for token in set(tokens):
+            posting = self.postings.get(token)
+            if posting is None:
+                continue
+            posting.discard(doc_id)
+            if not posting:
+                del self.postings[token]
+                del self.vocabulary[bisect.bisect_left(self.vocabulary, token)]
+
+        normalized = ' '.join(tokens)
+        entry = self.values.get(normalized)
+        if entry is not None:
+            entry[1] -= 1
+            if entry[1] <= 0:
+                del self.values[normalized]
+                for token in set(tokens):
+                    self.value_postings[token].discard(normalized)
+                    if not self.value_postings[token]:
+                        del self.value_postings[token]
+
+    def expand(self, prefix: str) -> List[str]:
+        """All vocabulary tokens starting with prefix"""
+        start = bisect.bisect_left(self.vocabulary, prefix)
+        end = bisect.bisect_left(self.vocabulary, prefix + '\uffff')
+        return self.vocabulary[start:end]
+
+    def match(self, token: str, weight: float, sources: Dict[float, List[Set[int]]]):
+        """Collect posting lists matching token (exact or prefix), grouped by weighted score"""
+        for candidate in self.expand(token):
+            score = (EXACT_SCORE if candidate == token else PREFIX_SCORE) * weight
+            sources.setdefault(score, []).append(self.postings[candidate])
+
+
+def combine_buckets(left: Dict[float, Set[int]], right: Dict[float, Set[int]]) -> Dict[float, Set[int]]:
+    """AND two score-bucketed result sets, adding the scores of doctors present in both.
+
+    Scores only take a handful of distinct values, so results are kept as
+    {score: set of doc ids} and combined with set intersections rather than
+    per-doctor bookkeeping.
+    """
+    combined: Dict[float, Set[int]] = {}
+    for left_score, left_ids in left.items():
+        for right_score, right_ids in right.items():
+            both = left_ids & right_ids
+            if both:
+                score = left_score + right_score
+                if score in combined:
+                    combined[score] |= both
+                else:
+                    combined[score] = both
+    return combined
+
+
+class DoctorSearchService:
+    def __init__(self, doctors: Iterable[Dict[str, Any]] = ()):
+        """Initialize doctor search service and index existing doctors"""
+        self.fields = {name: FieldIndex() for name in FIELDS}
+        self.documents: Dict[int, Dict[str, Any]] = {}
+        self.doc_ids: Dict[str, int] = {}  # phone -> internal doc id
+        self._next_doc_id = 0
+
+        for doctor in doctors:
+            self.add_doctor(doctor)
+
+        print(f"✅ Doctor Search Service initialized ({len(self.documents)} doctors indexed)")
+
+    def add_doctor(self, doctor: Dict[str, Any]):
+        """Index a doctor, replacing any earlier entry for the same phone number"""
+        phone = doctor['phone']
+        if phone in self.doc_ids:
+            self.remove_doctor(phone)
+
+        doc_id = self._next_doc_id
+        self._next_doc_id += 1
+        self.doc_ids[phone] = doc_id
+        self.documents[doc_id] = {
+            "id": doctor['id'],
+            "name": doctor['name'],
+            "specialization": doctor.get('specialization', ''),
+            "location": doctor.get('location', '')
+        }
+        for name, index in self.fields.items():
+            index.add(doc_id, self.documents[doc_id][name])
+
+    def remove_doctor(self, phone: str):
+        """Remove a doctor from the index"""
+        doc_id = self.doc_ids.pop(phone, None)
+        if doc_id is None:
+            return
+        document = self.documents.pop(doc_id)
+        for name, index in self.fields.items():
+            index.remove(doc_id, document[name])
+
+    def _score_clause(self, text: str, fields: List[str]) -> Dict[float, Set[int]]:
+        """Score doctors matching every token of text in any of the given fields"""
+        combined: Optional[Dict[float, Set[int]]] = None
+        for token in tokenize(text):
+            sources: Dict[float, List[Set[int]]] = {}
+            for name in fields:
+                self.fields[name].match(token, FIELDS[name], sources)
+
+            # Posting sets are shared with the index, so only build new sets when merging
+            buckets: Dict[float, Set[int]] = {}
+            seen: Set[int] = set()
+            for score in sorted(sources, reverse=True):
+                postings = sources[score]
+                ids = postings[0] if len(postings) == 1 else set().union(*postings)
+                if len(sources) > 1:
+                    # Keep only each doctor's best score for this token
+                    ids = ids - seen
+                    seen |= ids
+                if ids:
+                    buckets[score] = ids
+
+            combined = buckets if combined is None else combine_buckets(combined, buckets)
+            if not combined:
+                return {}
+        return combined or {}
+
+    def search(self, query: Optional[str] = None, specialization: Optional[str] = None,
+               location: Optional[str] = None, page: int = 1, page_size: int = 20) -> Dict[str, Any]:
+        """
+        Search the doctor directory
+
+        Args:
+            query: Free text matched against specialization and location
+            specialization: Tokens that must match the specialization (prefixes allowed)
+            location: Tokens that must match the location (prefixes allowed)
+            page: 1-based page number
+            page_size: Results per page
+
+        Returns:
+            Dictionary with total matches and the requested page of results,
+            ranked by score and then by registration order
+        """
+        clauses = [
+            (query, list(FIELDS)),
+            (specialization, ["specialization"]),
+            (location, ["location"])
+        ]
+        combined: Optional[Dict[float, Set[int]]] = None
+        for text, fields in clauses:
+            if not text or not tokenize(text):
+                continue
+            buckets = self._score_clause(text, fields)
+            combined = buckets if combined is None else combine_buckets(combined, buckets)
+            if not combined:
+                break
+
+        if combined is None:
+            combined = {0.0: set(self.documents)}
+
+        # Walk buckets best-first and only sort the ones that overlap the requested page
+        offset = (page - 1) * page_size
+        results = []
+        skipped = 0
+        for score in sorted(combined, reverse=True):
+            ids = combined[score]
+            if skipped + len(ids) <= offset:
+                skipped += len(ids)
+                continue
+            for doc_id in sorted(ids)[max(offset - skipped, 0):]:
+                if len(results) == page_size:
+                    break
+                results.append({**self.documents[doc_id], "score": score})
+            skipped += len(ids)
+            if len(results) == page_size:
+                break
+
+        return {
+            "total": sum(len(ids) for ids in combined.values()),
+            "page": page,
+            "page_size": page_size,
+            "results": results
+        }
+
+    def suggest(self, field: str, prefix: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """Typeahead suggestions for a field: distinct values with a word starting with prefix"""
+        index = self.fields[field]
+        tokens = tokenize(prefix)
+        if not tokens:
+            return []
+
+        candidates: Optional[Set[str]] = None
+        for i, token in enumerate(tokens):
+            expanded = index.expand(token) if i == len(tokens) - 1 else ([token] if token in index.value_postings else [])
+            values = set()
+            for candidate in expanded:
+                values |= index.value_postings.get(candidate, set())
+            candidates = values if candidates is None else candidates & values
+            if not candidates:
+                return []
+
+        ranked = sorted(candidates, key=lambda v: (-index.values[v][1], v))[:limit]
+        return [{"value": index.values[v][0], "count": index.values[v][1]} for v in ranked]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get service statistics"""
+        return {
+            "doctors_indexed": len(self.documents),
+            **{f"{name}_terms": len(index.vocabulary) for name, index in self.fields.items()}
+        }
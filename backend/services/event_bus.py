@@ -0,0 +1,239 @@
+"""
+Event Bus for MediSync Healthcare Platform
+Handles in-process domain events: typed events, bounded per-subscriber queues, at-least-once delivery with retries
+"""
+
+import asyncio
+import inspect
+import os
+import secrets
+import time
+from collections import deque
+from typing import Dict, List, Optional, Any, Callable, Iterable, Tuple, Type
+
+
+class Event:
+    """
+    Something that has already happened, published once the state change is committed
+
+    Delivery is at-least-once, so a handler can see the same event twice
+    (after a retry); the id lets a handler that must not act twice tell.
+    """
+
+    __slots__ = ('id', 'occurred_at')
+
+    def __init__(self):
+        self.id = f"evt_{secrets.token_hex(8)}"
+        self.occurred_at = time.time()
+
+
+class PatientRegistered(Event):
+    __slots__ = ('patient',)
+
+    def __init__(self, patient: Dict[str, Any]):
+        super().__init__()
+        self.patient = patient
+
+
+class DoctorRegistered(Event):
+    __slots__ = ('doctor',)
+
+    def __init__(self, doctor: Dict[str, Any]):
+        super().__init__()
+        self.doctor = doctor
+
+
+class OTPVerified(Event):
+    __slots__ = ('phone', 'otp_type')
+
+    def __init__(self, phone: str, otp_type: str):
+        super().__init__()
+        self.phone = phone
+        self.otp_type = otp_type
+
+
+class ProfileUpdated(Event):
+    __slots__ = ('role', 'profile')
+
+    def __init__(self, role: str, profile: Dict[str, Any]):
+        super().__init__()
+        self.role = role
+        self.profile = profile
+
+
+class RecordSaved(Event):
+    __slots__ = ('record',)
+
+    def __init__(self, record: Dict[str, Any]):
+        super().__init__()
+        self.record = record
+
+
+class Subscription:
+    """One handler's bounded queue and the worker draining it, in publish order"""
+
+    def __init__(self, name: str, event_types: Tuple[Type[Event], ...], handler: Callable[[Event], Any],
+                 queue_size: int):
+        self.name = name
+        self.event_types = event_types
+        self.handler = handler
+        self.queue_size = queue_size
+        # Created on start, so the queue belongs to the loop that serves it
+        self.queue: Optional[asyncio.Queue] = None
+        self.worker: Optional[asyncio.Task] = None
+        # Publish-to-handled times in seconds, most recent last
+        self.lags: deque = deque(maxlen=1000)
+        self.stats = {"delivered": 0, "retried": 0, "dead_lettered": 0, "high_water": 0,
+                      "blocked_publishes": 0, "blocked_seconds": 0.0}
+
+
+class EventBus:
+    def __init__(self, queue_size: Optional[int] = None, max_attempts: Optional[int] = None,
+                 retry_delay: Optional[float] = None):
+        """Initialize the event bus; subscribers are served once start() runs on the event loop"""
+        self.queue_size = queue_size or int(os.getenv('EVENT_QUEUE_SIZE', '1000'))
+        self.max_attempts = max_attempts or int(os.getenv('EVENT_MAX_ATTEMPTS', '5'))
+        self.retry_delay = retry_delay or float(os.getenv('EVENT_RETRY_DELAY', '0.1'))
+
+        self.subscriptions: List[Subscription] = []
+        # event type -> subscriptions that take it, filled in on first publish
+        self._routes: Dict[Type[Event], List[Subscription]] = {}
+        self.dead_letters: deque = deque(maxlen=100)
+        self.running = False
+        self.stats = {"published": {}, "abandoned": 0}
+
+        print("✅ Event Bus initialized")
+
+    def subscribe(self, name: str, event_types: Iterable[Type[Event]], handler: Callable[[Event], Any]) -> Subscription:
+        """
+        Register a handler (plain function or coroutine function) for events of the given types
+
+        Each subscription gets its own queue and worker, so a slow handler
+        only delays its own events.
+        """
+        subscription = Subscription(name, tuple(event_types), handler, self.queue_size)
+        self.subscriptions.append(subscription)
+        self._routes.clear()
+        if self.running:
+            self._start_worker(subscription)
+        return subscription
+
+    def _subscribers(self, event_type: Type[Event]) -> List[Subscription]:
+        subscribers = self._routes.get(event_type)
+        if subscribers is None:
+            subscribers = self._routes[event_type] = [
+                s for s in self.subscriptions if issubclass(event_type, s.event_types)
+            ]
+        return subscribers
+
+    async def publish(self, event: Event):
+        """
+        Queue an event for every subscriber of its type
+
+        Returns as soon as the event is queued. Only when a subscriber's queue
+        is full does the publisher wait for room, which is the backpressure
+        that keeps a stuck handler from growing memory without bound. Before
+        start() (scripts, benchmarks) handlers run inline instead.
+        """
+        published = self.stats["published"]
+        published[type(event).__name__] = published.get(type(event).__name__, 0) + 1
+        now = time.monotonic()
+        for subscription in self._subscribers(type(event)):
+            if not self.running:
+                await self._deliver(subscription, event, now)
+                continue
+            queue = subscription.queue
+            if queue.full():
+                subscription.stats["blocked_publishes"] += 1
+                waited = time.monotonic()
+                await queue.put((event, now))
+                subscription.stats["blocked_seconds"] += time.monotonic() - waited
+            else:
+                queue.put_nowait((event, now))
+            subscription.stats["high_water"] = max(subscription.stats["high_water"], queue.qsize())
+
+    async def _deliver(self, subscription: Subscription, event: Event, published_at: float):
+        """Run the handler, retrying with exponential backoff; dead-letter the event once attempts run out"""
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                result = subscription.handler(event)
+                if inspect.isawaitable(result):
+                    await result
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if attempt == self.max_attempts:
+                    subscription.stats["dead_lettered"] += 1
+                    self.dead_letters.append({
+                        "event_id": event.id, "type": type(event).__name__, "subscriber": subscription.name,
+                        "attempts": attempt, "error": str(e), "failed_at": time.time()
+                    })
+                    print(f"❌ Event {type(event).__name__} dead-lettered for {subscription.name}: {str(e)}")
+                    return
+                subscription.stats["retried"] += 1
+                await asyncio.sleep(min(self.retry_delay * 2 ** (attempt - 1), 5.0))
+            else:
+                subscription.stats["delivered"] += 1
+                subscription.lags.append(time.monotonic() - published_at)
+                return
+
+    async def _run(self, subscription: Subscription):
+        queue = subscription.queue
+        while True:
+            event, published_at = await queue.get()
+            try:
+                await self._deliver(subscription, event, published_at)
+            finally:
+                queue.task_done()
+
+    def _start_worker(self, subscription: Subscription):
+        subscription.queue = asyncio.Queue(subscription.queue_size)
+        subscription.worker = asyncio.get_running_loop().create_task(self._run(subscription))
+
+    def start(self):
+        """Start one worker per subscription on the running event loop"""
+        if not self.running:
+            self.running = True
+            for subscription in self.subscriptions:
+                self._start_worker(subscription)
+
+    async def stop(self, timeout: float = 10.0):
+        """Drain the queues (up to timeout seconds), then stop the workers"""
+        if not self.running:
+            return
+        self.running = False
+        queues = [s.queue for s in self.subscriptions]
+        try:
+            await asyncio.wait_for(asyncio.gather(*(queue.join() for queue in queues)), timeout)
+        except asyncio.TimeoutError:
+            pass
+        for subscription in self.subscriptions:
+            self.stats["abandoned"] += subscription.queue.qsize()
+            subscription.worker.cancel()
+            try:
+                await subscription.worker
+            except asyncio.CancelledError:
+                pass
+            subscription.queue = subscription.worker = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get bus statistics: per-subscriber queue depth, delivery lag and backpressure"""
+        subscribers = []
+        for subscription in self.subscriptions:
+            lags = sorted(subscription.lags)
+            subscribers.append({
+                "name": subscription.name,
+                "events": [event_type.__name__ for event_type in subscription.event_types],
+                "queued": subscription.queue.qsize() if subscription.queue is not None else 0,
+                "capacity": subscription.queue_size,
+                **subscription.stats,
+                "blocked_seconds": round(subscription.stats["blocked_seconds"], 3),
+                "lag_p50_ms": round(lags[len(lags) // 2] * 1000, 3) if lags else None,
+                "lag_p95_ms": round(lags[int(len(lags) * 0.95)] * 1000, 3) if lags else None
+            })
+        return {
+            "running": self.running,
+            **self.stats,
+            "subscribers": subscribers,
+            "dead_letters": list(self.dead_letters)
+        }
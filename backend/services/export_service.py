@@ -0,0 +1,222 @@
+"""
+Export Service for MediSync Healthcare Platform
+Handles streamed patient data exports: NDJSON sections in a ZIP archive, resumable with Range
+"""
+
+import hashlib
+import json
+import os
+import time
+import zipfile
+from collections import OrderedDict
+from typing import Dict, List, Optional, Any, Iterable, Iterator, Tuple
+
+from services.auth_service import AuthService
+from services.consent_service import ConsentService
+from services.pathology_service import PathologyService
+from services.record_service import RecordService
+from services.vitals_service import VitalsService
+
+EXPORT_FORMAT = "medisync-export/1"
+# One shared encoder: json.dumps with a default= builds a new encoder on every call
+_ENCODER = json.JSONEncoder(default=str)
+
+
+class ExportSnapshot:
+    """
+    What one export contains, fixed when the request arrives
+
+    Reports, lab results and vitals are append-only, so their counts pin
+    them down; the profile, medical records (which can be edited) and access
+    log are small and copied outright. Generating the archive from the same
+    snapshot always yields the same bytes, which is what lets a Range
+    request resume it.
+    """
+
+    __slots__ = ('patient', 'reports', 'results', 'access_log', 'records', 'vitals', 'etag')
+
+    def __init__(self, patient: Dict[str, Any], reports: int, results: int, access_log: List[Dict[str, Any]],
+                 records: Optional[List[Dict[str, Any]]] = None, vitals: Optional[Dict[str, int]] = None):
+        self.patient = patient
+        self.reports = reports
+        self.results = results
+        self.access_log = access_log
+        self.records = records or []
+        self.vitals = vitals or {}
+        state = json.dumps([patient, reports, results, access_log, self.records, self.vitals], sort_keys=True, default=str)
+        self.etag = f'"export-{hashlib.sha256(state.encode()).hexdigest()[:32]}"'
+
+
+class _ChunkSink:
+    """Write-only, non-seekable file object that collects ZipFile output until it is drained"""
+
+    def __init__(self):
+        self.parts: List[bytes] = []
+        self.size = 0
+
+    def write(self, data) -> int:
+        self.parts.append(bytes(data))
+        self.size += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self.parts)
+        self.parts.clear()
+        self.size = 0
+        return data
+
+
+def parse_range(header: Optional[str], total: int) -> Optional[Tuple[int, int]]:
+    """
+    Inclusive (start, end) of a single ``bytes=`` range against a body of total bytes
+
+    Returns None when the header is absent, malformed or asks for several
+    ranges (the full body is served instead), and raises ValueError when the
+    range cannot be satisfied.
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    first, dash, last = header[len("bytes="):].strip().partition("-")
+    if not dash or not (first or last) or not (first.isdigit() or not first) or not (last.isdigit() or not last):
+        return None
+    if not first:
+        length = int(last)
+        if length == 0:
+            raise ValueError("Empty suffix range")
+        return max(0, total - length), total - 1
+    start = int(first)
+    end = min(int(last), total - 1) if last else total - 1
+    if start >= total or end < start:
+        raise ValueError("Range not satisfiable")
+    return start, end
+
+
+class ExportService:
+    def __init__(self, auth_service: AuthService, pathology_service: PathologyService,
+                 consent_service: ConsentService, record_service: Optional[RecordService] = None,
+                 vitals_service: Optional[VitalsService] = None, chunk_size: Optional[int] = None):
+        """Initialize export service over the profile, lab report, consent, medical record and vitals stores"""
+        self.auth_service = auth_service
+        self.pathology_service = pathology_service
+        self.consent_service = consent_service
+        self.record_service = record_service
+        self.vitals_service = vitals_service
+        self.chunk_size = chunk_size or int(os.getenv('EXPORT_CHUNK_SIZE', str(64 * 1024)))
+
+        # etag -> archive size, learned when an archive is generated to the end
+        self._sizes: 'OrderedDict[str, int]' = OrderedDict()
+        self.stats = {"exports": 0, "completed": 0, "resumed": 0, "bytes_sent": 0}
+
+        print("✅ Export Service initialized")
+
+    def snapshot(self, phone: str) -> Optional[ExportSnapshot]:
+        """Pin down what an export of this patient contains right now"""
+        patient = self.auth_service.patients.get(phone)
+        if patient is None:
+            return None
+        patient = patient.copy()
+        patient.pop('password_hash', None)
+        reports, results = self.pathology_service.count_patient_data(patient['id'])
+        # Oldest first, like every other section
+        records = (self.record_service.get_patient_records(patient['id'])[::-1]
+                   if self.record_service is not None else [])
+        vitals = self.vitals_service.count_patient_readings(patient['id']) if self.vitals_service is not None else {}
+        return ExportSnapshot(patient, reports, results, self.consent_service.get_history(patient['id']),
+                              records, vitals)
+
+    def _sections(self, snapshot: ExportSnapshot) -> Iterator[Tuple[str, Iterable[List[Dict[str, Any]]]]]:
+        patient_id = snapshot.patient['id']
+        yield "profile.ndjson", [[snapshot.patient]]
+        yield "medical_records.ndjson", [snapshot.records]
+        yield "lab_reports.ndjson", self.pathology_service.iter_patient_reports(patient_id, snapshot.reports)
+        yield "lab_results.ndjson", self.pathology_service.iter_patient_results(patient_id, snapshot.results)
+        if self.vitals_service is not None:
+            yield "vitals.ndjson", self.vitals_service.iter_patient_readings(patient_id, snapshot.vitals)
+        else:
+            yield "vitals.ndjson", []
+        yield "access_log.ndjson", [snapshot.access_log]
+
+    def archive(self, snapshot: ExportSnapshot) -> Iterator[bytes]:
+        """
+        Generate the ZIP archive in chunks of about chunk_size bytes
+
+        Each section is written as NDJSON straight into its ZIP entry, and
+        whatever the ZipFile has emitted is handed out once it passes the
+        chunk size. Memory use is bounded by one chunk plus one batch of
+        records, whatever the size of the export.
+        """
+        sink = _ChunkSink()
+        # Entry timestamps come from the snapshot so regenerating gives identical bytes
+        modified = snapshot.patient.get('updated_at') or snapshot.patient.get('created_at') or 0
+        date_time = max(time.gmtime(modified)[:6], (1980, 1, 1, 0, 0, 0))
+        counts = {}
+        total = 0
+
+        with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+            for name, batches in self._sections(snapshot):
+                info = zipfile.ZipInfo(name, date_time)
+                info.compress_type = zipfile.ZIP_DEFLATED
+                counts[name] = 0
+                # Entry sizes are unknown up front, so allow Zip64 in case a section passes 4 GiB
+                with archive.open(info, 'w', force_zip64=True) as entry:
+                    encode = _ENCODER.encode
+                    for batch in batches:
+                        entry.write("".join([encode(record) + "\n" for record in batch]).encode())
+                        counts[name] += len(batch)
+                        if sink.size >= self.chunk_size:
+                            total += sink.size
+                            yield sink.drain()
+
+            manifest = {"format": EXPORT_FORMAT, "patient_id": snapshot.patient['id'],
+                        "etag": snapshot.etag.strip('"'), "records": counts}
+            archive.writestr(zipfile.ZipInfo("manifest.json", date_time),
+                             json.dumps(manifest, indent=2), compress_type=zipfile.ZIP_DEFLATED)
+
+        total += sink.size
+        yield sink.drain()
+        self._remember_size(snapshot.etag, total)
+        self.stats["completed"] += 1
+
+    def _remember_size(self, etag: str, size: int):
+        self._sizes[etag] = size
+        self._sizes.move_to_end(etag)
+        while len(self._sizes) > 1024:
+            self._sizes.popitem(last=False)
+
+    def archive_size(self, snapshot: ExportSnapshot) -> int:
+        """Total archive size; generates (and discards) the archive once if it is not known yet"""
+        size = self._sizes.get(snapshot.etag)
+        if size is None:
+            size = sum(len(chunk) for chunk in self.archive(snapshot))
+        return size
+
+    def byte_range(self, snapshot: ExportSnapshot, start: int, end: int) -> Iterator[bytes]:
+        """Bytes start..end (inclusive) of the archive, regenerating and skipping what comes before"""
+        self.stats["resumed"] += 1
+        position = 0
+        for chunk in self.archive(snapshot):
+            chunk_end = position + len(chunk)
+            if chunk_end > start:
+                piece = chunk[max(0, start - position):end + 1 - position]
+                self.stats["bytes_sent"] += len(piece)
+                yield piece
+            position = chunk_end
+            if position > end:
+                return
+
+    def full(self, snapshot: ExportSnapshot) -> Iterator[bytes]:
+        """The whole archive, counted in the stats"""
+        self.stats["exports"] += 1
+        for chunk in self.archive(snapshot):
+            self.stats["bytes_sent"] += len(chunk)
+            yield chunk
+
+    def filename(self, snapshot: ExportSnapshot) -> str:
+        return f"medisync-export-{snapshot.patient['id']}.zip"
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get service statistics"""
+        return {**self.stats, "known_sizes": len(self._sizes), "chunk_size": self.chunk_size}
@@ -0,0 +1,275 @@
+"""
+Hospital Service for MediSync Healthcare Platform
+Handles the nearby-hospital finder backed by a grid spatial index
+"""
+
+import csv
+import json
+import math
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Any
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+class HospitalIndex:
+    """Immutable grid index over a hospital dataset.
+
+    Facilities are bucketed into fixed-size lat/lng cells and sorted by cell
+    id, so every row of cells in a query window is one contiguous slice of
+    the coordinate arrays that can be located with ``searchsorted``.
+    """
+
+    def __init__(self, hospitals: List[Dict[str, Any]], cell_deg: float = 0.1):
+        self.hospitals = hospitals
+        self.cell_deg = cell_deg
+        self.n_lat_cells = int(math.ceil(180.0 / cell_deg))
+        self.n_lng_cells = int(math.ceil(360.0 / cell_deg))
+
+        lat = np.array([h['latitude'] for h in hospitals], dtype=np.float64)
+        lng = np.array([h['longitude'] for h in hospitals], dtype=np.float64)
+        cells = self._cell_ids(lat, lng)
+
+        order = np.argsort(cells, kind='stable')
+        self.order = order
+        self.cells = cells[order]
+        self.lat_rad = np.radians(lat[order])
+        self.lng_rad = np.radians(lng[order])
+        self.cos_lat = np.cos(self.lat_rad)
+
+        # Specialty masks in sorted order: {"emergency care": bool array}
+        self.specialty_masks: Dict[str, np.ndarray] = {}
+        for position, idx in enumerate(order):
+            for specialty in self._split_specialties(hospitals[idx].get('specialty', '')):
+                mask = self.specialty_masks.get(specialty)
+                if mask is None:
+                    mask = np.zeros(len(hospitals), dtype=bool)
+                    self.specialty_masks[specialty] = mask
+                mask[position] = True
+        self.specialty_counts = {name: int(mask.sum()) for name, mask in self.specialty_masks.items()}
+
+    def __len__(self) -> int:
+        return len(self.hospitals)
+
+    @staticmethod
+    def _split_specialties(specialty: str) -> List[str]:
+        return [s.strip().lower() for s in specialty.split(',') if s.strip()]
+
+    def _lat_cell(self, lat):
+        return np.clip(np.floor((lat + 90.0) / self.cell_deg), 0, self.n_lat_cells - 1).astype(np.int64)
+
+    def _lng_cell(self, lng):
+        return (np.floor((lng + 180.0) / self.cell_deg).astype(np.int64)) % self.n_lng_cells
+
+    def _cell_ids(self, lat, lng):
+        return self._lat_cell(lat) * self.n_lng_cells + self._lng_cell(lng)
+
+    def _candidates(self, lat: float, lng: float, radius_km: float) -> np.ndarray:
+        """Positions (in sorted order) of facilities in cells overlapping the radius"""
+        lat_span = math.degrees(radius_km / EARTH_RADIUS_KM)
+        min_lat, max_lat = lat - lat_span, lat + lat_span
+
+        # Longitude half-width of a spherical cap: asin(sin(d) / cos(lat))
+        angular = radius_km / EARTH_RADIUS_KM
+        cos_lat = math.cos(math.radians(lat))
+        if min_lat <= -90.0 or max_lat >= 90.0 or math.sin(angular) >= cos_lat:
+            lng_span = 180.0
+        else:
+            lng_span = math.degrees(math.asin(math.sin(angular) / cos_lat))
+
+        if lng_span >= 180.0:
+            lng_ranges = [(0, self.n_lng_cells - 1)]
+        else:
+            first = int(self._lng_cell(np.float64(lng - lng_span)))
+            last = int(self._lng_cell(np.float64(lng + lng_span)))
+            if first <= last:
+                lng_ranges = [(first, last)]
+            else:
+                lng_ranges = [(first, self.n_lng_cells - 1), (0, last)]
+
+        row_first = int(self._lat_cell(np.float64(max(min_lat, -90.0))))
+        row_last = int(self._lat_cell(np.float64(min(max_lat, 90.0))))
+
+        slices = []
+        for row in range(row_first, row_last + 1):
+            base = row * self.n_lng_cells
+            for first, last in lng_ranges:
+                start = np.searchsorted(self.cells, base + first, side='left')
+                stop = np.searchsorted(self.cells, base + last, side='right')
+                if stop > start:
+                    slices.append(np.arange(start, stop))
+
+        if not slices:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate(slices) if len(slices) > 1 else slices[0]
+
+    def _haversine(self, lat: float, lng: float, positions: np.ndarray) -> np.ndarray:
+        """Vectorized great-circle distance in km from (lat, lng) to the given positions"""
+        lat0 = math.radians(lat)
+        lng0 = math.radians(lng)
+        dlat = self.lat_rad[positions] - lat0
+        dlng = self.lng_rad[positions] - lng0
+        a = np.sin(dlat * 0.5) ** 2 + math.cos(lat0) * self.cos_lat[positions] * np.sin(dlng * 0.5) ** 2
+        return 2.0 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+    def _filter(self, positions: np.ndarray, specialty: Optional[str]) -> np.ndarray:
+        if not specialty:
+            return positions
+        mask = self.specialty_masks.get(specialty.strip().lower())
+        if mask is None:
+            return np.empty(0, dtype=np.int64)
+        return positions[mask[positions]]
+
+    def within_radius(self, lat: float, lng: float, radius_km: float,
+                      specialty: Optional[str] = None, limit: Optional[int] = None) -> List[tuple]:
+        """Return (hospital_index, distance_km) pairs within radius, nearest first"""
+        positions = self._filter(self._candidates(lat, lng, radius_km), specialty)
+        if positions.size == 0:
+            return []
+
+        distances = self._haversine(lat, lng, positions)
+        inside = distances <= radius_km
+        positions, distances = positions[inside], distances[inside]
+
+        if limit is not None and limit < positions.size:
+            top = np.argpartition(distances, limit - 1)[:limit]
+            positions, distances = positions[top], distances[top]
+
+        ranked = np.argsort(distances, kind='stable')
+        return [(int(self.order[positions[i]]), float(distances[i])) for i in ranked]
+
+    def nearest(self, lat: float, lng: float, k: int,
+                specialty: Optional[str] = None) -> List[tuple]:
+        """Return the k nearest (hospital_index, distance_km) pairs, nearest first.
+
+        Searches a growing radius: once at least k facilities lie within the
+        radius, they are guaranteed to include the k nearest overall.
+        """
+        available = len(self) if not specialty else self.specialty_counts.get(specialty.strip().lower(), 0)
+        k = min(k, available)
+        if k <= 0:
+            return []
+
+        # Seed the radius from local density so dense metros scan few cells
+        cell_km = self.cell_deg * 111.0
+        cell = int(self._cell_ids(np.float64(lat), np.float64(lng)))
+        in_cell = int(np.searchsorted(self.cells, cell, side='right') - np.searchsorted(self.cells, cell, side='left'))
+        selectivity = len(self) / available
+        radius_km = max(cell_km * math.sqrt(k * selectivity / in_cell), 0.05) if in_cell else cell_km
+        max_radius_km = math.pi * EARTH_RADIUS_KM
+        while True:
+            results = self.within_radius(lat, lng, radius_km, specialty, k)
+            if len(results) >= k or radius_km >= max_radius_km:
+                return results
+            radius_km = min(radius_km * 2.0, max_radius_km)
+
+
+class HospitalService:
+    def __init__(self, data_path: Optional[str] = None):
+        """Initialize hospital service and build the spatial index"""
+        default_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'hospitals.json')
+        self.data_path = data_path or os.getenv('HOSPITALS_DATA_PATH', default_path)
+        self.cell_deg = float(os.getenv('HOSPITALS_GRID_CELL_DEG', '0.1'))
+
+        self._reload_lock = threading.Lock()
+        self.index = HospitalIndex([], self.cell_deg)
+        self.loaded_at: Optional[float] = None
+
+        self.reload()
+
+        print(f"✅ Hospital Service initialized ({len(self.index)} facilities)")
+
+    def _load_records(self, path: str) -> List[Dict[str, Any]]:
+        """Load hospital records from a CSV or JSON file"""
+        if path.lower().endswith('.csv'):
+            with open(path, newline='', encoding='utf-8') as f:
+                rows = list(csv.DictReader(f))
+        else:
+            with open(path, encoding='utf-8') as f:
+                rows = json.load(f)
+
+        hospitals = []
+        for row in rows:
+            try:
+                latitude = float(row['latitude'])
+                longitude = float(row['longitude'])
+            except (KeyError, TypeError, ValueError):
+                continue
+            if not (-90.0 <= latitude <= 90.0 and -180.0 <= longitude <= 180.0):
+                continue
+            hospitals.append({
+                "name": row.get('name', ''),
+                "address": row.get('address', ''),
+                "phone": row.get('phone', ''),
+                "specialty": row.get('specialty', ''),
+                "rating": row.get('rating', ''),
+                "latitude": latitude,
+                "longitude": longitude
+            })
+        return hospitals
+
+    def reload(self, data_path: Optional[str] = None) -> int:
+        """Rebuild the index from disk and swap it in without blocking readers"""
+        with self._reload_lock:
+            path = data_path or self.data_path
+            if os.path.exists(path):
+                hospitals = self._load_records(path)
+            else:
+                print(f"⚠️ Hospital dataset not found at {path}")
+                hospitals = []
+
+            # Queries hold a reference to the old index, so a plain swap is safe
+            self.index = HospitalIndex(hospitals, self.cell_deg)
+            self.data_path = path
+            self.loaded_at = time.time()
+
+            print(f"🏥 Hospital index built with {len(hospitals)} facilities")
+            return len(hospitals)
+
+    def _format(self, index: HospitalIndex, matches: List[tuple]) -> List[Dict[str, Any]]:
+        results = []
+        for idx, distance_km in matches:
+            hospital = index.hospitals[idx]
+            results.append({
+                **hospital,
+                "distance_km": round(distance_km, 3),
+                "distance": f"{distance_km:.1f} km"
+            })
+        return results
+
+    def find_nearby(self, lat: float, lng: float, limit: int = 10,
+                    radius_km: Optional[float] = None,
+                    specialty: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Find hospitals near a location
+
+        Args:
+            lat: Latitude of the user
+            lng: Longitude of the user
+            limit: Maximum number of hospitals to return
+            radius_km: If given, only hospitals within this radius are returned
+            specialty: Optional specialty filter (e.g. "Emergency Care")
+
+        Returns:
+            List of hospitals ordered by distance
+        """
+        index = self.index
+        if radius_km is not None:
+            matches = index.within_radius(lat, lng, radius_km, specialty, limit)
+        else:
+            matches = index.nearest(lat, lng, limit, specialty)
+        return self._format(index, matches)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get service statistics"""
+        return {
+            "total_facilities": len(self.index),
+            "specialties": len(self.index.specialty_masks),
+            "data_path": self.data_path,
+            "loaded_at": self.loaded_at
+        }
+
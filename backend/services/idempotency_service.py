@@ -0,0 +1,236 @@
+"""
+Idempotency Service for MediSync Healthcare Platform
+Handles Idempotency-Key replay for retried POSTs (send-otp, register) so retries do not resend SMS
+"""
+
+import asyncio
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Any, Iterable, Tuple
+
+MAX_KEY_LENGTH = 255
+
+# (route, client, key, body hash)
+CacheKey = Tuple[str, str, str, str]
+
+
+def peer_address(scope: Dict[str, Any]) -> str:
+    """Address of the connecting peer, the default client scope for keys"""
+    client = scope.get("client")
+    return client[0] if client else ""
+
+
+class StoredResponse:
+    """A finished response, kept as raw ASGI pieces so it can be replayed byte for byte"""
+
+    __slots__ = ('status', 'headers', 'body')
+
+    def __init__(self, status: int, headers: List[Tuple[bytes, bytes]], body: bytes):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    @property
+    def cacheable(self) -> bool:
+        # Only successes are kept: a 4xx may clear once the client fixes its request (or a
+        # rate limit passes), and 5xx failures (provider outages) are transient
+        return self.status < 400
+
+
+class IdempotencyService:
+    def __init__(self, ttl: Optional[float] = None, max_entries: Optional[int] = None,
+                 max_body_size: Optional[int] = None):
+        """Initialize the bounded TTL cache of first responses"""
+        self.ttl = ttl or float(os.getenv('IDEMPOTENCY_TTL', '3600'))
+        self.max_entries = max_entries or int(os.getenv('IDEMPOTENCY_CACHE_SIZE', '10000'))
+        # Keyed request bodies are buffered whole, so larger ones are refused with 413
+        self.max_body_size = max_body_size or int(os.getenv('IDEMPOTENCY_MAX_BODY_SIZE', '65536'))
+
+        # cache key -> (expires_at, StoredResponse or in-flight Future), oldest first
+        self._entries: 'OrderedDict[CacheKey, Tuple[float, Any]]' = OrderedDict()
+        self.stats = {"executed": 0, "replayed": 0, "joined_in_flight": 0, "not_stored": 0, "evicted": 0,
+                      "too_large": 0}
+
+        print("✅ Idempotency Service initialized")
+
+    @staticmethod
+    def cache_key(route: str, client: str, key: str, body: bytes) -> CacheKey:
+        """Keys are scoped to the client, so one client cannot replay another's response"""
+        return route, client, key, hashlib.sha256(body).hexdigest()
+
+    def _expire(self, now: float):
+        # Stored responses expire in insertion order; in-flight entries are skipped, not waited for
+        expired = []
+        for cache_key, (expires_at, value) in self._entries.items():
+            if isinstance(value, asyncio.Future):
+                continue
+            if expires_at > now:
+                break
+            expired.append(cache_key)
+        for cache_key in expired:
+            del self._entries[cache_key]
+
+    def _evict(self):
+        """Drop the oldest stored responses over max_entries; in-flight entries stay"""
+        excess = len(self._entries) - self.max_entries
+        if excess <= 0:
+            return
+        oldest = []
+        for cache_key, (_, value) in self._entries.items():
+            if not isinstance(value, asyncio.Future):
+                oldest.append(cache_key)
+                if len(oldest) == excess:
+                    break
+        for cache_key in oldest:
+            del self._entries[cache_key]
+        self.stats["evicted"] += len(oldest)
+
+    def lookup(self, cache_key: CacheKey) -> Optional[Any]:
+        """The stored response or in-flight Future for a key, if any"""
+        now = time.monotonic()
+        self._expire(now)
+        entry = self._entries.get(cache_key)
+        if entry is None or (entry[0] <= now and not isinstance(entry[1], asyncio.Future)):
+            return None
+        return entry[1]
+
+    def begin(self, cache_key: CacheKey) -> asyncio.Future:
+        """Mark a key in flight; duplicates that arrive meanwhile wait on the returned Future"""
+        future = asyncio.get_running_loop().create_future()
+        self._entries[cache_key] = (float('inf'), future)
+        self._entries.move_to_end(cache_key)
+        self.stats["executed"] += 1
+        return future
+
+    def finish(self, cache_key: CacheKey, future: asyncio.Future,
+               response: Optional[StoredResponse], error: Optional[BaseException] = None):
+        """Hand the outcome to any waiters and keep it for later retries if it is final"""
+        if isinstance(error, asyncio.CancelledError):
+            future.cancel()
+        elif error is not None:
+            future.set_exception(error)
+            # Waiters re-raise it themselves; keep the loop from warning that nobody retrieved it
+            future.exception()
+        else:
+            future.set_result(response)
+
+        if response is not None and response.cacheable:
+            self._entries[cache_key] = (time.monotonic() + self.ttl, response)
+            self._entries.move_to_end(cache_key)
+            self._evict()
+        else:
+            self._entries.pop(cache_key, None)
+            self.stats["not_stored"] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get service statistics"""
+        in_flight = sum(1 for _, value in self._entries.values() if isinstance(value, asyncio.Future))
+        return {"entries": len(self._entries) - in_flight, "in_flight": in_flight, **self.stats}
+
+
+class IdempotencyMiddleware:
+    """
+    Pure ASGI middleware replaying the first response to a POST carrying an
+    Idempotency-Key on the listed routes
+
+    Requests without the header pass straight through. With it, the body is
+    buffered (up to max_body_size, else 413) and hashed. A stored response
+    for the same (route, client, key, body) is replayed with an
+    Idempotent-Replayed header. A duplicate that arrives while the first is
+    still running waits for that result instead of running again. The client
+    is the peer address unless client_key says otherwise.
+    """
+
+    def __init__(self, app, idempotency_service: IdempotencyService, routes: Iterable[str],
+                 client_key: Callable[[Dict[str, Any]], str] = peer_address):
+        self.app = app
+        self.service = idempotency_service
+        self.routes = frozenset(routes)
+        self.client_key = client_key
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in self.routes:
+            await self.app(scope, receive, send)
+            return
+        key = None
+        declared_size = 0
+        for name, value in scope["headers"]:
+            if name == b"idempotency-key":
+                key = value.decode("latin-1").strip()
+            elif name == b"content-length" and value.isdigit():
+                declared_size = int(value)
+        if key is None:
+            await self.app(scope, receive, send)
+            return
+        if not key or len(key) > MAX_KEY_LENGTH:
+            await self._send(send, StoredResponse(400, [(b"content-type", b"application/json")],
+                                                  b'{"detail":"Idempotency-Key must be 1-255 characters"}'))
+            return
+
+        limit = self.service.max_body_size
+        chunks, size = [], 0
+        # Stop reading as soon as the declared or received size is over the limit
+        while size <= limit and declared_size <= limit:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            chunks.append(message.get("body", b""))
+            size += len(chunks[-1])
+            if not message.get("more_body", False):
+                break
+        if size > limit or declared_size > limit:
+            self.service.stats["too_large"] += 1
+            await self._send(send, StoredResponse(413, [(b"content-type", b"application/json")],
+                                                  b'{"detail":"Request body too large for an Idempotency-Key request"}'))
+            return
+        body = b"".join(chunks)
+        cache_key = self.service.cache_key(scope["path"], self.client_key(scope), key, body)
+
+        existing = self.service.lookup(cache_key)
+        if isinstance(existing, asyncio.Future):
+            self.service.stats["joined_in_flight"] += 1
+            response = await asyncio.shield(existing)
+            await self._send(send, response, replayed=True)
+            return
+        if existing is not None:
+            self.service.stats["replayed"] += 1
+            await self._send(send, existing, replayed=True)
+            return
+
+        future = self.service.begin(cache_key)
+        status, headers, parts = 500, [], []
+        delivered = False
+
+        async def replay_receive():
+            nonlocal delivered
+            if not delivered:
+                delivered = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        async def capture_send(message):
+            nonlocal status, headers
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", []))
+            elif message["type"] == "http.response.body":
+                parts.append(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, replay_receive, capture_send)
+        except BaseException as e:
+            self.service.finish(cache_key, future, None, e)
+            raise
+        self.service.finish(cache_key, future, StoredResponse(status, headers, b"".join(parts)))
+
+    @staticmethod
+    async def _send(send, response: StoredResponse, replayed: bool = False):
+        headers = [(name, value) for name, value in response.headers if name != b"content-length"]
+        headers.append((b"content-length", str(len(response.body)).encode()))
+        if replayed:
+            headers.append((b"idempotent-replayed", b"true"))
+        await send({"type": "http.response.start", "status": response.status, "headers": headers})
+        await send({"type": "http.response.body", "body": response.body})
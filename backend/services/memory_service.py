@@ -0,0 +1,305 @@
+"""
+Memory Service for MediSync Healthcare Platform
+Handles memory accounting of the in-memory stores, tracemalloc snapshots and diffs,
+and a budget watchdog that warns and evicts
+"""
+
+import asyncio
+import itertools
+import math
+import os
+import random
+import re
+import sys
+import time
+import tracemalloc
+from collections import deque, OrderedDict
+from typing import Dict, List, Optional, Any, Callable, Hashable
+
+SIZE_PATTERN = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*([KMG]i?B|B)?\s*$', re.IGNORECASE)
+SIZE_UNITS = {"b": 1, "kb": 10 ** 3, "mb": 10 ** 6, "gb": 10 ** 9, "kib": 2 ** 10, "mib": 2 ** 20, "gib": 2 ** 30}
+# Singletons are shared by every entry, so they are not charged to any
+_SHARED = (type(None), bool)
+# Leaves that hold no references, sized without looking for children
+_ATOMIC = {str, int, float, bytes, complex}
+
+
+def parse_size(text: str) -> int:
+    """Bytes in a size such as "64MiB", "500 KB" or "1048576" """
+    match = SIZE_PATTERN.match(text)
+    if match is None:
+        raise ValueError(f"Invalid size: {text}")
+    return int(float(match.group(1)) * SIZE_UNITS[(match.group(2) or "B").lower()])
+
+
+def parse_budgets(text: str) -> Dict[str, int]:
+    """Budgets written as "store=size,store=size" """
+    budgets = {}
+    for item in filter(None, (part.strip() for part in text.split(','))):
+        name, _, size = item.partition('=')
+        budgets[name.strip()] = parse_size(size)
+    return budgets
+
+
+def deep_size(obj: Any, seen: Optional[set] = None) -> int:
+    """
+    Bytes held by obj and everything reachable from it through containers
+
+    Follows dicts, lists, tuples, sets, deques and object attributes.
+    Objects reached twice are counted once, so pass the same seen set
+    across calls to charge shared objects (interned keys such as 'timestamp',
+    repeated constants) only once.
+    """
+    seen = set() if seen is None else seen
+    total = 0
+    stack = [obj]
+    while stack:
+        item = stack.pop()
+        if id(item) in seen or isinstance(item, _SHARED):
+            continue
+        seen.add(id(item))
+        total += sys.getsizeof(item)
+        kind = type(item)
+        if kind in _ATOMIC:
+            continue
+        if kind is dict:
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset, deque)):
+            stack.extend(item)
+        elif hasattr(item, '__dict__') and not isinstance(item, type):
+            stack.append(vars(item))
+        elif isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+    return total
+
+
+def process_rss() -> Optional[int]:
+    """Resident set size of this process in bytes, where /proc is available"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class StoreAccount:
+    """A registered store, its optional budget and the owner's eviction hook"""
+
+    __slots__ = ('name', 'store', 'evict', 'budget', 'last')
+
+    def __init__(self, name: str, store: Dict[Hashable, Any], evict: Optional[Callable[[int], int]],
+                 budget: Optional[int]):
+        self.name = name
+        self.store = store
+        self.evict = evict
+        self.budget = budget
+        self.last: Optional[Dict[str, Any]] = None
+
+
+class MemoryService:
+    def __init__(self, budgets: Optional[Dict[str, int]] = None, rss_budget: Optional[int] = None,
+                 interval: Optional[float] = None, sample_size: Optional[int] = None,
+                 low_watermark: Optional[float] = None):
+        """Initialize memory accounting; budgets come from MEMORY_BUDGETS unless given"""
+        self.budgets = budgets if budgets is not None else parse_budgets(
+            os.getenv('MEMORY_BUDGETS', 'otp_store=64MiB,temp_patient_data=32MiB,temp_doctor_data=32MiB'))
+        rss = os.getenv('MEMORY_BUDGET_RSS')
+        self.rss_budget = rss_budget or (parse_size(rss) if rss else None)
+        self.interval = interval or float(os.getenv('MEMORY_WATCHDOG_INTERVAL', '30'))
+        # Stores larger than this are measured on a random sample of entries
+        self.sample_size = sample_size or int(os.getenv('MEMORY_SAMPLE_SIZE', '2000'))
+        # Eviction brings a store down to this fraction of its budget, so it does not trip again at once
+        self.low_watermark = low_watermark or float(os.getenv('MEMORY_LOW_WATERMARK', '0.8'))
+
+        self.stores: 'OrderedDict[str, StoreAccount]' = OrderedDict()
+        self.snapshots: 'OrderedDict[int, Dict[str, Any]]' = OrderedDict()
+        self._snapshot_ids = itertools.count(1)
+        self.alerts: deque = deque(maxlen=100)
+        self._worker: Optional[asyncio.Task] = None
+        self.stats = {"checks": 0, "warnings": 0, "evictions": 0, "evicted_entries": 0}
+
+        print("✅ Memory Service initialized")
+
+    def register(self, name: str, store: Dict[Hashable, Any], evict: Optional[Callable[[int], int]] = None):
+        """
+        Account for a service's store under a stable name
+
+        evict(count) should drop up to count entries the owner can afford to
+        lose (expired or oldest first) and return how many it dropped. Stores
+        without it are only warned about.
+        """
+        self.stores[name] = StoreAccount(name, store, evict, self.budgets.get(name))
+
+    # Accounting
+    def measure(self, name: str, exact: bool = False) -> Dict[str, Any]:
+        """Entry count and deep size of one store, estimated from a sample when it is large"""
+        account = self.stores[name]
+        start = time.perf_counter()
+        # list() of a dict is a single C call, safe while worker threads change the store
+        keys = list(account.store)
+        sampled = not exact and len(keys) > self.sample_size
+        chosen = random.sample(keys, self.sample_size) if sampled else keys
+        # One seen set for the whole store: objects shared between entries count once
+        seen = set()
+        entries = 0
+        for key in chosen:
+            entries += deep_size(key, seen) + deep_size(account.store.get(key), seen)
+        container = sys.getsizeof(account.store)
+        size = container + (entries * len(keys) // len(chosen) if chosen else 0)
+        account.last = {
+            "name": name,
+            "entries": len(keys),
+            "bytes": size,
+            "bytes_per_entry": round((size - container) / len(keys), 1) if keys else None,
+            "sampled": sampled,
+            "budget": account.budget,
+            "over_budget": account.budget is not None and size > account.budget,
+            "evictable": account.evict is not None,
+            "measure_ms": round((time.perf_counter() - start) * 1000, 3)
+        }
+        return account.last
+
+    def report(self, exact: bool = False) -> Dict[str, Any]:
+        """Every registered store's size, plus process RSS and the tracemalloc state"""
+        stores = [self.measure(name, exact) for name in self.stores]
+        rss = process_rss()
+        return {
+            "rss_bytes": rss,
+            "rss_budget": self.rss_budget,
+            "stores": stores,
+            "total_store_bytes": sum(s["bytes"] for s in stores),
+            "tracing": tracemalloc.is_tracing(),
+            "traced_bytes": tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else None
+        }
+
+    # tracemalloc
+    def take_snapshot(self, frames: int = 1, limit: int = 20) -> Dict[str, Any]:
+        """
+        Snapshot traced allocations, starting tracemalloc first if it is off
+
+        Only allocations made after tracing starts are seen, so the first
+        snapshot is mostly a baseline for later diffs. The last 5 snapshots
+        are kept.
+        """
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+        ))
+        snapshot_id = next(self._snapshot_ids)
+        self.snapshots[snapshot_id] = {"snapshot": snapshot, "taken_at": time.time()}
+        while len(self.snapshots) > 5:
+            self.snapshots.popitem(last=False)
+        stats = snapshot.statistics('lineno')
+        return {
+            "snapshot_id": snapshot_id,
+            "traced_bytes": sum(stat.size for stat in stats),
+            "top": [self._describe(stat) for stat in stats[:limit]]
+        }
+
+    def diff(self, first: int, second: Optional[int] = None, group_by: str = 'lineno',
+             limit: int = 20) -> Dict[str, Any]:
+        """Allocation sites that grew most between two snapshots (second defaults to the latest)"""
+        if second is None:
+            second = next(reversed(self.snapshots), None)
+        if first not in self.snapshots or second not in self.snapshots:
+            raise KeyError(f"Unknown snapshot; kept: {', '.join(map(str, self.snapshots)) or 'none'}")
+        older, newer = self.snapshots[first], self.snapshots[second]
+        stats = newer["snapshot"].compare_to(older["snapshot"], group_by)
+        return {
+            "from": first,
+            "to": second,
+            "seconds": round(newer["taken_at"] - older["taken_at"], 3),
+            "size_diff": sum(stat.size_diff for stat in stats),
+            "top": [{**self._describe(stat), "size_diff": stat.size_diff, "count_diff": stat.count_diff}
+                    for stat in stats[:limit]]
+        }
+
+    @staticmethod
+    def _describe(stat) -> Dict[str, Any]:
+        frame = stat.traceback[0]
+        return {
+            "site": f"{frame.filename}:{frame.lineno}",
+            "size": stat.size,
+            "count": stat.count,
+            "traceback": [f"{f.filename}:{f.lineno}" for f in stat.traceback] if len(stat.traceback) > 1 else None
+        }
+
+    def stop_tracing(self) -> int:
+        """Stop tracemalloc and drop kept snapshots; returns how many were dropped"""
+        tracemalloc.stop()
+        count = len(self.snapshots)
+        self.snapshots.clear()
+        return count
+
+    # Watchdog
+    def check(self) -> List[Dict[str, Any]]:
+        """Measure every store with a budget, evicting where the owner allows; returns new alerts"""
+        self.stats["checks"] += 1
+        alerts = []
+        for account in self.stores.values():
+            if account.budget is None:
+                continue
+            usage = self.measure(account.name)
+            if not usage["over_budget"]:
+                continue
+            alert = {"time": time.time(), "store": account.name, "bytes": usage["bytes"],
+                     "budget": account.budget, "entries": usage["entries"], "evicted": 0}
+            if account.evict is not None and usage["bytes_per_entry"]:
+                target = account.budget * self.low_watermark
+                count = math.ceil((usage["bytes"] - target) / usage["bytes_per_entry"])
+                alert["evicted"] = account.evict(count)
+                self.stats["evictions"] += 1
+                self.stats["evicted_entries"] += alert["evicted"]
+            else:
+                self.stats["warnings"] += 1
+            print(f"⚠️ Memory budget exceeded for {account.name}: {usage['bytes'] / 2 ** 20:.1f} MiB "
+                  f"> {account.budget / 2 ** 20:.1f} MiB ({usage['entries']:,} entries, "
+                  f"{alert['evicted']:,} evicted)")
+            alerts.append(alert)
+
+        rss = process_rss()
+        if self.rss_budget is not None and rss is not None and rss > self.rss_budget:
+            self.stats["warnings"] += 1
+            alerts.append({"time": time.time(), "store": "process_rss", "bytes": rss,
+                           "budget": self.rss_budget, "entries": None, "evicted": 0})
+            print(f"⚠️ Process RSS {rss / 2 ** 20:.1f} MiB exceeds budget {self.rss_budget / 2 ** 20:.1f} MiB")
+        self.alerts.extend(alerts)
+        return alerts
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.check()
+            except Exception as e:
+                print(f"❌ Memory watchdog error: {str(e)}")
+
+    def start(self):
+        """Start the budget watchdog on the running event loop"""
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Stop the budget watchdog"""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get watchdog statistics and recent alerts"""
+        return {
+            **self.stats,
+            "interval": self.interval,
+            "budgets": {name: account.budget for name, account in self.stores.items() if account.budget is not None},
+            "rss_budget": self.rss_budget,
+            "alerts": list(self.alerts)
+        }
@@ -0,0 +1,102 @@
+"""
+Notification Hub for MediSync Healthcare Platform
+Handles in-process publish/subscribe for long-poll and Server-Sent Events clients
+"""
+
+import asyncio
+import json
+from collections import deque
+from typing import Dict, Optional, Any, Set
+
+
+def format_sse(data: Dict[str, Any], event: Optional[str] = None) -> str:
+    """Encode one Server-Sent Events message"""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+
+class Subscription:
+    """A subscriber's bounded mailbox on one topic.
+
+    Waiting costs one future and nothing else: no polling, no timers beyond
+    the caller's own timeout. When the mailbox is full the oldest message is
+    dropped so a stalled client can never grow memory without bound.
+    """
+
+    def __init__(self, hub: 'NotificationHub', topic: str, maxsize: int):
+        self.hub = hub
+        self.topic = topic
+        self.messages: deque = deque(maxlen=maxsize)
+        self.dropped = 0
+        self._waiter: Optional[asyncio.Future] = None
+
+    def deliver(self, message: Dict[str, Any]):
+        if len(self.messages) == self.messages.maxlen:
+            self.dropped += 1
+        self.messages.append(message)
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Next message, or None if the timeout elapses first"""
+        if not self.messages:
+            self._waiter = asyncio.get_running_loop().create_future()
+            try:
+                await asyncio.wait_for(self._waiter, timeout)
+            except asyncio.TimeoutError:
+                return None
+            finally:
+                self._waiter = None
+        return self.messages.popleft()
+
+    def close(self):
+        self.hub._unsubscribe(self)
+
+    def __enter__(self) -> 'Subscription':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class NotificationHub:
+    """In-process topic hub.
+
+    ``publish(topic, message)`` and ``subscribe(topic)`` are the whole
+    contract, so a cross-worker broker (e.g. Redis pub/sub) can replace this
+    class by forwarding published messages to local subscriptions.
+    """
+
+    def __init__(self, mailbox_size: int = 64):
+        self.mailbox_size = mailbox_size
+        self.topics: Dict[str, Set[Subscription]] = {}
+        self.stats = {"published": 0, "delivered": 0}
+
+    def subscribe(self, topic: str) -> Subscription:
+        subscription = Subscription(self, topic, self.mailbox_size)
+        self.topics.setdefault(topic, set()).add(subscription)
+        return subscription
+
+    def _unsubscribe(self, subscription: Subscription):
+        subscribers = self.topics.get(subscription.topic)
+        if subscribers is not None:
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self.topics[subscription.topic]
+
+    def publish(self, topic: str, message: Dict[str, Any]) -> int:
+        """Deliver message to every current subscriber of topic; returns the subscriber count"""
+        subscribers = self.topics.get(topic, ())
+        for subscription in tuple(subscribers):
+            subscription.deliver(message)
+        self.stats["published"] += 1
+        self.stats["delivered"] += len(subscribers)
+        return len(subscribers)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get hub statistics"""
+        return {
+            "topics": len(self.topics),
+            "subscribers": sum(len(s) for s in self.topics.values()),
+            **self.stats
+        }
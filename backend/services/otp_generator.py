@@ -0,0 +1,141 @@
+"""
+OTP Generator for MediSync Healthcare Platform
+Handles one-time code generation: a pool of uniform codes cut from bulk OS randomness, with the
+next pool built in the background
+"""
+
+import math
+import os
+import string
+import threading
+import weakref
+from typing import Dict, Any, List, Optional
+
+# Codes are sent by SMS and typed back in, so only letters and digits are allowed
+ALLOWED_SYMBOLS = frozenset(string.ascii_letters + string.digits)
+MIN_LENGTH, MAX_LENGTH = 4, 12
+
+
+class OTPGenerator:
+    """
+    Pool of codes precomputed from bulk os.urandom reads, one call per buffer
+
+    Each byte of a buffer becomes one symbol by rejection sampling: with n
+    symbols, bytes below 256 - 256 % n map to symbol byte % n and the rest
+    are dropped, so every symbol is equally likely (byte % 10 alone would
+    favour 0-5). bytes.translate does the mapping and the dropping in one C
+    pass. The symbols are cut into consecutive codes, so every
+    length-character code, leading zeros included, is equally likely.
+
+    Handing out a code is a list pop. While one pool is used up, a thread
+    prepares the next, so callers only read the OS source themselves if
+    codes are taken faster than a pool is built. Pooled codes are as secret
+    as stored OTPs. A forked child throws its parent's pools away instead of
+    reusing them.
+    """
+
+    def __init__(self, length: Optional[int] = None, alphabet: Optional[str] = None,
+                 buffer_size: Optional[int] = None):
+        """Initialize the generator; unset settings come from OTP_LENGTH, OTP_ALPHABET and OTP_BUFFER_SIZE"""
+        self.length = length or int(os.getenv('OTP_LENGTH', '6'))
+        self.alphabet = alphabet or os.getenv('OTP_ALPHABET', string.digits)
+        # Random bytes read per pool
+        self.buffer_size = buffer_size or int(os.getenv('OTP_BUFFER_SIZE', '65536'))
+        if not MIN_LENGTH <= self.length <= MAX_LENGTH:
+            raise ValueError(f"OTP length must be between {MIN_LENGTH} and {MAX_LENGTH}")
+        if len(self.alphabet) < 2 or len(set(self.alphabet)) != len(self.alphabet):
+            raise ValueError("OTP alphabet must have at least two distinct symbols")
+        if not set(self.alphabet) <= ALLOWED_SYMBOLS:
+            raise ValueError("OTP alphabet may only contain ASCII letters and digits")
+        if self.buffer_size < 16 * self.length:
+            raise ValueError(f"OTP buffer size must be at least {16 * self.length} bytes")
+
+        n = len(self.alphabet)
+        accepted = 256 - 256 % n
+        self._table = bytes(ord(self.alphabet[b % n]) if b < accepted else 0 for b in range(256))
+        self._rejected = bytes(range(accepted, 256))
+
+        self._lock = threading.Lock()
+        self._spare: Optional[List[str]] = None
+        self._refilling = False
+        self.stats = {"bytes_drawn": 0, "bytes_rejected": 0, "background_refills": 0, "sync_refills": 0}
+        # Codes handed out from earlier pools
+        self._served = 0
+        self._codes = self._build()
+        self._pool_size = len(self._codes)
+
+        generator = weakref.ref(self)
+        os.register_at_fork(after_in_child=lambda: generator() is not None and generator()._discard())
+
+        print(f"✅ OTP Generator initialized ({self.length} symbols from {n}, "
+              f"{self.entropy_bits:.1f} bits per code)")
+
+    @property
+    def entropy_bits(self) -> float:
+        return self.length * math.log2(len(self.alphabet))
+
+    def _build(self) -> List[str]:
+        """One buffer of random bytes as a pool of codes; leftover symbols are dropped"""
+        raw = os.urandom(self.buffer_size)
+        symbols = raw.translate(self._table, self._rejected).decode('ascii')
+        length = self.length
+        codes = [symbols[i:i + length] for i in range(0, len(symbols) - length + 1, length)]
+        with self._lock:
+            self.stats["bytes_drawn"] += len(raw)
+            self.stats["bytes_rejected"] += len(raw) - len(symbols)
+        return codes
+
+    def _refill(self):
+        codes = self._build()
+        with self._lock:
+            self._spare = codes
+            self._refilling = False
+            self.stats["background_refills"] += 1
+
+    def _discard(self):
+        """After a fork: the parent may hand out the same pooled codes"""
+        self._lock = threading.Lock()
+        self._codes, self._spare, self._refilling = [], None, False
+        self._pool_size = 0
+
+    def next_code(self) -> str:
+        """A fresh code of length symbols; safe to call from any thread"""
+        try:
+            return self._codes.pop()
+        except IndexError:
+            return self._next_pool()
+
+    def _next_pool(self) -> str:
+        with self._lock:
+            # Another thread may have swapped pools while this one waited
+            if self._codes:
+                return self._codes.pop()
+            spare, self._spare = self._spare, None
+        if spare is None:
+            spare = self._build()
+            with self._lock:
+                self.stats["sync_refills"] += 1
+        with self._lock:
+            if not self._codes:
+                self._served += self._pool_size
+                self._codes, self._pool_size = spare, len(spare)
+            code = self._codes.pop()
+            if self._spare is None and not self._refilling:
+                self._refilling = True
+                threading.Thread(target=self._refill, name="otp-refill", daemon=True).start()
+        return code
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get generator statistics and settings"""
+        with self._lock:
+            pooled = len(self._codes) + len(self._spare or ())
+            stats = {"codes": self._served + self._pool_size - len(self._codes), **self.stats}
+        drawn = stats["bytes_drawn"]
+        return {
+            **stats,
+            "length": self.length,
+            "alphabet_size": len(self.alphabet),
+            "entropy_bits": round(self.entropy_bits, 2),
+            "rejection_rate": round(stats["bytes_rejected"] / drawn, 4) if drawn else 0.0,
+            "pooled_codes": pooled
+        }
@@ -1,38 +1,49 @@
 """
 OTP Service for MediSync Healthcare Platform
-Handles OTP generation, SMS sending via Twilio, and verification
+Handles OTP generation, SMS sending via the SMS provider router, and verification
 """
 
+import heapq
+import itertools
 import os
-import random
 import time
 from typing import Dict, Optional, Tuple
-from twilio.rest import Client
-from twilio.base.exceptions import TwilioException
+from services.sms_service import SMSRouter, SMSUnavailableError, build_providers_from_env
+from services.delivery_service import DeliveryStatusService
+from services.abuse_service import AbuseDetectionService, AbuseBlockedError
+from services.event_bus import EventBus, OTPVerified
+from services.striped_locks import StripedLock
+from services.otp_generator import OTPGenerator
 
 class OTPService:
-    def __init__(self):
-        """Initialize OTP service with Twilio client"""
-        self.account_sid = os.getenv('TWILIO_ACCOUNT_SID')
-        self.auth_token = os.getenv('TWILIO_AUTH_TOKEN')
-        self.twilio_phone = os.getenv('TWILIO_PHONE_NUMBER')
+    def __init__(self, sms_router: Optional[SMSRouter] = None,
+                 delivery_service: Optional[DeliveryStatusService] = None,
+                 abuse_service: Optional[AbuseDetectionService] = None,
+                 event_bus: Optional[EventBus] = None,
+                 generator: Optional[OTPGenerator] = None):
+        """Initialize OTP service with the SMS providers configured in SMS_PROVIDERS"""
+        self.sms_router = sms_router or SMSRouter(build_providers_from_env())
+        self.delivery_service = delivery_service
+        self.abuse_service = abuse_service
+        self.event_bus = event_bus
+        # Length and alphabet come from OTP_LENGTH and OTP_ALPHABET
+        self.generator = generator or OTPGenerator()
+        self._demo_ids = itertools.count(1)
         
-        if not all([self.account_sid, self.auth_token, self.twilio_phone]):
-            raise ValueError("Twilio credentials not properly configured")
-        
-        self.client = Client(self.account_sid, self.auth_token)
-        
-        # In-memory OTP storage: {phone_number: {otp, timestamp, type}}
+        # In-memory OTP storage: {phone_number: {otp, timestamp, type}}. Never persisted:
+        # codes would sit on disk in plaintext, and a restart only means asking for a new one
         self.otp_store: Dict[str, Dict] = {}
+        # Every read-modify-write of one phone's entry holds that phone's stripe
+        self._locks = StripedLock(int(os.getenv('OTP_LOCK_STRIPES', '64')))
         
         # OTP expiry time in seconds (5 minutes)
         self.otp_expiry = 300
         
-        print("✅ OTP Service initialized with Twilio")
+        print(f"✅ OTP Service initialized with SMS providers: {', '.join(p.name for p in self.sms_router.providers)}")
     
     def generate_otp(self) -> str:
-        """Generate a random 6-digit OTP"""
-        return str(random.randint(100000, 999999))
+        """Generate a uniformly random OTP (6 digits by default)"""
+        return self.generator.next_code()
     
     def normalize_phone(self, phone: str) -> str:
         """Normalize phone number to standard format"""
@@ -47,13 +58,16 @@ class OTPService:
         else:
             return phone
     
-    async def send_otp(self, phone: str, otp_type: str) -> Dict[str, any]:
+    async def send_otp(self, phone: str, otp_type: str, client_ip: Optional[str] = None,
+                       challenge: Optional[str] = None) -> Dict[str, any]:
         """
         Send OTP via SMS using Twilio
         
         Args:
             phone: Phone number to send OTP to
             otp_type: Type of OTP (patient_login, patient_register, doctor_login, doctor_register)
+            client_ip: Address the request came from, for abuse detection
+            challenge: Solved abuse-detection challenge, if the client was given one
         
         Returns:
             Dictionary with success status and message
@@ -69,6 +83,10 @@ class OTPService:
             if self._is_rate_limited(normalized_phone):
                 raise Exception("Too many OTP requests. Please try again later.")
             
+            if self.abuse_service is not None:
+                self.abuse_service.check_send(client_ip, normalized_phone, otp_type, challenge)
+                self.abuse_service.record_send(client_ip, normalized_phone, otp_type)
+            
             # Generate OTP
             otp = self.generate_otp()
             current_time = time.time()
@@ -89,25 +107,28 @@ class OTPService:
             if normalized_phone in test_numbers:
                 # For demo numbers, don't actually send SMS, just log
                 print(f"📱 DEMO OTP for {normalized_phone}: {otp} (Type: {otp_type})")
-                twilio_sid = f"demo_{int(current_time)}"
+                message_id = f"demo_{int(current_time)}_{next(self._demo_ids)}"
+                provider = "demo"
             else:
-                # Send SMS via Twilio for real numbers
-                message = self.client.messages.create(
-                    body=message_body,
-                    from_=self.twilio_phone,
-                    to=normalized_phone
-                )
-                twilio_sid = message.sid
-                print(f"📱 OTP sent to {normalized_phone} (Type: {otp_type}, SID: {message.sid})")
+                # Send SMS through the healthiest provider for real numbers
+                delivery = await self.sms_router.send(normalized_phone, message_body)
+                message_id = delivery['message_id']
+                provider = delivery['provider']
+                print(f"📱 OTP sent to {normalized_phone} (Type: {otp_type}, Provider: {provider}, ID: {message_id})")
             
-            # Store OTP in memory
-            self.otp_store[normalized_phone] = {
-                'otp': otp,
-                'timestamp': current_time,
-                'type': otp_type,
-                'attempts': 0,
-                'twilio_sid': twilio_sid
-            }
+            if self.delivery_service is not None:
+                self.delivery_service.track(message_id, normalized_phone, provider)
+            
+            # Store OTP in memory (replacing any earlier one resets the attempt count)
+            with self._locks.for_key(normalized_phone):
+                self.otp_store[normalized_phone] = {
+                    'otp': otp,
+                    'timestamp': current_time,
+                    'type': otp_type,
+                    'attempts': 0,
+                    'message_id': message_id,
+                    'provider': provider
+                }
             
             return {
                 'success': True,
@@ -117,14 +138,18 @@ class OTPService:
                 'demo_otp': otp if normalized_phone in test_numbers else None
             }
             
-        except TwilioException as e:
-            print(f"❌ Twilio Error: {str(e)}")
-            raise Exception(f"Failed to send SMS: {str(e)}")
+        except SMSUnavailableError as e:
+            # Admission control refused the send; keep its status and Retry-After for the caller
+            print(f"⚠️ SMS unavailable for {phone}: {str(e)}")
+            raise
+        except AbuseBlockedError:
+            raise
         except Exception as e:
             print(f"❌ OTP Service Error: {str(e)}")
             raise Exception(f"OTP service error: {str(e)}")
     
-    async def verify_otp(self, phone: str, otp: str, otp_type: str) -> bool:
+    async def verify_otp(self, phone: str, otp: str, otp_type: str, client_ip: Optional[str] = None,
+                         challenge: Optional[str] = None) -> bool:
         """
         Verify OTP for given phone number and type
         
@@ -132,53 +157,76 @@ class OTPService:
             phone: Phone number to verify
             otp: OTP to verify
             otp_type: Expected OTP type
+            client_ip: Address the request came from, for abuse detection
+            challenge: Solved abuse-detection challenge, if the client was given one
         
         Returns:
             True if OTP is valid, False otherwise
+        
+        Raises:
+            AbuseBlockedError: too many verifications have failed recently for
+                this IP or phone (AbuseChallengeError for the phone prefix, until
+                a challenge is solved)
+        """
+        normalized_phone = self.normalize_phone(phone)
+        if self.abuse_service is not None:
+            self.abuse_service.check_verify(client_ip, normalized_phone, otp_type, challenge)
+        
+        is_valid = self._check_otp(normalized_phone, otp, otp_type)
+        
+        if not is_valid and self.abuse_service is not None:
+            # Failures outlive the per-OTP attempt counter, which resets on every new OTP
+            self.abuse_service.record_failure(client_ip, normalized_phone, otp_type)
+        if is_valid and self.event_bus is not None:
+            await self.event_bus.publish(OTPVerified(normalized_phone, otp_type))
+        return is_valid
+    
+    def _check_otp(self, normalized_phone: str, otp: str, otp_type: str) -> bool:
+        """
+        Compare-and-consume the stored OTP: on a match it is removed, otherwise
+        the attempt is counted. Runs under the phone's stripe lock, so concurrent
+        verifies can neither both consume one OTP nor exceed the attempt limit.
         """
         try:
             # Clean up expired OTPs first
             self._cleanup_expired_otps()
             
-            # Normalize phone number
-            normalized_phone = self.normalize_phone(phone)
-            
-            # Check if OTP exists for this phone
-            if normalized_phone not in self.otp_store:
-                print(f"❌ No OTP found for {normalized_phone}")
-                return False
-            
-            stored_data = self.otp_store[normalized_phone]
-            
-            # Check if OTP has expired
-            current_time = time.time()
-            if current_time - stored_data['timestamp'] > self.otp_expiry:
-                print(f"❌ OTP expired for {normalized_phone}")
-                del self.otp_store[normalized_phone]
-                return False
-            
-            # Check if OTP type matches
-            if stored_data['type'] != otp_type:
-                print(f"❌ OTP type mismatch for {normalized_phone}")
-                return False
-            
-            # Check attempt limit (max 3 attempts)
-            if stored_data['attempts'] >= 3:
-                print(f"❌ Too many attempts for {normalized_phone}")
-                del self.otp_store[normalized_phone]
-                return False
-            
-            # Verify OTP
-            if stored_data['otp'] == otp:
-                print(f"✅ OTP verified successfully for {normalized_phone}")
-                # Remove OTP after successful verification
-                del self.otp_store[normalized_phone]
-                return True
-            else:
-                # Increment attempt count
-                stored_data['attempts'] += 1
-                print(f"❌ Invalid OTP for {normalized_phone} (Attempt: {stored_data['attempts']})")
-                return False
+            with self._locks.for_key(normalized_phone):
+                stored_data = self.otp_store.get(normalized_phone)
+                
+                # Check if OTP exists for this phone
+                if stored_data is None:
+                    print(f"❌ No OTP found for {normalized_phone}")
+                    return False
+                
+                # Check if OTP has expired
+                current_time = time.time()
+                if current_time - stored_data['timestamp'] > self.otp_expiry:
+                    print(f"❌ OTP expired for {normalized_phone}")
+                    del self.otp_store[normalized_phone]
+                    return False
+                
+                # Check if OTP type matches
+                if stored_data['type'] != otp_type:
+                    print(f"❌ OTP type mismatch for {normalized_phone}")
+                    return False
+                
+                # Check attempt limit (max 3 attempts)
+                if stored_data['attempts'] >= 3:
+                    print(f"❌ Too many attempts for {normalized_phone}")
+                    del self.otp_store[normalized_phone]
+                    return False
+                
+                # Verify OTP
+                if stored_data['otp'] == otp:
+                    # Remove OTP after successful verification
+                    del self.otp_store[normalized_phone]
+                    return True
+                else:
+                    # Increment attempt count
+                    stored_data['attempts'] += 1
+                    print(f"❌ Invalid OTP for {normalized_phone} (Attempt: {stored_data['attempts']})")
+                    return False
                 
         except Exception as e:
             print(f"❌ OTP Verification Error: {str(e)}")
@@ -187,16 +235,31 @@ class OTPService:
     def _cleanup_expired_otps(self):
         """Remove expired OTPs from memory"""
         current_time = time.time()
-        expired_phones = []
-        
-        for phone, data in self.otp_store.items():
-            if current_time - data['timestamp'] > self.otp_expiry:
-                expired_phones.append(phone)
         
-        for phone in expired_phones:
-            del self.otp_store[phone]
+        # Iterate over a copy: other threads may add or remove entries meanwhile
+        for phone, data in list(self.otp_store.items()):
+            if current_time - data['timestamp'] <= self.otp_expiry:
+                continue
+            with self._locks.for_key(phone):
+                # Re-check under the lock: a fresh OTP may have replaced the expired one
+                data = self.otp_store.get(phone)
+                if data is None or current_time - data['timestamp'] <= self.otp_expiry:
+                    continue
+                del self.otp_store[phone]
             print(f"🗑️ Cleaned up expired OTP for {phone}")
     
+    def evict_oldest(self, count: int) -> int:
+        """Drop up to count OTPs, oldest first (expired ones are oldest); used by the memory watchdog"""
+        evicted = 0
+        for phone, data in heapq.nsmallest(count, list(self.otp_store.items()), key=lambda item: item[1]['timestamp']):
+            with self._locks.for_key(phone):
+                # Skip entries replaced by a fresh OTP since the copy was taken
+                if self.otp_store.get(phone) is not data:
+                    continue
+                del self.otp_store[phone]
+            evicted += 1
+        return evicted
+    
     def _is_rate_limited(self, phone: str) -> bool:
         """Check if phone number is rate limited"""
         # For demo purposes, allow unlimited OTPs
@@ -0,0 +1,344 @@
+"""
+Pathology Service for MediSync Healthcare Platform
+Handles lab report ingestion into a columnar store and reference-range flagging
+"""
+
+import itertools
+import json
+import os
+import re
+import threading
+import time
+from typing import Dict, List, Optional, Any, Iterator, Tuple
+
+import numpy as np
+
+# "TSH: 2.1 mIU/L", "WBC: 7,200/μL", "Platelets: 250,000/μL"
+RESULT_PATTERN = re.compile(
+    r"\b(?P<analyte>[A-Za-z][A-Za-z0-9\- ]*?)\s*:\s*"
+    r"(?P<value>(?:\d{1,3}(?:,\d{3})+|\d+)(?:\.\d+)?)\s*"
+    r"(?P<unit>(?:%|/|[A-Za-zμµ])[^\s,;()]*)?"
+)
+
+FLAG_LOW = -1
+FLAG_NORMAL = 0
+FLAG_HIGH = 1
+FLAG_UNKNOWN = 2
+FLAG_NAMES = {FLAG_LOW: "low", FLAG_NORMAL: "normal", FLAG_HIGH: "high", FLAG_UNKNOWN: "unknown"}
+
+
+def normalize_unit(unit: str) -> str:
+    """Canonical form of a unit for comparison (case, micro sign, "u" for micro, trailing period)"""
+    unit = unit.rstrip('.').replace('µ', 'μ').lower()
+    return re.sub(r"(?<![a-z])u(?=[gl])", 'μ', unit)
+
+
+class ColumnStore:
+    """Append-only columns backed by NumPy arrays with amortized growth"""
+
+    def __init__(self, schema: Dict[str, Any], capacity: int = 1024):
+        self.schema = schema
+        self.size = 0
+        self.columns = {name: np.empty(capacity, dtype=dtype) for name, dtype in schema.items()}
+
+    def append(self, batch: Dict[str, np.ndarray]):
+        n = len(next(iter(batch.values())))
+        needed = self.size + n
+        capacity = len(next(iter(self.columns.values())))
+        if needed > capacity:
+            while capacity < needed:
+                capacity *= 2
+            for name, column in self.columns.items():
+                grown = np.empty(capacity, dtype=column.dtype)
+                grown[:self.size] = column[:self.size]
+                self.columns[name] = grown
+        for name, values in batch.items():
+            self.columns[name][self.size:needed] = values
+        self.size = needed
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.columns[name][:self.size]
+
+
+class PathologyService:
+    def __init__(self, ranges_path: Optional[str] = None, max_adhoc_analytes: Optional[int] = None):
+        """Initialize pathology service with reference ranges"""
+        default_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'reference_ranges.json')
+        self.ranges_path = ranges_path or os.getenv('PATHOLOGY_RANGES_PATH', default_path)
+        # Analyte names without a reference range that uploads may add; results for further new names are skipped
+        self.max_adhoc_analytes = max_adhoc_analytes or int(os.getenv('PATHOLOGY_MAX_ADHOC_ANALYTES', '10000'))
+
+        # Dictionary encodings for string columns
+        self.analytes: List[str] = []
+        self.analyte_aliases: Dict[str, int] = {}
+        self.units: List[str] = []
+        self.unit_ids: Dict[str, int] = {}
+        self.patients: List[str] = []
+        self.patient_ids: Dict[str, int] = {}
+        self.reports: List[Dict[str, Any]] = []
+
+        # Reference ranges indexed by analyte id, fixed after loading: ids from
+        # reference_count on are ad-hoc names from uploads, which have no range
+        with open(self.ranges_path, encoding='utf-8') as f:
+            specs = json.load(f)
+        for name, spec in specs.items():
+            self.analyte_aliases[name.lower()] = len(self.analytes)
+            self.analytes.append(name)
+            for alias in spec.get('aliases', []):
+                self.analyte_aliases[alias.lower()] = self.analyte_aliases[name.lower()]
+        self.reference_count = len(self.analytes)
+        self.range_low = np.array([spec['low'] for spec in specs.values()], dtype=np.float64)
+        self.range_high = np.array([spec['high'] for spec in specs.values()], dtype=np.float64)
+        self.range_unit = np.array([self._unit_id(spec['unit']) for spec in specs.values()], dtype=np.int32)
+
+        self.results = ColumnStore({
+            "patient": np.int32,
+            "analyte": np.int32,
+            "value": np.float64,
+            "unit": np.int32,
+            "day": 'datetime64[D]',
+            "report": np.int32,
+            "flag": np.int8
+        })
+        # Row numbers of each patient's results, one array per ingested batch
+        self.patient_rows: Dict[int, List[np.ndarray]] = {}
+        # Report ids of each patient, in ingestion order
+        self.patient_reports: Dict[int, List[int]] = {}
+        self._lock = threading.Lock()
+
+        print(f"✅ Pathology Service initialized ({len(self.analytes)} reference ranges)")
+
+    def _analyte_id(self, name: str) -> int:
+        """Id of an analyte name, adding it as an ad-hoc analyte while there is room (-1 once the table is full)"""
+        key = name.lower()
+        analyte_id = self.analyte_aliases.get(key)
+        if analyte_id is None:
+            if len(self.analytes) - self.reference_count >= self.max_adhoc_analytes:
+                return -1
+            analyte_id = len(self.analytes)
+            self.analytes.append(name)
+            self.analyte_aliases[key] = analyte_id
+        return analyte_id
+
+    def _resolve_analyte(self, raw: str) -> int:
+        """Map a parsed analyte name to an id, dropping leading words that are not part of it (-1 if it cannot be stored)"""
+        words = raw.split()
+        for i in range(len(words)):
+            analyte_id = self.analyte_aliases.get(' '.join(words[i:]).lower())
+            if analyte_id is not None:
+                return analyte_id
+        return self._analyte_id(' '.join(words))
+
+    def _unit_id(self, unit: str) -> int:
+        key = normalize_unit(unit) if unit else ''
+        unit_id = self.unit_ids.get(key)
+        if unit_id is None:
+            unit_id = len(self.units)
+            self.units.append(unit.rstrip('.') if unit else '')
+            self.unit_ids[key] = unit_id
+        return unit_id
+
+    def _patient_id(self, patient: str) -> int:
+        patient_id = self.patient_ids.get(patient)
+        if patient_id is None:
+            patient_id = len(self.patients)
+            self.patients.append(patient)
+            self.patient_ids[patient] = patient_id
+        return patient_id
+
+    def parse_summary(self, summary: str) -> List[Tuple[str, float, str]]:
+        """Extract (analyte, value, unit) triples from a free-text report summary"""
+        return [
+            (m.group('analyte'), float(m.group('value').replace(',', '')), m.group('unit') or '')
+            for m in RESULT_PATTERN.finditer(summary)
+        ]
+
+    def flag_values(self, analyte: np.ndarray, value: np.ndarray, unit: np.ndarray) -> np.ndarray:
+        """Vectorized reference-range flags for a batch of results"""
+        known = analyte < self.reference_count
+        ranged = np.where(known, analyte, 0)
+        low = self.range_low[ranged]
+        high = self.range_high[ranged]
+        comparable = known & ~np.isnan(low) & (self.range_unit[ranged] == unit)
+        flags = np.full(len(value), FLAG_UNKNOWN, dtype=np.int8)
+        flags[comparable] = FLAG_NORMAL
+        flags[comparable & (value < low)] = FLAG_LOW
+        flags[comparable & (value > high)] = FLAG_HIGH
+        return flags
+
+    def ingest_reports(self, reports: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Parse, flag and store a batch of lab reports
+
+        Args:
+            reports: List of {patient_id, date, summary, lab_name, test_type}
+
+        Returns:
+            Dictionary with counts of ingested reports, parsed results and flags
+        """
+        start = time.perf_counter()
+        # Regex parsing needs no shared state, so it runs before taking the lock
+        parsed = [self.parse_summary(report['summary']) for report in reports]
+
+        with self._lock:
+            patients, analytes, values, units, days, report_ids = [], [], [], [], [], []
+            skipped = 0
+            for report, results in zip(reports, parsed):
+                report_id = len(self.reports)
+                self.reports.append({
+                    "patient_id": report['patient_id'],
+                    "date": report['date'],
+                    "lab_name": report.get('lab_name'),
+                    "test_type": report.get('test_type')
+                })
+                patient_id = self._patient_id(report['patient_id'])
+                self.patient_reports.setdefault(patient_id, []).append(report_id)
+                for analyte, value, unit in results:
+                    analyte_id = self._resolve_analyte(analyte)
+                    if analyte_id < 0:
+                        skipped += 1
+                        continue
+                    patients.append(patient_id)
+                    analytes.append(analyte_id)
+                    values.append(value)
+                    units.append(self._unit_id(unit))
+                    days.append(report['date'])
+                    report_ids.append(report_id)
+
+            batch = {
+                "patient": np.array(patients, dtype=np.int32),
+                "analyte": np.array(analytes, dtype=np.int32),
+                "value": np.array(values, dtype=np.float64),
+                "unit": np.array(units, dtype=np.int32),
+                "day": np.array(days, dtype='datetime64[D]'),
+                "report": np.array(report_ids, dtype=np.int32)
+            }
+            batch["flag"] = self.flag_values(batch["analyte"], batch["value"], batch["unit"])
+
+            first_row = self.results.size
+            self.results.append(batch)
+            self._index_patient_rows(batch["patient"], first_row)
+
+        counts = np.bincount(batch["flag"].astype(np.int64) + 1, minlength=4)
+        return {
+            "reports_ingested": len(reports),
+            "results_parsed": len(values),
+            "results_skipped": skipped,
+            "flags": {FLAG_NAMES[flag]: int(counts[flag + 1]) for flag in FLAG_NAMES},
+            "elapsed_ms": round((time.perf_counter() - start) * 1000, 3)
+        }
+
+    def _index_patient_rows(self, patients: np.ndarray, first_row: int):
+        """Group the new rows by patient with a single sort instead of a per-row loop"""
+        if len(patients) == 0:
+            return
+        order = np.argsort(patients, kind='stable')
+        sorted_patients = patients[order]
+        boundaries = np.flatnonzero(np.diff(sorted_patients)) + 1
+        for rows in np.split(order + first_row, boundaries):
+            self.patient_rows.setdefault(int(patients[rows[0] - first_row]), []).append(rows)
+
+    def get_trend(self, patient: str, analyte: str) -> Optional[Dict[str, Any]]:
+        """Get one patient's results for an analyte in date order"""
+        patient_id = self.patient_ids.get(patient)
+        analyte_id = self.analyte_aliases.get(analyte.lower())
+        if patient_id is None or analyte_id is None:
+            return None
+
+        with self._lock:
+            chunks = self.patient_rows.get(patient_id, [])
+            rows = np.concatenate(chunks) if chunks else np.empty(0, dtype=np.int64)
+            rows = rows[self.results["analyte"][rows] == analyte_id]
+            days = self.results["day"][rows]
+            rows = rows[np.argsort(days, kind='stable')]
+            columns = {name: self.results[name][rows] for name in ("day", "value", "unit", "flag", "report")}
+
+        # Ad-hoc analytes from uploads have no reference range
+        low = high = np.nan
+        if analyte_id < self.reference_count:
+            low, high = self.range_low[analyte_id], self.range_high[analyte_id]
+        return {
+            "patient_id": patient,
+            "analyte": self.analytes[analyte_id],
+            "reference_range": None if np.isnan(low) else {
+                "low": float(low), "high": float(high), "unit": self.units[self.range_unit[analyte_id]]
+            },
+            "points": [
+                {
+                    "date": str(day),
+                    "value": float(value),
+                    "unit": self.units[unit],
+                    "flag": FLAG_NAMES[int(flag)],
+                    "lab_name": self.reports[report]['lab_name']
+                }
+                for day, value, unit, flag, report in zip(
+                    columns["day"], columns["value"], columns["unit"], columns["flag"], columns["report"])
+            ]
+        }
+
+    def count_patient_data(self, patient: str) -> Tuple[int, int]:
+        """Number of (reports, results) stored for a patient so far"""
+        patient_id = self.patient_ids.get(patient)
+        if patient_id is None:
+            return 0, 0
+        with self._lock:
+            return (len(self.patient_reports.get(patient_id, ())),
+                    sum(len(rows) for rows in self.patient_rows.get(patient_id, ())))
+
+    def iter_patient_reports(self, patient: str, limit: int, chunk_size: int = 1000) -> Iterator[List[Dict[str, Any]]]:
+        """A patient's first ``limit`` reports, a chunk at a time"""
+        patient_id = self.patient_ids.get(patient)
+        if patient_id is None:
+            return
+        for start in range(0, limit, chunk_size):
+            with self._lock:
+                report_ids = self.patient_reports[patient_id][start:min(start + chunk_size, limit)]
+                yield [{"report_id": report_id, **self.reports[report_id]} for report_id in report_ids]
+
+    def iter_patient_results(self, patient: str, limit: int, chunk_size: int = 1000) -> Iterator[List[Dict[str, Any]]]:
+        """
+        A patient's first ``limit`` results in ingestion order, a chunk at a time
+
+        Storage is append-only, so the same limit always yields the same rows
+        however much has been ingested since.
+        """
+        patient_id = self.patient_ids.get(patient)
+        if patient_id is None:
+            return
+        # Walk the per-batch row arrays without concatenating them
+        emitted = 0
+        for batch_index in itertools.count():
+            with self._lock:
+                batches = self.patient_rows.get(patient_id, [])
+                if emitted >= limit or batch_index >= len(batches):
+                    return
+                batch = batches[batch_index][:limit - emitted]
+            for start in range(0, len(batch), chunk_size):
+                with self._lock:
+                    rows = batch[start:start + chunk_size]
+                    columns = {name: self.results[name][rows] for name in ("day", "analyte", "value", "unit", "flag", "report")}
+                analytes, units = self.analytes, self.units
+                yield [
+                    {
+                        "date": day,
+                        "analyte": analytes[analyte],
+                        "value": value,
+                        "unit": units[unit],
+                        "flag": FLAG_NAMES[flag],
+                        "report_id": report
+                    }
+                    # Bulk conversion to Python scalars first; per-element numpy access is far slower
+                    for day, analyte, value, unit, flag, report in zip(
+                        columns["day"].astype(str).tolist(), columns["analyte"].tolist(), columns["value"].tolist(),
+                        columns["unit"].tolist(), columns["flag"].tolist(), columns["report"].tolist())
+                ]
+            emitted += len(batch)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get service statistics"""
+        return {
+            "reports": len(self.reports),
+            "results": self.results.size,
+            "patients": len(self.patients),
+            "analytes": len(self.analytes)
+        }
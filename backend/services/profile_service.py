@@ -0,0 +1,85 @@
+"""
+Profile Service for MediSync Healthcare Platform
+Handles cached, ETag-validated profile reads for patients and doctors
+"""
+
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Any, Tuple
+
+from services.auth_service import AuthService
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against an entity tag (RFC 7232)"""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate == '*' or candidate.removeprefix('W/') == etag:
+            return True
+    return False
+
+
+class ProfileService:
+    def __init__(self, auth_service: AuthService, cache_size: Optional[int] = None):
+        """Initialize profile service on top of the auth service's user records"""
+        self.stores = {"patient": auth_service.patients, "doctor": auth_service.doctors}
+        self.cache_size = cache_size or int(os.getenv('PROFILE_CACHE_SIZE', '10000'))
+
+        # (role, phone) -> (version, encoded response body), least recently used first
+        self._cache: 'OrderedDict[Tuple[str, str], Tuple[int, bytes]]' = OrderedDict()
+        # Versions restart with the in-memory store, so tags carry the boot time too
+        self._epoch = format(int(time.time()), 'x')
+        self.stats = {"not_modified": 0, "cache_hits": 0, "cache_misses": 0}
+
+        print("✅ Profile Service initialized")
+
+    def etag(self, record: Dict[str, Any]) -> str:
+        """Strong ETag of a profile record, derived from its version counter"""
+        return f'"{record["id"]}.{record.get("version", 0)}.{self._epoch}"'
+
+    def get_profile(self, role: str, phone: str,
+                    if_none_match: Optional[str] = None) -> Optional[Tuple[str, Optional[bytes]]]:
+        """
+        Get a profile's ETag and encoded JSON body
+
+        Returns:
+            None if there is no such profile, (etag, None) when the client's
+            copy is current, otherwise (etag, body)
+        """
+        record = self.stores[role].get(phone)
+        if record is None:
+            return None
+
+        etag = self.etag(record)
+        if etag_matches(if_none_match, etag):
+            self.stats["not_modified"] += 1
+            return etag, None
+
+        key = (role, phone)
+        version = record.get("version", 0)
+        cached = self._cache.get(key)
+        if cached is not None and cached[0] == version:
+            self._cache.move_to_end(key)
+            self.stats["cache_hits"] += 1
+            return etag, cached[1]
+
+        self.stats["cache_misses"] += 1
+        profile = {k: v for k, v in record.items() if k != 'password_hash'}
+        body = json.dumps({"success": True, "profile": profile}, separators=(',', ':')).encode()
+        self._cache[key] = (version, body)
+        self._cache.move_to_end(key)
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return etag, body
+
+    def invalidate(self, role: str, phone: str):
+        """Drop a cached profile after a write"""
+        self._cache.pop((role, phone), None)
+
+    def get_stats(self) -> Dict[str, int]:
+        """Get service statistics"""
+        return {"cached_profiles": len(self._cache), **self.stats}
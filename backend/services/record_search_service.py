@@ -0,0 +1,685 @@
+"""
+Record Search Service for MediSync Healthcare Platform
+Handles BM25 full-text search over medical records with phrase queries and per-patient scoping
+"""
+
+import asyncio
+import itertools
+import math
+import os
+import re
+import time
+from typing import Dict, List, Optional, Any, Iterable, Tuple
+
+import numpy as np
+
+from services.doctor_search_service import TOKEN_PATTERN, tokenize
+
+# Searchable record fields and their BM25F weights: a term's frequency in a record
+# is the weighted sum of its counts per field, and so is the record's length
+FIELDS = {"title": 3, "tests_recommended": 2, "prescription": 2, "description": 1, "notes": 1}
+# Token positions are (field index << 16) | offset, so a phrase never spans two fields
+POSITION_BITS = 16
+# Tokens past this in one field are not indexed, so an offset never spills into the field bits
+# (the request models cap fields far below it)
+MAX_FIELD_TOKENS = 1 << POSITION_BITS
+_FIELD_LAYOUT = [(name, weight, field << POSITION_BITS) for field, (name, weight) in enumerate(FIELDS.items())]
+_FIELD_WEIGHTS = np.array(list(FIELDS.values()), dtype=np.float64)
+_CHUNK_TOKEN_PATTERN = re.compile(TOKEN_PATTERN.pattern + r"|\0")
+K1 = 1.2
+B = 0.75
+PHRASE_PATTERN = re.compile(r'"([^"]*)"')
+SEGMENT_NAME = re.compile(r'^seg-(\d{8})\.npz$')
+
+
+def _narrow(values: np.ndarray) -> np.ndarray:
+    """values in the smallest unsigned dtype that holds them all"""
+    top = int(values.max()) if len(values) else 0
+    for dtype in (np.uint8, np.uint16, np.uint32):
+        if top <= np.iinfo(dtype).max:
+            return values.astype(dtype)
+    return values.astype(np.uint64)
+
+
+def _take_ranges(values: np.ndarray, starts: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """Concatenation of values[start:start + length] for every (start, length), without a Python loop"""
+    if len(lengths) == 0:
+        return values[:0]
+    ends = np.cumsum(lengths)
+    return values[np.arange(ends[-1]) + np.repeat(starts - (ends - lengths), lengths)]
+
+
+def _delta_encode(values: np.ndarray, starts: np.ndarray) -> np.ndarray:
+    """Differences between neighbours, restarting at every run start (runs are ascending and non-empty)"""
+    deltas = values.astype(np.int64)
+    deltas[1:] -= values[:-1].astype(np.int64)
+    deltas[starts] = values[starts]
+    return _narrow(deltas)
+
+
+def _delta_decode(deltas: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    totals = np.cumsum(deltas, dtype=np.int64)
+    starts = np.cumsum(counts) - counts
+    return totals - np.repeat(totals[starts] - deltas[starts], counts)
+
+
+def _pack_strings(strings: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    encoded = [s.encode('utf-8') for s in strings]
+    return (np.frombuffer(b"".join(encoded), dtype=np.uint8),
+            _narrow(np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded))))
+
+
+def _unpack_strings(data: np.ndarray, lengths: np.ndarray) -> List[str]:
+    raw = data.tobytes()
+    ends = np.cumsum(lengths, dtype=np.int64).tolist()
+    return [raw[start:end].decode('utf-8') for start, end in zip([0] + ends[:-1], ends)]
+
+
+class Segment:
+    """
+    Immutable postings for a contiguous range of document ids
+
+    Postings are grouped by term (vocabulary order) and sorted by document
+    within a term; each posting has a weighted term frequency and a run of
+    token positions. Everything lives in flat NumPy arrays of 32-bit values,
+    so a segment costs a few bytes per posting instead of Python objects.
+    """
+
+    __slots__ = ('seq', 'doc_start', 'doc_end', 'terms', 'starts', 'docs', 'tfs', 'pos_starts', 'positions')
+
+    def __init__(self, seq: int, doc_start: int, doc_end: int, vocabulary: List[str], counts: np.ndarray,
+                 docs: np.ndarray, tfs: np.ndarray, pos_counts: np.ndarray, positions: np.ndarray):
+        self.seq = seq
+        self.doc_start = doc_start
+        self.doc_end = doc_end
+        self.terms = {term: row for row, term in enumerate(vocabulary)}
+        self.starts = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        np.cumsum(counts, out=self.starts[1:])
+        self.docs = docs.astype(np.uint32, copy=False)
+        self.tfs = tfs.astype(np.float32, copy=False)
+        self.pos_starts = np.zeros(len(docs) + 1, dtype=np.int64)
+        np.cumsum(pos_counts, out=self.pos_starts[1:])
+        self.positions = positions.astype(np.int32, copy=False)
+
+    @property
+    def postings(self) -> int:
+        return len(self.docs)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(getattr(self, name).nbytes for name in ('starts', 'docs', 'tfs', 'pos_starts', 'positions'))
+
+    def document_frequency(self, term: str) -> int:
+        row = self.terms.get(term)
+        return 0 if row is None else int(self.starts[row + 1] - self.starts[row])
+
+    def match(self, term: str, scope: Optional[np.ndarray]) -> Optional[np.ndarray]:
+        """Posting indexes of term, limited to the documents in scope (a sorted id array) if given"""
+        row = self.terms.get(term)
+        if row is None:
+            return None
+        lo, hi = int(self.starts[row]), int(self.starts[row + 1])
+        if scope is None:
+            return np.arange(lo, hi)
+        scope = scope[np.searchsorted(scope, self.doc_start):np.searchsorted(scope, self.doc_end)]
+        docs = self.docs[lo:hi]
+        found = np.searchsorted(docs, scope)
+        inside = found < len(docs)
+        found = found[inside]
+        return found[docs[found] == scope[inside]] + lo
+
+    def positions_of(self, postings: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """(document, position) pairs of the given postings"""
+        counts = self.pos_starts[postings + 1] - self.pos_starts[postings]
+        return (np.repeat(self.docs[postings].astype(np.int64), counts),
+                _take_ranges(self.positions, self.pos_starts[postings], counts).astype(np.int64))
+
+    def arrays(self) -> Tuple[List[str], np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        return (list(self.terms), np.diff(self.starts), self.docs, self.tfs,
+                np.diff(self.pos_starts), self.positions)
+
+
+def _compact(vocabulary: List[str], counts: np.ndarray, docs: np.ndarray, tfs: np.ndarray,
+             pos_counts: np.ndarray, positions: np.ndarray, live: np.ndarray):
+    """Drop postings of deleted documents, and terms left without postings"""
+    keep = live[docs]
+    if keep.all():
+        return vocabulary, counts, docs, tfs, pos_counts, positions
+    term_ids = np.repeat(np.arange(len(vocabulary)), counts)[keep]
+    positions = positions[np.repeat(keep, pos_counts)]
+    docs, tfs, pos_counts = docs[keep], tfs[keep], pos_counts[keep]
+    counts = np.bincount(term_ids, minlength=len(vocabulary))
+    nonempty = counts > 0
+    vocabulary = list(itertools.compress(vocabulary, nonempty.tolist()))
+    return vocabulary, counts[nonempty], docs, tfs, pos_counts, positions
+
+
+def merge_segments(segments: List[Segment], live: np.ndarray, seq: int) -> Segment:
+    """
+    Merge adjacent segments into one, dropping deleted documents
+
+    Inputs cover consecutive document ranges in order, so a stable sort on
+    the merged term id keeps every term's postings sorted by document.
+    Reads only immutable inputs, so it can run in a worker thread.
+    """
+    vocabulary = sorted(set().union(*(segment.terms for segment in segments)))
+    term_ids = {term: i for i, term in enumerate(vocabulary)}
+    merged_terms = np.concatenate([
+        np.repeat(np.fromiter((term_ids[t] for t in segment.terms), dtype=np.int64, count=len(segment.terms)),
+                  np.diff(segment.starts))
+        for segment in segments
+    ])
+    order = np.argsort(merged_terms, kind='stable')
+
+    pos_counts = np.concatenate([np.diff(segment.pos_starts) for segment in segments])
+    pos_offsets = np.cumsum([0] + [len(segment.positions) for segment in segments[:-1]])
+    pos_starts = np.concatenate([segment.pos_starts[:-1] + offset for segment, offset in zip(segments, pos_offsets)])
+    positions = _take_ranges(np.concatenate([segment.positions for segment in segments]),
+                             pos_starts[order], pos_counts[order])
+
+    parts = _compact(
+        vocabulary,
+        np.bincount(merged_terms, minlength=len(vocabulary)),
+        np.concatenate([segment.docs for segment in segments])[order],
+        np.concatenate([segment.tfs for segment in segments])[order],
+        pos_counts[order],
+        positions,
+        live
+    )
+    return Segment(seq, segments[0].doc_start, segments[-1].doc_end, *parts)
+
+
+class RecordSearchService:
+    def __init__(self, records: Optional[Dict[str, Dict[str, Any]]] = None, directory: Optional[str] = None,
+                 tail_docs: Optional[int] = None):
+        """Initialize the record index: load persisted segments, then index records they do not cover"""
+        state_dir = os.getenv('STATE_DIR')
+        self.directory = directory or os.getenv('RECORD_INDEX_DIR') or (
+            os.path.join(state_dir, 'record_index') if state_dir else None)
+        # Records are indexed into an in-memory tail that is frozen into a segment when full
+        self.tail_docs = tail_docs or int(os.getenv('RECORD_INDEX_TAIL_DOCS', '10000'))
+
+        # Per-document columns, indexed by document id
+        self._size = 0
+        self._patient = np.zeros(1024, dtype=np.int32)
+        self._length = np.zeros(1024, dtype=np.float64)
+        self._live = np.zeros(1024, dtype=bool)
+        self.doc_records: List[str] = []
+        self.doc_versions: List[int] = []
+
+        self.record_docs: Dict[str, int] = {}  # record id -> its live document
+        self.patient_ids: Dict[str, int] = {}
+        self.patients: List[str] = []
+        self.patient_docs: Dict[int, List[int]] = {}  # ascending document ids, live or not
+        self.live_docs = 0
+        self.live_length = 0.0
+
+        self.segments: List[Segment] = []
+        # term -> [(doc id, weighted tf, [positions])] for documents not yet frozen
+        self._tail: Dict[str, List[Tuple[int, float, List[int]]]] = {}
+        self._tail_start = 0
+        self._seq = itertools.count(1)
+        self._merge_task: Optional[asyncio.Task] = None
+        self.stats = {"queries": 0, "segments_written": 0, "merges": 0, "loaded_docs": 0, "last_query_ms": None}
+
+        start = time.perf_counter()
+        if self.directory:
+            os.makedirs(self.directory, mode=0o700, exist_ok=True)
+            self._load(records or {})
+        self.add_records(record for record in (records or {}).values() if record['id'] not in self.record_docs)
+        elapsed = (time.perf_counter() - start) * 1000
+
+        print(f"✅ Record Search Service initialized ({self.live_docs} records indexed, "
+              f"{self.stats['loaded_docs']} from disk, {elapsed:.0f} ms)")
+
+    # Documents
+    def _patient_id(self, patient: str) -> int:
+        patient_id = self.patient_ids.get(patient)
+        if patient_id is None:
+            patient_id = len(self.patients)
+            self.patients.append(patient)
+            self.patient_ids[patient] = patient_id
+        return patient_id
+
+    def _reserve(self, n: int):
+        needed = self._size + n
+        if needed > len(self._live):
+            capacity = max(needed, 2 * len(self._live))
+            for name in ('_patient', '_length', '_live'):
+                column = getattr(self, name)
+                grown = np.zeros(capacity, dtype=column.dtype)
+                grown[:self._size] = column[:self._size]
+                setattr(self, name, grown)
+
+    def _new_doc(self, record_id: str, version: int, patient_id: int, length: float, live: bool) -> int:
+        doc = self._size
+        self._reserve(1)
+        self._size += 1
+        self._patient[doc] = patient_id
+        self._length[doc] = length
+        self._live[doc] = live
+        self.doc_records.append(record_id)
+        self.doc_versions.append(version)
+        self.patient_docs.setdefault(patient_id, []).append(doc)
+        if live:
+            self.record_docs[record_id] = doc
+            self.live_docs += 1
+            self.live_length += length
+        return doc
+
+    def add_record(self, record: Dict[str, Any]):
+        """Index a record, replacing the earlier version of it if there is one"""
+        self.remove_record(record['id'])
+        term_tfs: Dict[str, float] = {}
+        term_positions: Dict[str, List[int]] = {}
+        length = 0
+        for name, weight, base in _FIELD_LAYOUT:
+            tokens = TOKEN_PATTERN.findall((record.get(name) or '').lower())[:MAX_FIELD_TOKENS]
+            length += weight * len(tokens)
+            for position, token in enumerate(tokens, base):
+                positions = term_positions.get(token)
+                if positions is None:
+                    term_positions[token] = [position]
+                    term_tfs[token] = weight
+                else:
+                    positions.append(position)
+                    term_tfs[token] += weight
+
+        doc = self._new_doc(record['id'], record.get('version', 1), self._patient_id(record['patient_id']), length, True)
+        tail = self._tail
+        for term, positions in term_positions.items():
+            entry = tail.get(term)
+            if entry is None:
+                tail[term] = [(doc, term_tfs[term], positions)]
+            else:
+                entry.append((doc, term_tfs[term], positions))
+
+        if self._size - self._tail_start >= self.tail_docs:
+            self.flush()
+
+    def add_records(self, records: Iterable[Dict[str, Any]], chunk_size: int = 100_000):
+        """
+        Index many records at once, straight into segments
+
+        Tokens are collected into flat arrays and grouped into postings with
+        one sort per chunk, several times faster than add_record per record.
+        """
+        self.flush()
+        records = iter(records)
+        while chunk := list(itertools.islice(records, chunk_size)):
+            for record in chunk:
+                self.remove_record(record['id'])
+            doc_start = self._size
+            for record in chunk:
+                self._new_doc(record['id'], record.get('version', 1), self._patient_id(record['patient_id']), 0, True)
+            segment, lengths = self._build_segment(chunk, doc_start)
+            self._length[doc_start:self._size] = lengths
+            self.live_length += float(lengths.sum())
+            self.segments.append(segment)
+            self._tail_start = self._size
+            if self.directory:
+                self._write(segment, self._segment_docs(segment))
+            self._schedule_merge()
+
+    def _build_segment(self, records: List[Dict[str, Any]], doc_start: int) -> Tuple[Segment, np.ndarray]:
+        # Tokenize each field of the whole chunk in one regex pass, records separated by NUL tokens
+        field_tokens = []
+        for name, _, _ in _FIELD_LAYOUT:
+            texts = [record.get(name) or '' for record in records]
+            joined = "\0".join(texts)
+            if joined.count("\0") >= len(texts):
+                joined = "\0".join(text.replace("\0", " ") for text in texts)
+            field_tokens.append(_CHUNK_TOKEN_PATTERN.findall(joined.lower() + "\0"))
+
+        # The separator sorts first, so term ids are ranks in the sorted vocabulary, plus one
+        vocabulary = sorted(set().union(*field_tokens))
+        ranks = {term: rank for rank, term in enumerate(vocabulary)}
+        vocabulary = vocabulary[1:]
+        terms, docs, positions = [], [], []
+        for (_, _, base), tokens in zip(_FIELD_LAYOUT, field_tokens):
+            ids = np.fromiter(map(ranks.__getitem__, tokens), dtype=np.int64, count=len(tokens))
+            separators = ids == 0
+            index = np.arange(len(ids))
+            offsets = index - np.maximum.accumulate(np.where(separators, index, -1)) - 1
+            keep = ~separators & (offsets < MAX_FIELD_TOKENS)
+            terms.append(ids[keep] - 1)
+            docs.append((np.cumsum(separators) - separators)[keep])
+            positions.append(offsets[keep] + base)
+
+        n_docs = len(records)
+        terms, docs, positions = np.concatenate(terms), np.concatenate(docs), np.concatenate(positions)
+        weights = _FIELD_WEIGHTS[positions >> POSITION_BITS]
+        lengths = np.bincount(docs, weights=weights, minlength=n_docs)
+
+        order = np.lexsort((positions, docs, terms))
+        terms, docs, positions, weights = terms[order], docs[order], positions[order], weights[order]
+        # One posting per run of equal (term, doc)
+        first = np.ones(len(terms), dtype=bool)
+        first[1:] = (terms[1:] != terms[:-1]) | (docs[1:] != docs[:-1])
+        posting = np.cumsum(first) - 1
+        segment = Segment(
+            next(self._seq), doc_start, doc_start + n_docs, vocabulary,
+            np.bincount(terms[first], minlength=len(vocabulary)),
+            docs[first] + doc_start,
+            np.bincount(posting, weights=weights),
+            np.bincount(posting),
+            positions
+        )
+        return segment, lengths
+
+    def remove_record(self, record_id: str):
+        """Remove a record from search results; its postings are dropped at the next merge"""
+        doc = self.record_docs.pop(record_id, None)
+        if doc is None:
+            return
+        self._live[doc] = False
+        self.live_docs -= 1
+        self.live_length -= self._length[doc]
+
+    # Segments
+    def flush(self):
+        """Freeze the in-memory tail into a segment, write it out and merge segments of similar size"""
+        if self._size == self._tail_start:
+            return
+        vocabulary = sorted(self._tail)
+        postings = [posting for term in vocabulary for posting in self._tail[term]]
+        total = len(postings)
+        pos_counts = np.fromiter((len(posting[2]) for posting in postings), dtype=np.int64, count=total)
+        parts = _compact(
+            vocabulary,
+            np.fromiter((len(self._tail[term]) for term in vocabulary), dtype=np.int64, count=len(vocabulary)),
+            np.fromiter((posting[0] for posting in postings), dtype=np.int64, count=total),
+            np.fromiter((posting[1] for posting in postings), dtype=np.float64, count=total),
+            pos_counts,
+            np.fromiter(itertools.chain.from_iterable(posting[2] for posting in postings),
+                        dtype=np.int64, count=int(pos_counts.sum())),
+            self._live[:self._size]
+        )
+        segment = Segment(next(self._seq), self._tail_start, self._size, *parts)
+        self.segments.append(segment)
+        self._tail = {}
+        self._tail_start = self._size
+        if self.directory:
+            self._write(segment, self._segment_docs(segment))
+        self._schedule_merge()
+
+    def _merge_candidates(self) -> Optional[List[Segment]]:
+        """The last two segments once the older is no more than twice the newer (a binary-counter policy)"""
+        if len(self.segments) >= 2:
+            older, newer = self.segments[-2:]
+            if older.doc_end - older.doc_start <= 2 * (newer.doc_end - newer.doc_start):
+                return [older, newer]
+        return None
+
+    def _schedule_merge(self):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        if loop is None:
+            # No event loop (bulk loads, scripts): merge inline
+            while (candidates := self._merge_candidates()) is not None:
+                merged = merge_segments(candidates, self._live[:self._size], next(self._seq))
+                if self.directory:
+                    self._write(merged, self._segment_docs(merged))
+                self._replace(candidates, merged)
+        elif self._merge_task is None or self._merge_task.done():
+            self._merge_task = loop.create_task(self._merge_in_background())
+
+    async def _merge_in_background(self):
+        # Inputs are immutable, so merging runs in a thread while queries keep using them
+        while (candidates := self._merge_candidates()) is not None:
+            live = self._live[:self._size].copy()
+            merged = await asyncio.to_thread(merge_segments, candidates, live, next(self._seq))
+            if self.directory:
+                await asyncio.to_thread(self._write, merged, self._segment_docs(merged))
+            self._replace(candidates, merged)
+
+    def _replace(self, old: List[Segment], merged: Segment):
+        index = next(i for i, segment in enumerate(self.segments) if segment is old[0])
+        self.segments[index:index + len(old)] = [merged]
+        self.stats["merges"] += 1
+        if self.directory:
+            for segment in old:
+                os.remove(self._segment_path(segment.seq))
+
+    # Persistence
+    def _segment_path(self, seq: int) -> str:
+        return os.path.join(self.directory, f'seg-{seq:08d}.npz')
+
+    def _segment_docs(self, segment: Segment) -> Dict[str, Any]:
+        """Copy of the document columns a segment covers, taken on the event loop for the writer thread"""
+        docs = slice(segment.doc_start, segment.doc_end)
+        return {
+            "records": self.doc_records[docs],
+            "versions": self.doc_versions[docs],
+            "patients": [self.patients[p] for p in self._patient[docs].tolist()],
+            "lengths": self._length[docs].copy()
+        }
+
+    def _write(self, segment: Segment, docs: Dict[str, Any]):
+        """
+        Write a segment as compact posting lists: document ids and positions are
+        delta-encoded within each list and every array is stored in the
+        narrowest unsigned type that fits
+        """
+        vocabulary, counts, doc_ids, tfs, pos_counts, positions = segment.arrays()
+        patient_names = sorted(set(docs["patients"]))
+        patient_index = {name: i for i, name in enumerate(patient_names)}
+        vocab_data, vocab_lengths = _pack_strings(vocabulary)
+        record_data, record_lengths = _pack_strings(docs["records"])
+        patient_data, patient_lengths = _pack_strings(patient_names)
+        arrays = {
+            "vocab_data": vocab_data, "vocab_lengths": vocab_lengths,
+            "counts": _narrow(counts),
+            "docs": _delta_encode(doc_ids - segment.doc_start, segment.starts[:-1]),
+            # Field weights are integers, so weighted frequencies are too
+            "tfs": _narrow(tfs.astype(np.int64)),
+            "pos_counts": _narrow(pos_counts),
+            "positions": _delta_encode(positions, segment.pos_starts[:-1]),
+            "record_data": record_data, "record_lengths": record_lengths,
+            "versions": _narrow(np.array(docs["versions"], dtype=np.int64)),
+            "patient_data": patient_data, "patient_lengths": patient_lengths,
+            "doc_patients": _narrow(np.fromiter((patient_index[p] for p in docs["patients"]), dtype=np.int64,
+                                                count=len(docs["patients"]))),
+            "lengths": _narrow(docs["lengths"].astype(np.int64))
+        }
+        path = self._segment_path(segment.seq)
+        with open(path + '.tmp', 'wb') as f:
+            np.savez(f, **arrays)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + '.tmp', path)
+        self.stats["segments_written"] += 1
+
+    def _load(self, records: Dict[str, Dict[str, Any]]):
+        """Load persisted segments; documents whose record changed or disappeared since are marked deleted"""
+        sequences = sorted(int(m.group(1)) for m in map(SEGMENT_NAME.match, os.listdir(self.directory)) if m)
+        for seq in sequences:
+            with np.load(self._segment_path(seq), allow_pickle=False) as data:
+                arrays = {name: data[name] for name in data.files}
+            doc_start = self._size
+            record_ids = _unpack_strings(arrays["record_data"], arrays["record_lengths"])
+            patient_ids = np.array([self._patient_id(name) for name in
+                                    _unpack_strings(arrays["patient_data"], arrays["patient_lengths"])], dtype=np.int32)
+            doc_patients = patient_ids[arrays["doc_patients"]].tolist()
+            lengths = arrays["lengths"].astype(np.float64).tolist()
+            for record_id, version, patient_id, length in zip(record_ids, arrays["versions"].tolist(),
+                                                              doc_patients, lengths):
+                record = records.get(record_id)
+                live = record is not None and record.get('version', 1) == version
+                if live:
+                    # A later segment can repeat a document if a merge was interrupted; the last copy wins
+                    self.remove_record(record_id)
+                    self.stats["loaded_docs"] += 1
+                self._new_doc(record_id, version, patient_id, length, live)
+
+            counts = arrays["counts"].astype(np.int64)
+            pos_counts = arrays["pos_counts"].astype(np.int64)
+            segment = Segment(
+                seq, doc_start, self._size,
+                _unpack_strings(arrays["vocab_data"], arrays["vocab_lengths"]),
+                counts,
+                _delta_decode(arrays["docs"], counts) + doc_start,
+                arrays["tfs"],
+                pos_counts,
+                _delta_decode(arrays["positions"], pos_counts)
+            )
+            self.segments.append(segment)
+        self._tail_start = self._size
+        self._seq = itertools.count(max(sequences, default=0) + 1)
+
+    # Queries
+    def _document_frequency(self, term: str) -> int:
+        tail = self._tail.get(term)
+        return sum(segment.document_frequency(term) for segment in self.segments) + (len(tail) if tail else 0)
+
+    def _tail_match(self, term: str, scope: Optional[np.ndarray]) -> List[Tuple[int, float, List[int]]]:
+        postings = self._tail.get(term)
+        if postings is None:
+            return []
+        if scope is None:
+            return postings
+        in_scope = set(scope[np.searchsorted(scope, self._tail_start):].tolist())
+        return [posting for posting in postings if posting[0] in in_scope]
+
+    def _postings(self, term: str, scope: Optional[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        """(documents, weighted term frequencies) of every posting of term in scope"""
+        docs, tfs = [], []
+        for segment in self.segments:
+            found = segment.match(term, scope)
+            if found is not None and len(found):
+                docs.append(segment.docs[found].astype(np.int64))
+                tfs.append(segment.tfs[found].astype(np.float64))
+        tail = self._tail_match(term, scope)
+        if tail:
+            docs.append(np.array([posting[0] for posting in tail], dtype=np.int64))
+            tfs.append(np.array([posting[1] for posting in tail], dtype=np.float64))
+        if not docs:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        return np.concatenate(docs), np.concatenate(tfs)
+
+    def _positions(self, term: str, scope: Optional[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        """(document, position) of every occurrence of term in scope"""
+        docs, positions = [], []
+        for segment in self.segments:
+            found = segment.match(term, scope)
+            if found is not None and len(found):
+                segment_docs, segment_positions = segment.positions_of(found)
+                docs.append(segment_docs)
+                positions.append(segment_positions)
+        tail = self._tail_match(term, scope)
+        if tail:
+            docs.append(np.array([posting[0] for posting in tail for _ in posting[2]], dtype=np.int64))
+            positions.append(np.array([p for posting in tail for p in posting[2]], dtype=np.int64))
+        if not docs:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        return np.concatenate(docs), np.concatenate(positions)
+
+    def _phrase_docs(self, phrase: List[str], scope: Optional[np.ndarray]) -> np.ndarray:
+        """Documents containing the tokens of phrase at consecutive positions of one field"""
+        # Rarest token first: its occurrences bound the candidates, and the
+        # other tokens are then only read for the documents still in the running
+        starts = None
+        for k in sorted(range(len(phrase)), key=lambda k: self._document_frequency(phrase[k])):
+            docs, positions = self._positions(phrase[k], scope)
+            # Where the phrase would have to start for this occurrence to be its k-th token.
+            # Postings come in document order with ascending positions, so keys are already sorted
+            fits = (positions & ((1 << POSITION_BITS) - 1)) >= k
+            keys = (docs[fits] << 32) | (positions[fits] - k)
+            if starts is None:
+                starts = keys
+            elif len(keys):
+                found = np.minimum(np.searchsorted(keys, starts), len(keys) - 1)
+                starts = starts[keys[found] == starts]
+            else:
+                starts = keys
+            if len(starts) == 0:
+                break
+            scope = np.unique(starts >> 32)
+        return np.unique(starts >> 32)
+
+    def search(self, query: str, patient: Optional[str] = None, limit: int = 20) -> Dict[str, Any]:
+        """
+        Rank records against a query with BM25 (weighted over the record fields)
+
+        Args:
+            query: Free text; "quoted phrases" must appear verbatim (ignoring
+                case and punctuation) in a single field
+            patient: Only search this patient's records
+            limit: Number of hits to return
+
+        Returns:
+            Dictionary with the total number of matching records and the best
+            hits as {record_id, score}, highest score first
+        """
+        start = time.perf_counter()
+        self.stats["queries"] += 1
+        phrases = [tokens for tokens in map(tokenize, PHRASE_PATTERN.findall(query)) if tokens]
+        terms = list(dict.fromkeys(tokenize(PHRASE_PATTERN.sub(' ', query)) + [t for p in phrases for t in p]))
+        empty = {"total": 0, "results": []}
+        if not terms or self.live_docs == 0:
+            return empty
+
+        scope = None
+        if patient is not None:
+            patient_id = self.patient_ids.get(patient)
+            if patient_id is None:
+                return empty
+            scope = np.array(self.patient_docs[patient_id], dtype=np.int64)
+
+        n = self.live_docs
+        average_length = self.live_length / n
+        doc_parts, score_parts = [], []
+        for term in terms:
+            df = self._document_frequency(term)
+            if df == 0:
+                continue
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            docs, tfs = self._postings(term, scope)
+            norm = K1 * (1 - B + B * self._length[docs] / average_length)
+            doc_parts.append(docs)
+            score_parts.append(idf * tfs * (K1 + 1) / (tfs + norm))
+        if not doc_parts:
+            return empty
+
+        all_docs = np.concatenate(doc_parts)
+        if scope is None and len(all_docs) > self._size // 16:
+            # Dense accumulation beats sorting when the query touches a large share of the index
+            totals = np.bincount(all_docs, weights=np.concatenate(score_parts), minlength=self._size)
+            docs = np.flatnonzero(totals)
+            scores = totals[docs]
+        else:
+            docs, inverse = np.unique(all_docs, return_inverse=True)
+            scores = np.bincount(inverse, weights=np.concatenate(score_parts))
+
+        keep = self._live[docs]
+        for phrase in phrases:
+            keep &= np.isin(docs, self._phrase_docs(phrase, scope))
+        docs, scores = docs[keep], scores[keep]
+
+        if len(docs) > limit:
+            best = np.argpartition(-scores, limit - 1)[:limit]
+        else:
+            best = np.arange(len(docs))
+        # Highest score first; newer records first on ties
+        best = best[np.lexsort((-docs[best], -scores[best]))]
+        self.stats["last_query_ms"] = round((time.perf_counter() - start) * 1000, 3)
+        return {
+            "total": int(len(docs)),
+            "results": [{"record_id": self.doc_records[doc], "score": round(float(score), 4)}
+                        for doc, score in zip(docs[best].tolist(), scores[best].tolist())]
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get index statistics"""
+        return {
+            "records_indexed": self.live_docs,
+            "documents": self._size,
+            "tail_documents": self._size - self._tail_start,
+            "segments": [{"seq": s.seq, "documents": s.doc_end - s.doc_start, "postings": s.postings}
+                         for s in self.segments],
+            "segment_bytes": sum(segment.nbytes for segment in self.segments),
+            "persisted": bool(self.directory),
+            **self.stats
+        }
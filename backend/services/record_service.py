@@ -0,0 +1,88 @@
+"""
+Record Service for MediSync Healthcare Platform
+Handles storage of patients' medical records (consultation notes, prescriptions, recommended tests)
+"""
+
+import secrets
+import time
+from typing import Dict, List, Optional, Any
+
+from services.persistence_service import PersistenceService
+from services.striped_locks import StripedLock
+
+RECORD_FIELDS = ("title", "description", "prescription", "tests_recommended", "notes", "doctorName", "fileUrl")
+
+
+class RecordService:
+    def __init__(self, persistence: Optional[PersistenceService] = None):
+        """Initialize record storage"""
+        # record id -> record
+        self.records: Dict[str, Dict[str, Any]] = {}
+        # patient id -> that patient's record ids; built from the store on first use, after any restore
+        self._by_patient: Optional[Dict[str, List[str]]] = None
+        self._locks = StripedLock()
+
+        self.persistence = persistence
+        if persistence is not None:
+            persistence.register("records", self.records)
+
+        print("✅ Record Service initialized")
+
+    def _patient_index(self) -> Dict[str, List[str]]:
+        if self._by_patient is None:
+            self._by_patient = {}
+            for record in sorted(self.records.values(), key=lambda r: r['created_at']):
+                self._by_patient.setdefault(record['patient_id'], []).append(record['id'])
+        return self._by_patient
+
+    def _persist(self, record_id: str):
+        if self.persistence is not None:
+            self.persistence.record("records", record_id)
+
+    def create_record(self, patient_id: str, data: Dict[str, Any], author_id: Optional[str] = None) -> Dict[str, Any]:
+        """Store a new record for a patient"""
+        now = time.time()
+        record = {
+            "id": f"record_{secrets.token_hex(8)}",
+            "patient_id": patient_id,
+            "date": data.get('date') or time.strftime('%Y-%m-%d'),
+            **{field: data.get(field) or '' for field in RECORD_FIELDS},
+            "author_id": author_id,
+            "created_at": now,
+            "updated_at": now,
+            "version": 1
+        }
+        self.records[record['id']] = record
+        self._patient_index().setdefault(patient_id, []).append(record['id'])
+        self._persist(record['id'])
+        print(f"📋 Record {record['id']} added for {patient_id}")
+        return dict(record)
+
+    def update_record(self, patient_id: str, record_id: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Update a record's fields and bump its version"""
+        with self._locks.for_key(record_id):
+            record = self.records.get(record_id)
+            if record is None or record['patient_id'] != patient_id:
+                raise Exception("Record not found")
+            record.update({field: data[field] for field in RECORD_FIELDS + ("date",) if data.get(field) is not None})
+            record['version'] += 1
+            record['updated_at'] = time.time()
+            self._persist(record_id)
+            return dict(record)
+
+    def get_record(self, record_id: str) -> Optional[Dict[str, Any]]:
+        record = self.records.get(record_id)
+        return dict(record) if record is not None else None
+
+    def get_patient_records(self, patient_id: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """A patient's records, newest first"""
+        record_ids = self._patient_index().get(patient_id, [])
+        newest = reversed(record_ids if limit is None else record_ids[-limit:])
+        return [dict(self.records[record_id]) for record_id in newest]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get service statistics"""
+        return {
+            "total_records": len(self.records),
+            "patients_with_records": len(self._patient_index())
+        }
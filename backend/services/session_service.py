@@ -0,0 +1,164 @@
+"""
+Session Service for MediSync Healthcare Platform
+Handles signed access tokens, refresh token rotation and revocation
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Any, Set
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+
+
+class SessionService:
+    def __init__(self, secret: Optional[str] = None, access_ttl: Optional[int] = None,
+                 refresh_ttl: Optional[int] = None, cache_size: int = 10000):
+        """Initialize session service with the token signing secret"""
+        secret = secret or os.getenv('SESSION_SECRET')
+        if not secret:
+            # Tokens will not survive a restart or work across workers without a shared secret
+            print("⚠️ SESSION_SECRET not set, using a random per-process secret")
+            secret = secrets.token_urlsafe(32)
+        self._key = secret.encode()
+
+        self.access_ttl = access_ttl or int(os.getenv('SESSION_ACCESS_TTL', '900'))  # 15 minutes
+        self.refresh_ttl = refresh_ttl or int(os.getenv('SESSION_REFRESH_TTL', '1209600'))  # 14 days
+
+        # Refresh tokens are opaque and stored by hash: {sha256: {sid, claims, exp, used}}
+        self.refresh_tokens: Dict[str, Dict[str, Any]] = {}
+        self.session_tokens: Dict[str, Set[str]] = {}
+        self._last_cleanup = time.time()
+        # Revoked session ids -> time after which no access token of the session can be valid
+        self.revoked_sessions: Dict[str, float] = {}
+
+        # Recently verified access tokens -> claims, skipping HMAC and JSON work on repeats
+        self.cache_size = cache_size
+        self._verified: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+
+        print("✅ Session Service initialized")
+
+    def _sign(self, payload: bytes) -> str:
+        return _b64encode(hmac.new(self._key, payload, hashlib.sha256).digest())
+
+    def _hash_refresh(self, token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def _issue_access(self, claims: Dict[str, Any], sid: str) -> str:
+        now = int(time.time())
+        payload = json.dumps(
+            {**claims, "sid": sid, "iat": now, "exp": now + self.access_ttl},
+            separators=(',', ':')
+        ).encode()
+        encoded = _b64encode(payload)
+        return f"{encoded}.{self._sign(encoded.encode())}"
+
+    def _issue_refresh(self, claims: Dict[str, Any], sid: str) -> str:
+        token = secrets.token_urlsafe(32)
+        key = self._hash_refresh(token)
+        self.session_tokens.setdefault(sid, set()).add(key)
+        self.refresh_tokens[key] = {
+            "sid": sid,
+            "claims": claims,
+            "exp": time.time() + self.refresh_ttl,
+            "used": False
+        }
+        return token
+
+    def _tokens(self, claims: Dict[str, Any], sid: str) -> Dict[str, Any]:
+        return {
+            "access_token": self._issue_access(claims, sid),
+            "refresh_token": self._issue_refresh(claims, sid),
+            "token_type": "bearer",
+            "expires_in": self.access_ttl
+        }
+
+    def create_session(self, user_data: Dict[str, Any], role: str) -> Dict[str, Any]:
+        """Start a session for a verified user and issue its first token pair"""
+        claims = {"sub": user_data['id'], "role": role, "phone": user_data['phone']}
+        return self._tokens(claims, secrets.token_hex(8))
+
+    def refresh(self, refresh_token: str) -> Dict[str, Any]:
+        """
+        Rotate a refresh token
+
+        Every refresh token is single-use. Presenting one that was already
+        used means it leaked, so the whole session is revoked.
+        """
+        self._cleanup_expired()
+        record = self.refresh_tokens.get(self._hash_refresh(refresh_token))
+        if record is None or record['exp'] < time.time():
+            raise Exception("Invalid or expired refresh token")
+        if record['used']:
+            self.revoke_session(record['sid'])
+            raise Exception("Refresh token reuse detected. Session revoked.")
+
+        record['used'] = True
+        return self._tokens(record['claims'], record['sid'])
+
+    def revoke_session(self, sid: str):
+        """Revoke every access and refresh token of a session"""
+        self.revoked_sessions[sid] = time.time() + self.access_ttl
+        for key in self.session_tokens.pop(sid, ()):
+            self.refresh_tokens.pop(key, None)
+
+    def verify(self, token: str) -> Optional[Dict[str, Any]]:
+        """Verify an access token without touching any user store; returns its claims or None"""
+        now = time.time()
+        claims = self._verified.get(token)
+        if claims is not None:
+            self._verified.move_to_end(token)
+        else:
+            encoded, _, signature = token.partition('.')
+            # Compare bytes: compare_digest rejects non-ASCII str with TypeError instead of a mismatch
+            expected = self._sign(encoded.encode('utf-8', 'surrogateescape')).encode()
+            if not signature or not hmac.compare_digest(signature.encode('utf-8', 'surrogateescape'), expected):
+                return None
+            try:
+                claims = json.loads(_b64decode(encoded))
+            except ValueError:
+                return None
+            self._verified[token] = claims
+            if len(self._verified) > self.cache_size:
+                self._verified.popitem(last=False)
+
+        if claims['exp'] <= now or claims['sid'] in self.revoked_sessions:
+            return None
+        return claims
+
+    def _cleanup_expired(self):
+        """Drop expired refresh tokens and revocations that can no longer matter (at most once a minute)"""
+        now = time.time()
+        if now - self._last_cleanup < 60:
+            return
+        self._last_cleanup = now
+
+        for sid in [sid for sid, until in self.revoked_sessions.items() if until < now]:
+            del self.revoked_sessions[sid]
+        for key in [key for key, record in self.refresh_tokens.items() if record['exp'] < now]:
+            sid = self.refresh_tokens.pop(key)['sid']
+            keys = self.session_tokens.get(sid)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.session_tokens[sid]
+
+    def get_stats(self) -> Dict[str, int]:
+        """Get service statistics"""
+        return {
+            "active_sessions": len(self.session_tokens),
+            "refresh_tokens": len(self.refresh_tokens),
+            "revoked_sessions": len(self.revoked_sessions),
+            "verified_cache_size": len(self._verified)
+        }
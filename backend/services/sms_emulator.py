@@ -0,0 +1,280 @@
+"""
+SMS Emulator for MediSync Healthcare Platform
+Handles offline SMS: a local copy of Twilio's Messages API with latency, error and throttling injection
+and captured message inspection
+"""
+
+import asyncio
+import base64
+import email.utils
+import json
+import math
+import os
+import random
+import re
+import secrets
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Any, Tuple
+from urllib.parse import parse_qsl
+
+MESSAGES_PATH = re.compile(r'^/2010-04-01/Accounts/([^/]+)/Messages(?:/([^/]+))?\.json$')
+E164_PATTERN = re.compile(r'^\+[1-9]\d{6,14}$')
+# Words that look like one-time codes: 4-12 letters or digits, at least one of them a digit
+CODE_PATTERN = re.compile(r'\b(?=[A-Za-z]*\d)[A-Za-z0-9]{4,12}\b')
+LATENCY_DISTRIBUTIONS = ("fixed", "uniform", "exponential", "lognormal")
+# Settings that can be changed while the emulator runs
+FAULT_SETTINGS = ("latency", "latency_distribution", "jitter", "spike_rate", "spike_latency",
+                  "error_rate", "throttle_rate", "max_rps")
+
+
+class SMSEmulator:
+    """
+    Pure ASGI app answering like Twilio's Messages API (create, fetch, list)
+
+    Requests get Twilio's status codes and error bodies (401 20003, 400
+    21211/21602/21603/21617, 429 20429 with Retry-After, 500 20500), so
+    TwilioProvider runs its real retry paths against it. Mount it
+    in-process through httpx.ASGITransport, or serve it on loopback with
+    ``python -m services.sms_emulator``. Every accepted message is kept,
+    up to capture_size, for tests to read back, with anything that looks
+    like a one-time code masked unless show_codes is on.
+    """
+
+    def __init__(self, latency: Optional[float] = None, latency_distribution: Optional[str] = None,
+                 jitter: Optional[float] = None, spike_rate: Optional[float] = None,
+                 spike_latency: Optional[float] = None, error_rate: Optional[float] = None,
+                 throttle_rate: Optional[float] = None, max_rps: Optional[float] = None,
+                 capture_size: Optional[int] = None, seed: Optional[int] = None,
+                 show_codes: Optional[bool] = None):
+        """Initialize the emulator; unset settings come from SMS_EMULATOR_* variables"""
+        self.latency = latency if latency is not None else float(os.getenv('SMS_EMULATOR_LATENCY', '0.05'))
+        self.latency_distribution = latency_distribution or os.getenv('SMS_EMULATOR_LATENCY_DISTRIBUTION', 'lognormal')
+        self.jitter = jitter if jitter is not None else float(os.getenv('SMS_EMULATOR_JITTER', '0.5'))
+        self.spike_rate = spike_rate if spike_rate is not None else float(os.getenv('SMS_EMULATOR_SPIKE_RATE', '0'))
+        self.spike_latency = spike_latency if spike_latency is not None else float(os.getenv('SMS_EMULATOR_SPIKE_LATENCY', '2'))
+        self.error_rate = error_rate if error_rate is not None else float(os.getenv('SMS_EMULATOR_ERROR_RATE', '0'))
+        self.throttle_rate = throttle_rate if throttle_rate is not None else float(os.getenv('SMS_EMULATOR_THROTTLE_RATE', '0'))
+        # Sustained messages per second before 429s, like an account's sending limit (0 = unlimited)
+        self.max_rps = max_rps if max_rps is not None else float(os.getenv('SMS_EMULATOR_MAX_RPS', '0'))
+        self.capture_size = capture_size or int(os.getenv('SMS_EMULATOR_CAPTURE_SIZE', '10000'))
+        # Captured bodies are readable by admins; keep OTPs in them only when debugging
+        self.show_codes = (show_codes if show_codes is not None
+                           else os.getenv('SMS_EMULATOR_SHOW_CODES', 'false').lower() in ('1', 'true', 'yes'))
+        self._validate()
+
+        self._random = random.Random(seed)
+        # Token bucket for max_rps, holding at most one second's worth
+        self._tokens = self.max_rps
+        self._refilled = time.monotonic()
+        # message sid -> message, oldest first
+        self.captured: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+        self.stats = {"requests": 0, "created": 0, "invalid": 0, "unauthorized": 0,
+                      "throttled": 0, "errors": 0, "evicted": 0}
+
+        print(f"✅ SMS Emulator initialized ({self.latency_distribution} latency {self.latency * 1000:.0f} ms, "
+              f"errors {self.error_rate:.0%}, throttling {self.throttle_rate:.0%})")
+        if self.show_codes:
+            print("⚠️ SMS Emulator keeps one-time codes readable in captured messages (SMS_EMULATOR_SHOW_CODES)")
+
+    def _validate(self):
+        if self.latency_distribution not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"Latency distribution must be one of {', '.join(LATENCY_DISTRIBUTIONS)}")
+        for name in ("error_rate", "throttle_rate", "spike_rate"):
+            if not 0 <= getattr(self, name) <= 1:
+                raise ValueError(f"{name} must be between 0 and 1")
+        for name in ("latency", "jitter", "spike_latency", "max_rps"):
+            if getattr(self, name) < 0:
+                raise ValueError(f"{name} must not be negative")
+
+    def configure(self, **settings) -> Dict[str, Any]:
+        """Change fault injection settings at runtime; returns the full configuration"""
+        unknown = set(settings) - set(FAULT_SETTINGS)
+        if unknown:
+            raise ValueError(f"Unknown emulator settings: {', '.join(sorted(unknown))}")
+        previous = self.get_config()
+        for name, value in settings.items():
+            setattr(self, name, value)
+        try:
+            self._validate()
+        except ValueError:
+            for name, value in previous.items():
+                setattr(self, name, value)
+            raise
+        if 'max_rps' in settings:
+            self._tokens = self.max_rps
+        return self.get_config()
+
+    def get_config(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in FAULT_SETTINGS}
+
+    def sample_latency(self) -> float:
+        """One response delay in seconds, drawn from the configured distribution"""
+        if self.spike_rate and self._random.random() < self.spike_rate:
+            return self.spike_latency
+        if self.latency_distribution == "uniform":
+            return self._random.uniform(0, 2 * self.latency)
+        if self.latency_distribution == "exponential":
+            return self._random.expovariate(1 / self.latency) if self.latency else 0.0
+        if self.latency_distribution == "lognormal":
+            # latency is the median
+            return self.latency * self._random.lognormvariate(0, self.jitter)
+        return self.latency
+
+    def _take_token(self) -> bool:
+        if not self.max_rps:
+            return True
+        now = time.monotonic()
+        self._tokens = min(self.max_rps, self._tokens + (now - self._refilled) * self.max_rps)
+        self._refilled = now
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+    # Inspection
+    def messages(self, to: Optional[str] = None, limit: int = 50) -> List[Dict[str, Any]]:
+        """Captured messages, newest first, optionally only those sent to one number"""
+        found = []
+        for sid in reversed(self.captured):
+            message = self.captured[sid]
+            if to is None or message['to'] == to:
+                found.append(dict(message))
+                if len(found) >= limit:
+                    break
+        return found
+
+    def last_message(self, to: str) -> Optional[Dict[str, Any]]:
+        found = self.messages(to, 1)
+        return found[0] if found else None
+
+    def clear(self) -> int:
+        """Forget every captured message; returns how many there were"""
+        count = len(self.captured)
+        self.captured.clear()
+        return count
+
+    # Twilio API
+    @staticmethod
+    def _error(status: int, code: int, message: str) -> Tuple[int, Dict[str, Any]]:
+        return status, {"code": code, "message": message,
+                        "more_info": f"https://www.twilio.com/docs/errors/{code}", "status": status}
+
+    async def create_message(self, account_sid: str, form: Dict[str, str]) -> Tuple[int, Dict[str, Any]]:
+        """Handle one message create request; returns (status, JSON body)"""
+        await asyncio.sleep(self.sample_latency())
+        if not self._take_token() or (self.throttle_rate and self._random.random() < self.throttle_rate):
+            self.stats["throttled"] += 1
+            return self._error(429, 20429, "Too Many Requests")
+        if self.error_rate and self._random.random() < self.error_rate:
+            self.stats["errors"] += 1
+            return self._error(500, 20500, "Internal Server Error")
+
+        to, sender, body = form.get('To', ''), form.get('From', ''), form.get('Body', '')
+        invalid = None
+        if not E164_PATTERN.match(to):
+            invalid = self._error(400, 21211, f"Invalid 'To' Phone Number: {to}")
+        elif not sender and not form.get('MessagingServiceSid'):
+            invalid = self._error(400, 21603, "A 'From' phone number is required.")
+        elif not body:
+            invalid = self._error(400, 21602, "Message body is required.")
+        elif len(body) > 1600:
+            invalid = self._error(400, 21617, "The concatenated message body exceeds the 1600 character limit.")
+        if invalid is not None:
+            self.stats["invalid"] += 1
+            return invalid
+
+        sid = f"SM{secrets.token_hex(16)}"
+        message = {
+            "sid": sid,
+            "account_sid": account_sid,
+            "to": to,
+            "from": sender or None,
+            "messaging_service_sid": form.get('MessagingServiceSid'),
+            "body": body if self.show_codes else CODE_PATTERN.sub(lambda m: "*" * len(m.group()), body),
+            "status": "queued",
+            "num_segments": str(max(1, math.ceil(len(body) / 160))),
+            "direction": "outbound-api",
+            "date_created": email.utils.formatdate(usegmt=True),
+            "error_code": None,
+            "error_message": None,
+            "price": None,
+            "uri": f"/2010-04-01/Accounts/{account_sid}/Messages/{sid}.json"
+        }
+        self.captured[sid] = message
+        while len(self.captured) > self.capture_size:
+            self.captured.popitem(last=False)
+            self.stats["evicted"] += 1
+        self.stats["created"] += 1
+        return 201, message
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return
+        self.stats["requests"] += 1
+        match = MESSAGES_PATH.match(scope["path"])
+        method = scope["method"]
+        if match is None or method not in ("GET", "POST") or (method == "POST" and match.group(2)):
+            await self._reply(send, *self._error(404, 20404, "The requested resource was not found"))
+            return
+
+        account_sid, message_sid = match.groups()
+        if not self._authorized(scope, account_sid):
+            self.stats["unauthorized"] += 1
+            await self._reply(send, *self._error(401, 20003, "Authenticate"))
+            return
+
+        if method == "POST":
+            chunks = []
+            while True:
+                message = await receive()
+                chunks.append(message.get("body", b""))
+                if not message.get("more_body", False):
+                    break
+            form = dict(parse_qsl(b"".join(chunks).decode(), keep_blank_values=True))
+            status, payload = await self.create_message(account_sid, form)
+            headers = {"Retry-After": "1"} if status == 429 else None
+            await self._reply(send, status, payload, headers)
+        elif message_sid:
+            message = self.captured.get(message_sid)
+            if message is None or message["account_sid"] != account_sid:
+                await self._reply(send, *self._error(404, 20404, f"Message {message_sid} was not found"))
+            else:
+                await self._reply(send, 200, message)
+        else:
+            query = dict(parse_qsl(scope.get("query_string", b"").decode()))
+            page_size = int(query['PageSize']) if query.get('PageSize', '').isdigit() else 50
+            found = [m for m in self.messages(query.get('To'), min(page_size, 1000)) if m["account_sid"] == account_sid]
+            await self._reply(send, 200, {"messages": found, "page_size": page_size})
+
+    @staticmethod
+    def _authorized(scope, account_sid: str) -> bool:
+        """Basic auth whose username is the account in the path (any auth token is accepted)"""
+        for name, value in scope["headers"]:
+            if name == b"authorization":
+                scheme, _, credentials = value.decode("latin-1").partition(" ")
+                if scheme.lower() != "basic":
+                    return False
+                try:
+                    username = base64.b64decode(credentials).decode().partition(":")[0]
+                except ValueError:
+                    return False
+                return username == account_sid
+        return False
+
+    @staticmethod
+    async def _reply(send, status: int, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None):
+        body = json.dumps(payload).encode()
+        raw_headers = [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+        raw_headers += [(name.lower().encode(), value.encode()) for name, value in (headers or {}).items()]
+        await send({"type": "http.response.start", "status": status, "headers": raw_headers})
+        await send({"type": "http.response.body", "body": body})
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get emulator statistics and the current fault settings"""
+        return {**self.stats, "captured": len(self.captured), "config": self.get_config()}
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(SMSEmulator(), host="127.0.0.1", port=int(os.getenv('SMS_EMULATOR_PORT', '8010')))
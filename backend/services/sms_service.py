@@ -0,0 +1,562 @@
+"""
+SMS Service for MediSync Healthcare Platform
+Handles SMS delivery through multiple providers with health scoring, hedging and failover
+"""
+
+import asyncio
+import itertools
+import math
+import os
+import random
+import time
+from collections import deque
+from typing import Dict, List, Optional, Any, Callable
+
+import httpx
+
+from services.sms_emulator import SMSEmulator
+
+
+class SMSProvider:
+    """One way of delivering an SMS. ``send`` returns the provider's message id or raises."""
+
+    name = "provider"
+
+    async def send(self, to: str, body: str) -> str:
+        raise NotImplementedError
+
+    async def close(self):
+        """Release pooled connections; called at shutdown"""
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401  (httpx's optional HTTP/2 support)
+        return True
+    except ImportError:
+        return False
+
+
+class TwilioProvider(SMSProvider):
+    """
+    Twilio Messages API over a pooled keep-alive httpx client
+
+    Replaces the SDK's blocking requests transport, which needed a thread per
+    in-flight send. Connections are reused across sends (multiplexed over
+    HTTP/2 when the h2 package is installed). Only failures where Twilio
+    cannot have accepted the message are retried: connect errors and 429/503
+    responses. A read timeout might mean the SMS went out, so it is not
+    retried, to avoid sending it twice.
+    """
+
+    name = "twilio"
+
+    def __init__(self, account_sid: str, auth_token: str, from_number: str,
+                 status_callback_url: Optional[str] = None, base_url: Optional[str] = None,
+                 max_connections: Optional[int] = None, max_keepalive: Optional[int] = None,
+                 timeout: Optional[float] = None, connect_timeout: Optional[float] = None,
+                 retries: Optional[int] = None, http2: Optional[bool] = None,
+                 transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.account_sid = account_sid
+        self.auth_token = auth_token
+        self.from_number = from_number
+        self.status_callback_url = status_callback_url
+        self.base_url = (base_url or os.getenv('TWILIO_API_BASE_URL', 'https://api.twilio.com')).rstrip('/')
+        self.limits = httpx.Limits(
+            max_connections=max_connections or int(os.getenv('SMS_HTTP_MAX_CONNECTIONS', '20')),
+            max_keepalive_connections=max_keepalive or int(os.getenv('SMS_HTTP_MAX_KEEPALIVE', '10')),
+            keepalive_expiry=30.0
+        )
+        self.timeout = httpx.Timeout(
+            timeout or float(os.getenv('SMS_HTTP_TIMEOUT', '8')),
+            connect=connect_timeout or float(os.getenv('SMS_HTTP_CONNECT_TIMEOUT', '3'))
+        )
+        self.retries = retries if retries is not None else int(os.getenv('SMS_HTTP_RETRIES', '2'))
+        self.retry_backoff = 0.1
+        if http2 is None:
+            http2 = os.getenv('SMS_HTTP2', 'true').lower() in ('1', 'true', 'yes')
+        self.http2 = http2 and _http2_available()
+        # None means real sockets; an ASGI transport serves requests in-process
+        self.transport = transport
+        self._path = f"/2010-04-01/Accounts/{account_sid}/Messages.json"
+        self._client: Optional[httpx.AsyncClient] = None
+        self._client_loop: Optional[asyncio.AbstractEventLoop] = None
+        self.stats = {"requests": 0, "retries": 0}
+
+    def _get_client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client_loop is not loop:
+            # Pooled connections belong to the event loop that opened them
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                auth=(self.account_sid, self.auth_token),
+                limits=self.limits,
+                timeout=self.timeout,
+                http2=self.http2,
+                transport=self.transport,
+                headers={"User-Agent": "MediSync/1.0"}
+            )
+            self._client_loop = loop
+        return self._client
+
+    async def send(self, to: str, body: str, timeout: Optional[float] = None) -> str:
+        data = {"To": to, "From": self.from_number, "Body": body}
+        if self.status_callback_url:
+            data["StatusCallback"] = self.status_callback_url
+        client = self._get_client()
+        request_timeout = httpx.USE_CLIENT_DEFAULT if timeout is None else timeout
+
+        for attempt in range(self.retries + 1):
+            delay = self.retry_backoff * 2 ** attempt
+            self.stats["requests"] += 1
+            try:
+                response = await client.post(self._path, data=data, timeout=request_timeout)
+            except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout) as e:
+                error = f"{type(e).__name__}: {e}"
+            else:
+                if response.status_code < 400:
+                    return response.json()["sid"]
+                try:
+                    detail = response.json()
+                except ValueError:
+                    detail = {}
+                error = f"Twilio error {detail.get('code', response.status_code)}: {detail.get('message', response.text[:200])}"
+                if response.status_code not in (429, 503):
+                    raise Exception(error)
+                retry_after = response.headers.get("Retry-After", "")
+                if retry_after.isdigit():
+                    delay = max(delay, float(retry_after))
+            if attempt == self.retries:
+                break
+            self.stats["retries"] += 1
+            # Full jitter keeps retries from many concurrent sends from arriving in lockstep
+            await asyncio.sleep(random.uniform(0, delay))
+        raise Exception(f"Twilio request failed after {self.retries + 1} attempts: {error}")
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class EmulatorProvider(TwilioProvider):
+    """
+    TwilioProvider talking to an in-process SMSEmulator instead of api.twilio.com
+
+    The same client code runs as in production (form encoding, auth,
+    retries on 429/503); only the socket is swapped for httpx's ASGI
+    transport. Any phone number works and nothing leaves the machine.
+    """
+
+    name = "emulator"
+
+    def __init__(self, emulator: Optional[SMSEmulator] = None, **kwargs):
+        self.emulator = emulator or SMSEmulator()
+        super().__init__("AC" + "0" * 32, "emulator", os.getenv('TWILIO_PHONE_NUMBER') or "+15005550006",
+                         base_url="http://sms-emulator", transport=httpx.ASGITransport(app=self.emulator), **kwargs)
+
+
+class ConsoleProvider(SMSProvider):
+    """Local stand-in that prints messages instead of sending them (development only)"""
+
+    name = "console"
+
+    def __init__(self):
+        self._ids = itertools.count(1)
+
+    async def send(self, to: str, body: str) -> str:
+        print(f"📨 [console SMS] to {to}: {body}")
+        return f"console_{next(self._ids)}"
+
+
+class SimulatedProvider(SMSProvider):
+    """Local stand-in with configurable latency and failures, for tests and benchmarks"""
+
+    def __init__(self, name: str, latency: float = 0.05, jitter: float = 0.5,
+                 error_rate: float = 0.0, spike_rate: float = 0.0, spike_latency: float = 2.0):
+        self.name = name
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.spike_rate = spike_rate
+        self.spike_latency = spike_latency
+        self._ids = itertools.count(1)
+
+    async def send(self, to: str, body: str) -> str:
+        delay = self.spike_latency if random.random() < self.spike_rate else self.latency
+        await asyncio.sleep(delay * random.lognormvariate(0, self.jitter))
+        if random.random() < self.error_rate:
+            raise Exception(f"{self.name} rejected the message")
+        return f"{self.name}_{next(self._ids)}"
+
+
+class SMSUnavailableError(Exception):
+    """SMS delivery was refused without waiting on a provider; carries the HTTP status and Retry-After"""
+
+    def __init__(self, message: str, status_code: int, retry_after: float):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class CircuitBreaker:
+    """
+    Per-provider circuit breaker
+
+    closed: calls go through; ``failure_threshold`` consecutive failures open it.
+    open: calls are refused until ``cooldown`` seconds have passed.
+    half_open: a single probe call is let through; success closes the
+    circuit, failure opens it again for another cooldown.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = 5, cooldown: float = 30.0,
+                 on_transition: Optional[Callable[[str, str, str], None]] = None):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.on_transition = on_transition
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+
+    def _transition(self, state: str):
+        previous, self.state = self.state, state
+        if state == self.OPEN:
+            self.opened_at = time.monotonic()
+        if self.on_transition:
+            self.on_transition(self.name, previous, state)
+
+    def allow(self) -> bool:
+        """Whether a call may go out now (in half-open, reserves the single probe)"""
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.cooldown:
+                return False
+            self._transition(self.HALF_OPEN)
+        if self.probe_in_flight:
+            return False
+        self.probe_in_flight = True
+        return True
+
+    def record_success(self):
+        self.failures = 0
+        if self.state == self.HALF_OPEN:
+            self.probe_in_flight = False
+            self._transition(self.CLOSED)
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN:
+            self.probe_in_flight = False
+            self._transition(self.OPEN)
+        elif self.state == self.CLOSED and self.failures >= self.failure_threshold:
+            self._transition(self.OPEN)
+
+    def record_cancelled(self):
+        # A probe that lost a hedge race proved nothing; let the next call probe
+        if self.state == self.HALF_OPEN:
+            self.probe_in_flight = False
+
+    def retry_after(self) -> float:
+        """Seconds until this circuit will accept a probe"""
+        if self.state != self.OPEN:
+            return 0.0
+        return max(0.0, self.cooldown - (time.monotonic() - self.opened_at))
+
+
+class ProviderHealth:
+    """Rolling latency and error statistics for one provider"""
+
+    def __init__(self, provider: SMSProvider, breaker: CircuitBreaker,
+                 window: int = 200, recovery_half_life: float = 30.0):
+        self.provider = provider
+        self.name = provider.name
+        self.breaker = breaker
+        self.latencies: deque = deque(maxlen=window)
+        self.ewma_latency: Optional[float] = None
+        # Attempts cancelled by a winning hedge have no outcome, only a lower bound on their
+        # latency: the largest since the last real outcome, kept out of the statistics above
+        self.censored_latency: Optional[float] = None
+        self.ewma_error = 0.0
+        self.recovery_half_life = recovery_half_life
+        self.last_update = 0.0
+        self.stats = {"attempts": 0, "sent": 0, "failed": 0, "cancelled": 0}
+
+    def observe(self, latency: float, ok: bool):
+        self.latencies.append(latency)
+        self.ewma_latency = latency if self.ewma_latency is None else 0.8 * self.ewma_latency + 0.2 * latency
+        self.ewma_error = 0.9 * self.ewma_error + (0.0 if ok else 0.1)
+        self.censored_latency = None
+        self.last_update = time.monotonic()
+
+    def observe_cancelled(self, elapsed: float):
+        """Note an attempt that lost a hedge race: neither a latency sample nor a success or failure"""
+        self.censored_latency = elapsed if self.censored_latency is None else max(self.censored_latency, elapsed)
+        self.last_update = time.monotonic()
+
+    @property
+    def expected_latency(self) -> Optional[float]:
+        # A provider that keeps losing hedge races is at least as slow as it was when cancelled
+        known = [latency for latency in (self.ewma_latency, self.censored_latency) if latency is not None]
+        return max(known) if known else None
+
+    def p95(self, min_samples: int = 20) -> Optional[float]:
+        if len(self.latencies) < min_samples:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[int(len(ordered) * 0.95)]
+
+    def score(self) -> float:
+        """Expected cost of routing to this provider; lower is better"""
+        latency = self.expected_latency
+        if latency is None:
+            return 0.0
+        # A provider that stopped getting traffic slowly earns back trust and is probed again
+        idle = time.monotonic() - self.last_update
+        return latency * (1 + 10 * self.ewma_error) * 0.5 ** (idle / self.recovery_half_life)
+
+    def snapshot(self) -> Dict[str, Any]:
+        p95 = self.p95(min_samples=1)
+        return {
+            "name": self.name,
+            "circuit": self.breaker.state,
+            **self.stats,
+            "ewma_latency_ms": round(self.ewma_latency * 1000, 3) if self.ewma_latency is not None else None,
+            "censored_latency_ms": round(self.censored_latency * 1000, 3) if self.censored_latency is not None else None,
+            "p95_ms": round(p95 * 1000, 3) if p95 is not None else None,
+            "error_rate": round(self.ewma_error, 4),
+            "score": round(self.score(), 6)
+        }
+
+
+class SMSRouter:
+    """
+    Route each SMS to the healthiest provider
+
+    If the primary has not answered within its observed p95 (capped by the
+    hedge budget), the same message is also sent through the next provider
+    and the first success wins. A failed attempt fails over to the next
+    provider immediately. Hedging can deliver the same OTP twice when both
+    providers answer; that is the price of not waiting on a slow one.
+
+    Admission control keeps a provider outage from piling up requests:
+    providers with an open circuit are skipped, at most ``max_in_flight``
+    provider calls run at once, and once ``max_queue`` sends are waiting
+    for a slot new sends are refused immediately with SMSUnavailableError.
+    """
+
+    def __init__(self, providers: List[SMSProvider], hedge_budget: Optional[float] = None,
+                 timeout: Optional[float] = None, hedge: bool = True,
+                 max_in_flight: Optional[int] = None, max_queue: Optional[int] = None,
+                 queue_timeout: Optional[float] = None, failure_threshold: Optional[int] = None,
+                 breaker_cooldown: Optional[float] = None):
+        if not providers:
+            raise ValueError("At least one SMS provider is required")
+        self.hedge_budget = hedge_budget or int(os.getenv('SMS_HEDGE_BUDGET_MS', '1000')) / 1000
+        self.timeout = timeout or float(os.getenv('SMS_PROVIDER_TIMEOUT', '10'))
+        self.hedge = hedge
+        self.max_in_flight = max_in_flight or int(os.getenv('SMS_MAX_IN_FLIGHT', '50'))
+        self.max_queue = max_queue if max_queue is not None else int(os.getenv('SMS_MAX_QUEUE', '100'))
+        self.queue_timeout = queue_timeout or float(os.getenv('SMS_QUEUE_TIMEOUT', '2'))
+        failure_threshold = failure_threshold or int(os.getenv('SMS_BREAKER_FAILURES', '5'))
+        breaker_cooldown = breaker_cooldown or float(os.getenv('SMS_BREAKER_COOLDOWN', '30'))
+
+        self.providers = [
+            ProviderHealth(p, CircuitBreaker(p.name, failure_threshold, breaker_cooldown, self._on_transition))
+            for p in providers
+        ]
+        self._slots = asyncio.Semaphore(self.max_in_flight)
+        self.in_flight = 0
+        self.waiting = 0
+        self.stats = {
+            "messages": 0, "hedged": 0, "failovers": 0, "failed": 0,
+            "rejected_queue_full": 0, "rejected_queue_timeout": 0, "rejected_circuit_open": 0
+        }
+        self.transitions: Dict[str, int] = {}
+        self.transition_log: deque = deque(maxlen=50)
+
+    def _on_transition(self, name: str, previous: str, state: str):
+        key = f"{previous}->{state}"
+        self.transitions[key] = self.transitions.get(key, 0) + 1
+        self.transition_log.append({"provider": name, "from": previous, "to": state, "at": time.time()})
+        print(f"⚡ SMS circuit for {name}: {previous} -> {state}")
+
+    def ranked(self) -> List[ProviderHealth]:
+        # Untried providers are assumed to answer within the hedge budget; ties keep configured order
+        order = {id(p): i for i, p in enumerate(self.providers)}
+        return sorted(self.providers, key=lambda p: (
+            p.score() if p.expected_latency is not None else self.hedge_budget, order[id(p)]
+        ))
+
+    def hedge_delay(self, primary: ProviderHealth) -> float:
+        p95 = primary.p95()
+        return self.hedge_budget if p95 is None else min(p95, self.hedge_budget)
+
+    def _circuit_retry_after(self) -> float:
+        return min(p.breaker.retry_after() for p in self.providers) or 1.0
+
+    async def _acquire_slot(self):
+        """Wait for an in-flight slot, refusing fast when the queue is saturated"""
+        if self._slots.locked():
+            if self.waiting >= self.max_queue:
+                self.stats["rejected_queue_full"] += 1
+                raise SMSUnavailableError("Too many OTP requests in progress. Please try again shortly.", 429, 1)
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                self.stats["rejected_queue_timeout"] += 1
+                raise SMSUnavailableError("SMS delivery is overloaded. Please try again shortly.", 503,
+                                          self.queue_timeout)
+            finally:
+                self.waiting -= 1
+        else:
+            await self._slots.acquire()
+        self.in_flight += 1
+
+    async def _attempt(self, health: ProviderHealth, to: str, body: str) -> str:
+        health.stats["attempts"] += 1
+        start = time.monotonic()
+        try:
+            message_id = await asyncio.wait_for(health.provider.send(to, body), self.timeout)
+        except asyncio.CancelledError:
+            # Lost a hedge race: the elapsed time is only a lower bound on its latency
+            health.stats["cancelled"] += 1
+            health.observe_cancelled(time.monotonic() - start)
+            health.breaker.record_cancelled()
+            raise
+        except Exception:
+            health.stats["failed"] += 1
+            health.observe(time.monotonic() - start, ok=False)
+            health.breaker.record_failure()
+            raise
+        finally:
+            self.in_flight -= 1
+            self._slots.release()
+        health.stats["sent"] += 1
+        health.observe(time.monotonic() - start, ok=True)
+        health.breaker.record_success()
+        return message_id
+
+    async def send(self, to: str, body: str) -> Dict[str, Any]:
+        """Send one SMS; returns the provider and message id that delivered it"""
+        self.stats["messages"] += 1
+        ranked = self.ranked()
+        pending: Dict[asyncio.Task, ProviderHealth] = {}
+        errors: List[str] = []
+        next_index = 0
+        hedged = False
+
+        def launch() -> bool:
+            # Caller holds an in-flight slot, which the attempt releases
+            nonlocal next_index
+            while next_index < len(ranked):
+                health = ranked[next_index]
+                next_index += 1
+                if health.breaker.allow():
+                    pending[asyncio.ensure_future(self._attempt(health, to, body))] = health
+                    return True
+            self.in_flight -= 1
+            self._slots.release()
+            return False
+
+        await self._acquire_slot()
+        if not launch():
+            self.stats["rejected_circuit_open"] += 1
+            raise SMSUnavailableError("SMS delivery is temporarily unavailable. Please try again later.", 503,
+                                      self._circuit_retry_after())
+        started = time.monotonic()
+        delay = self.hedge_delay(pending[next(iter(pending))])
+
+        try:
+            while pending:
+                wait = None
+                if self.hedge and not hedged and next_index < len(ranked):
+                    wait = max(0.0, delay - (time.monotonic() - started))
+                done, _ = await asyncio.wait(pending, timeout=wait, return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    hedged = True
+                    # Hedges are optional work: only take a free slot, never queue for one
+                    if not self._slots.locked():
+                        await self._acquire_slot()
+                        if launch():
+                            self.stats["hedged"] += 1
+                    continue
+
+                for task in done:
+                    health = pending.pop(task)
+                    try:
+                        message_id = task.result()
+                    except Exception as e:
+                        errors.append(f"{health.name}: {e}")
+                        continue
+                    return {"provider": health.name, "message_id": message_id, "hedged": hedged}
+
+                if not pending and next_index < len(ranked):
+                    await self._acquire_slot()
+                    if launch():
+                        self.stats["failovers"] += 1
+        finally:
+            for task in pending:
+                task.cancel()
+
+        self.stats["failed"] += 1
+        raise SMSUnavailableError("All SMS providers failed: " + "; ".join(errors), 503,
+                                  self._circuit_retry_after())
+
+    async def close(self):
+        """Close every provider's pooled connections"""
+        for health in self.providers:
+            await health.provider.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get router, admission and per-provider circuit statistics"""
+        return {
+            **self.stats,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "circuit_transitions": dict(self.transitions),
+            "recent_transitions": list(self.transition_log),
+            "providers": [p.snapshot() for p in self.ranked()]
+        }
+
+
+def build_providers_from_env() -> List[SMSProvider]:
+    """
+    Providers named in SMS_PROVIDERS (comma separated, in priority order)
+
+    Defaults to "twilio". The local emulator is only used when named
+    explicitly (SMS_PROVIDERS=emulator): it delivers nothing and keeps
+    sent messages for admins to read, so it must never be a silent fallback.
+    """
+    configured = os.getenv('SMS_PROVIDERS', 'twilio')
+    providers: List[SMSProvider] = []
+    for name in configured.split(','):
+        name = name.strip().lower()
+        if name == 'twilio':
+            account_sid = os.getenv('TWILIO_ACCOUNT_SID')
+            auth_token = os.getenv('TWILIO_AUTH_TOKEN')
+            from_number = os.getenv('TWILIO_PHONE_NUMBER')
+            if not all([account_sid, auth_token, from_number]):
+                raise ValueError("Twilio credentials not properly configured "
+                                 "(for local development set SMS_PROVIDERS=emulator)")
+            providers.append(TwilioProvider(account_sid, auth_token, from_number,
+                                            os.getenv('TWILIO_STATUS_CALLBACK_URL')))
+        elif name == 'emulator':
+            print("⚠️ " + "=" * 70)
+            print("⚠️ SMS_PROVIDERS includes the local emulator: OTP SMS are NOT delivered to phones.")
+            print("⚠️ Never enable it in production.")
+            print("⚠️ " + "=" * 70)
+            providers.append(EmulatorProvider())
+        elif name == 'console':
+            providers.append(ConsoleProvider())
+        elif name:
+            raise ValueError(f"Unknown SMS provider: {name}")
+    return providers
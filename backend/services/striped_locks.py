@@ -0,0 +1,33 @@
+"""
+Striped Locks for MediSync Healthcare Platform
+Handles per-key mutual exclusion for check-then-act updates on the in-memory stores
+"""
+
+import threading
+from typing import Hashable
+
+
+class StripedLock:
+    """
+    A fixed array of locks, one picked per key by hash
+
+    Operations on the same key always take the same lock, so a read, compare
+    and consume on one phone number is atomic. Unrelated keys usually land
+    on different stripes and do not wait for each other, unlike with a single
+    global lock. The locks are plain threading locks: they stay correct with
+    worker threads and on free-threaded Python. They are only held for short,
+    non-awaiting critical sections, so taking one on the event loop is safe.
+    """
+
+    def __init__(self, stripes: int = 64):
+        if stripes <= 0 or stripes & (stripes - 1):
+            raise ValueError("Stripe count must be a power of two")
+        self._mask = stripes - 1
+        self._locks = [threading.Lock() for _ in range(stripes)]
+
+    def __len__(self) -> int:
+        return len(self._locks)
+
+    def for_key(self, key: Hashable) -> threading.Lock:
+        """The lock guarding key; use as ``with locks.for_key(phone): ...``"""
+        return self._locks[hash(key) & self._mask]
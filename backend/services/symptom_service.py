@@ -0,0 +1,190 @@
+"""
+Symptom Service for MediSync Healthcare Platform
+Handles AI symptom-checker triage using a compiled multi-pattern matcher
+"""
+
+import json
+import os
+import re
+from collections import deque
+from functools import lru_cache
+from typing import Dict, List, Optional, Any, Iterable, Tuple
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+APOSTROPHES = re.compile(r"['’]")
+
+DEFAULT_RESPONSE = (
+    "I understand you're concerned about your health. While I can provide general information, "
+    "it's important to consult with a healthcare professional for proper diagnosis and treatment. "
+    "Would you like me to help you find nearby medical facilities?"
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase text, drop apostrophes and split into alphanumeric tokens"""
+    return TOKEN_PATTERN.findall(APOSTROPHES.sub('', text.lower()))
+
+
+class SymptomMatcher:
+    """Aho-Corasick automaton over token sequences.
+
+    Patterns are matched on whole tokens, so "ache" never fires inside
+    "headache", and every occurrence of every pattern is found in a single
+    left-to-right pass over the message.
+    """
+
+    def __init__(self, patterns: Iterable[Tuple[str, ...]]):
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.output: List[Tuple[int, ...]] = [()]
+        self.lengths: List[int] = []
+
+        for pattern_id, tokens in enumerate(patterns):
+            state = 0
+            for token in tokens:
+                nxt = self.goto[state].get(token)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto[state][token] = nxt
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append(())
+                state = nxt
+            self.output[state] += (pattern_id,)
+            self.lengths.append(len(tokens))
+
+        self.vocabulary = frozenset(token for edges in self.goto for token in edges)
+        self._build_failure_links()
+
+    def _build_failure_links(self):
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for token, nxt in self.goto[state].items():
+                queue.append(nxt)
+                fallback = self.fail[state]
+                while fallback and token not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                target = self.goto[fallback].get(token, 0)
+                self.fail[nxt] = target if target != nxt else 0
+                self.output[nxt] += self.output[self.fail[nxt]]
+
+    def find_all(self, tokens: List[str]) -> List[Tuple[int, int]]:
+        """Return (pattern_id, start_token_index) for every match in tokens"""
+        goto, fail, output, vocabulary = self.goto, self.fail, self.output, self.vocabulary
+        matches = []
+        state = 0
+        for position, token in enumerate(tokens):
+            if token not in vocabulary:
+                state = 0
+                continue
+            while state and token not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(token, 0)
+            for pattern_id in output[state]:
+                matches.append((pattern_id, position - self.lengths[pattern_id] + 1))
+        return matches
+
+
+class SymptomService:
+    def __init__(self, lexicon_path: Optional[str] = None, cache_size: Optional[int] = None):
+        """Initialize symptom service and compile the symptom lexicon"""
+        default_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'symptom_lexicon.json')
+        self.lexicon_path = lexicon_path or os.getenv('SYMPTOM_LEXICON_PATH', default_path)
+        self.cache_size = cache_size or int(os.getenv('SYMPTOM_CACHE_SIZE', '4096'))
+
+        with open(self.lexicon_path, encoding='utf-8') as f:
+            self.load_lexicon(json.load(f))
+
+        print(f"✅ Symptom Service initialized ({len(self.terms)} terms)")
+
+    def load_lexicon(self, entries: List[Dict[str, Any]]):
+        """Compile lexicon entries ({symptom, synonyms, severity, advice}) into a matcher"""
+        self.symptoms: List[Dict[str, Any]] = []
+        terms: Dict[Tuple[str, ...], int] = {}
+
+        for entry in entries:
+            symptom_id = len(self.symptoms)
+            self.symptoms.append({
+                "symptom": entry['symptom'],
+                "severity": int(entry.get('severity', 1)),
+                "advice": entry.get('advice', DEFAULT_RESPONSE)
+            })
+            for term in [entry['symptom'], *entry.get('synonyms', [])]:
+                tokens = tuple(tokenize(term))
+                if tokens:
+                    terms.setdefault(tokens, symptom_id)
+
+        self.terms = list(terms)
+        self.term_symptoms = [terms[t] for t in self.terms]
+        self.matcher = SymptomMatcher(self.terms)
+
+        # A fresh cache per compiled lexicon, keyed by the normalized message
+        self._match_cached = lru_cache(maxsize=self.cache_size)(self._match)
+
+    def _match(self, normalized: str) -> Tuple[Tuple[int, Tuple[str, ...]], ...]:
+        """Return (symptom_id, matched_terms) pairs ranked by severity, then position"""
+        first_seen: Dict[int, int] = {}
+        matched_terms: Dict[int, List[str]] = {}
+        for pattern_id, start in self.matcher.find_all(normalized.split(' ')):
+            symptom_id = self.term_symptoms[pattern_id]
+            term = ' '.join(self.terms[pattern_id])
+            if symptom_id not in first_seen:
+                first_seen[symptom_id] = start
+                matched_terms[symptom_id] = []
+            if term not in matched_terms[symptom_id]:
+                matched_terms[symptom_id].append(term)
+
+        ranked = sorted(first_seen, key=lambda s: (-self.symptoms[s]['severity'], first_seen[s]))
+        return tuple((s, tuple(matched_terms[s])) for s in ranked)
+
+    def triage_level(self, severity: int) -> str:
+        """Map the highest matched severity to a triage level"""
+        if severity >= 5:
+            return "emergency"
+        if severity >= 3:
+            return "consult_doctor"
+        if severity >= 1:
+            return "self_care"
+        return "unknown"
+
+    def check_symptoms(self, message: str) -> Dict[str, Any]:
+        """
+        Match every known symptom in a message and rank them by severity
+
+        Args:
+            message: Free-text message from the patient
+
+        Returns:
+            Dictionary with the advice for the most severe symptom, the
+            triage level and all matched symptoms
+        """
+        ranked = self._match_cached(' '.join(tokenize(message)))
+
+        matches = [
+            {
+                "symptom": self.symptoms[symptom_id]['symptom'],
+                "severity": self.symptoms[symptom_id]['severity'],
+                "matched_terms": list(terms)
+            }
+            for symptom_id, terms in ranked
+        ]
+        top_severity = matches[0]['severity'] if matches else 0
+
+        return {
+            "response": self.symptoms[ranked[0][0]]['advice'] if ranked else DEFAULT_RESPONSE,
+            "triage_level": self.triage_level(top_severity),
+            "matches": matches
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get service statistics"""
+        info = self._match_cached.cache_info()
+        return {
+            "symptoms": len(self.symptoms),
+            "terms": len(self.terms),
+            "cache_hits": info.hits,
+            "cache_misses": info.misses,
+            "cache_size": info.currsize,
+            "cache_max_size": info.maxsize
+        }
@@ -0,0 +1,259 @@
+"""
+Timing Service for MediSync Healthcare Platform
+Handles per-request stage timing, Server-Timing headers and on-demand profiling
+"""
+
+import contextlib
+import cProfile
+import functools
+import inspect
+import os
+import pstats
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Any, Callable
+
+from fastapi.routing import APIRoute
+
+_current_trace: ContextVar[Optional['RequestTrace']] = ContextVar('request_trace', default=None)
+_NO_SPAN = contextlib.nullcontext()
+
+
+class RequestTrace:
+    """Stage durations of one request, in the order the stages finished"""
+
+    __slots__ = ('stages',)
+
+    def __init__(self):
+        self.stages: List[tuple] = []
+
+
+class _Span:
+    __slots__ = ('trace', 'name', 'start')
+
+    def __init__(self, trace: RequestTrace, name: str):
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.trace.stages.append((self.name, (time.perf_counter() - self.start) * 1000))
+
+
+def span(name: str):
+    """Time a block as a named stage of the current request.
+
+    When timing is off there is no current trace and this returns a shared
+    no-op context manager, so instrumented code costs one ContextVar read.
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        return _NO_SPAN
+    return _Span(trace, name)
+
+
+def _timed_endpoint(endpoint: Callable) -> Callable:
+    # functools.wraps keeps the signature FastAPI inspects for parameters
+    if inspect.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def timed(*args, **kwargs):
+            with span("endpoint"):
+                return await endpoint(*args, **kwargs)
+    else:
+        @functools.wraps(endpoint)
+        def timed(*args, **kwargs):
+            with span("endpoint"):
+                return endpoint(*args, **kwargs)
+    return timed
+
+
+class TimedRoute(APIRoute):
+    """Route class splitting request time into FastAPI's own work (parsing,
+    validation, serialization) and the endpoint body"""
+
+    def __init__(self, path: str, endpoint: Callable, **kwargs):
+        super().__init__(path, _timed_endpoint(endpoint), **kwargs)
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+
+        async def timed_handler(request):
+            trace = _current_trace.get()
+            if trace is None:
+                return await handler(request)
+            start = time.perf_counter()
+            try:
+                return await handler(request)
+            finally:
+                total = (time.perf_counter() - start) * 1000
+                endpoint = sum(ms for name, ms in trace.stages if name == "endpoint")
+                trace.stages.append(("fastapi", total - endpoint))
+
+        return timed_handler
+
+
+class TimingService:
+    def __init__(self, enabled: Optional[bool] = None, buffer_size: Optional[int] = None):
+        """Initialize timing service with a ring buffer of recent request timings"""
+        if enabled is None:
+            enabled = os.getenv('REQUEST_TIMING', 'false').lower() in ('1', 'true', 'yes')
+        self.enabled = enabled
+        self.recent: deque = deque(maxlen=buffer_size or int(os.getenv('REQUEST_TIMING_BUFFER', '1000')))
+
+        # Profiling window: armed -> running -> complete
+        self.profile_status = "idle"
+        self.profile_target = 0
+        self.profile_completed = 0
+        self.profile_result: Optional[Dict[str, Any]] = None
+        self._profiler: Optional[cProfile.Profile] = None
+        self._profile_started_at = 0.0
+        self._profile_options: Dict[str, Any] = {}
+
+        print(f"✅ Timing Service initialized ({'enabled' if enabled else 'disabled'})")
+
+    @property
+    def active(self) -> bool:
+        return self.enabled or self.profile_status in ("armed", "running")
+
+    def record(self, method: str, path: str, status: int, total_ms: float, trace: RequestTrace):
+        self.recent.append({
+            "method": method,
+            "path": path,
+            "status": status,
+            "total_ms": round(total_ms, 3),
+            "stages": {name: round(ms, 3) for name, ms in trace.stages},
+            "at": time.time()
+        })
+
+    def server_timing_header(self, total_ms: float, trace: RequestTrace) -> str:
+        parts = [f"{name};dur={ms:.3f}" for name, ms in trace.stages]
+        parts.append(f"total;dur={total_ms:.3f}")
+        return ", ".join(parts)
+
+    def get_timings(self, path: Optional[str] = None, limit: int = 50) -> Dict[str, Any]:
+        """Recent request timings plus per-stage p50/p95 over the whole buffer"""
+        entries = [e for e in self.recent if path is None or e['path'] == path]
+        samples: Dict[str, List[float]] = {}
+        for entry in entries:
+            samples.setdefault("total", []).append(entry['total_ms'])
+            for name, ms in entry['stages'].items():
+                samples.setdefault(name, []).append(ms)
+
+        summary = {}
+        for name, values in samples.items():
+            values.sort()
+            summary[name] = {
+                "count": len(values),
+                "p50_ms": values[len(values) // 2],
+                "p95_ms": values[min(len(values) - 1, int(len(values) * 0.95))]
+            }
+        return {"enabled": self.enabled, "summary": summary, "recent": entries[-limit:]}
+
+    def arm_profiler(self, requests: int, sort: str = "cumulative", limit: int = 30):
+        """Profile the next N requests with cProfile"""
+        if self.profile_status in ("armed", "running"):
+            raise Exception("A profiling window is already in progress")
+        self.profile_status = "armed"
+        self.profile_target = requests
+        self.profile_completed = 0
+        self.profile_result = None
+        self._profile_options = {"sort": sort, "limit": limit}
+        print(f"🔬 Profiling the next {requests} requests")
+
+    def _profile_request_started(self):
+        if self.profile_status != "armed":
+            return
+        self._profiler = cProfile.Profile()
+        try:
+            self._profiler.enable()
+        except ValueError as e:
+            # Another profiler (e.g. a debugger) already owns the hook
+            self.profile_status = "complete"
+            self.profile_result = {"error": str(e)}
+            self._profiler = None
+            return
+        self.profile_status = "running"
+        self._profile_started_at = time.perf_counter()
+
+    def _profile_request_finished(self):
+        if self.profile_status != "running":
+            return
+        self.profile_completed += 1
+        if self.profile_completed >= self.profile_target:
+            self._profiler.disable()
+            self.profile_result = self._summarize(self._profiler, time.perf_counter() - self._profile_started_at)
+            self._profiler = None
+            self.profile_status = "complete"
+            print(f"🔬 Profiling complete ({self.profile_completed} requests)")
+
+    def _summarize(self, profiler: cProfile.Profile, wall_seconds: float) -> Dict[str, Any]:
+        stats = pstats.Stats(profiler).stats
+        key = {"cumulative": 3, "tottime": 2, "ncalls": 1}[self._profile_options["sort"]]
+        rows = sorted(stats.items(), key=lambda item: item[1][key], reverse=True)
+        return {
+            "requests": self.profile_completed,
+            "wall_ms": round(wall_seconds * 1000, 3),
+            "functions": [
+                {
+                    "function": f"{os.path.basename(filename)}:{line}({name})",
+                    "ncalls": ncalls,
+                    "tottime_ms": round(tottime * 1000, 3),
+                    "cumtime_ms": round(cumtime * 1000, 3)
+                }
+                for (filename, line, name), (_, ncalls, tottime, cumtime, _) in rows[:self._profile_options["limit"]]
+            ]
+        }
+
+    def get_profile(self) -> Dict[str, Any]:
+        """Status of the current profiling window and its result once complete"""
+        return {
+            "status": self.profile_status,
+            "requests_target": self.profile_target,
+            "requests_profiled": self.profile_completed,
+            "result": self.profile_result
+        }
+
+
+class TimingMiddleware:
+    """Pure ASGI middleware: when timing and profiling are both off it only
+    checks one property before handing the request on"""
+
+    def __init__(self, app, timing_service: TimingService, exclude_prefix: str = "/api/admin"):
+        self.app = app
+        self.timing = timing_service
+        self.exclude_prefix = exclude_prefix
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.timing.active or scope["path"].startswith(self.exclude_prefix):
+            await self.app(scope, receive, send)
+            return
+
+        timing = self.timing
+        trace = RequestTrace()
+        token = _current_trace.set(trace)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if timing.enabled:
+                    header = timing.server_timing_header((time.perf_counter() - start) * 1000, trace)
+                    message["headers"] = list(message.get("headers", [])) + [
+                        (b"server-timing", header.encode("latin-1"))
+                    ]
+            await send(message)
+
+        timing._profile_request_started()
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            timing._profile_request_finished()
+            _current_trace.reset(token)
+            if timing.enabled:
+                timing.record(scope["method"], scope["path"], status, (time.perf_counter() - start) * 1000, trace)
@@ -0,0 +1,1476 @@
+#!/usr/bin/env python3
+"""
+Backend Benchmarks for MediSync Healthcare Platform
+Measures the in-process performance of backend services
+"""
+
+import os
+import sys
+import time
+import statistics
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+
+class MediSyncBenchmark:
+    def __init__(self):
+        self.results = []
+
+    def log_result(self, name, value, unit, details=""):
+        """Log a benchmark measurement"""
+        print(f"⏱️  {name}: {value:,.3f} {unit}" + (f" ({details})" if details else ""))
+        self.results.append({
+            "name": name,
+            "value": value,
+            "unit": unit,
+            "details": details
+        })
+
+    def time_calls(self, fn, args_list):
+        """Time fn(*args) for every args tuple, returning per-call latencies in microseconds"""
+        latencies = []
+        for args in args_list:
+            start = time.perf_counter()
+            fn(*args)
+            latencies.append((time.perf_counter() - start) * 1e6)
+        return latencies
+
+    def log_latencies(self, name, latencies, details=""):
+        """Log median and p99 of a latency sample (microseconds)"""
+        ordered = sorted(latencies)
+        p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+        self.log_result(f"{name} p50", statistics.median(ordered), "µs", details)
+        self.log_result(f"{name} p99", p99, "µs", details)
+
+    def bench_hospital_index(self, n_facilities=1_000_000, n_queries=2_000):
+        """Nearest-k and radius queries over a synthetic nationwide hospital dataset"""
+        import numpy as np
+        from services.hospital_service import HospitalIndex
+
+        rng = np.random.default_rng(42)
+        # Cluster facilities around Indian metros to mimic real density
+        centers = np.array([[19.07, 72.87], [28.61, 77.21], [12.97, 77.59],
+                            [13.08, 80.27], [22.57, 88.36], [17.38, 78.48]])
+        picks = rng.integers(0, len(centers), n_facilities)
+        lat = centers[picks, 0] + rng.normal(0, 0.6, n_facilities)
+        lng = centers[picks, 1] + rng.normal(0, 0.6, n_facilities)
+        specialties = ["Emergency Care, General Medicine", "Cardiology", "Pediatrics", "Orthopedics"]
+        hospitals = [
+            {"latitude": float(a), "longitude": float(b), "specialty": specialties[i % 4]}
+            for i, (a, b) in enumerate(zip(lat, lng))
+        ]
+
+        start = time.perf_counter()
+        index = HospitalIndex(hospitals)
+        self.log_result("Hospital index build", time.perf_counter() - start, "s", f"{n_facilities:,} facilities")
+
+        q = rng.integers(0, n_facilities, n_queries)
+        queries = [(float(lat[i]), float(lng[i])) for i in q]
+
+        self.log_latencies("Hospital nearest k=10",
+                           self.time_calls(index.nearest, [(a, b, 10) for a, b in queries]))
+        self.log_latencies("Hospital nearest k=10 specialty",
+                           self.time_calls(index.nearest, [(a, b, 10, "emergency care") for a, b in queries]))
+        self.log_latencies("Hospital within 2 km",
+                           self.time_calls(index.within_radius, [(a, b, 2.0, None, 20) for a, b in queries]))
+
+    def bench_symptom_matcher(self, n_terms=10_000, n_messages=5_000):
+        """Symptom triage throughput with a 10^4-term lexicon, against the naive keyword scan"""
+        import random
+        from services.symptom_service import SymptomService
+
+        rng = random.Random(7)
+        words = [''.join(rng.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(rng.randint(3, 9)))
+                 for _ in range(3_000)]
+        unique_terms = set()
+        while len(unique_terms) < n_terms:
+            unique_terms.add(' '.join(rng.sample(words, rng.randint(1, 3))))
+        unique_terms = sorted(unique_terms)
+        lexicon = []
+        for i in range(0, n_terms, 5):
+            symptom, *synonyms = unique_terms[i:i + 5]
+            lexicon.append({"symptom": symptom, "synonyms": synonyms,
+                            "severity": rng.randint(1, 5), "advice": f"advice {i}"})
+
+        service = SymptomService(cache_size=n_messages)
+        start = time.perf_counter()
+        service.load_lexicon(lexicon)
+        self.log_result("Symptom lexicon compile", time.perf_counter() - start, "s", f"{len(service.terms):,} terms")
+
+        messages = [' '.join(rng.choice(words) for _ in range(40)) for _ in range(n_messages)]
+        all_terms = [' '.join(t) for t in service.terms]
+
+        def naive(message):
+            lower = message.lower()
+            return [term for term in all_terms if term in lower]
+
+        start = time.perf_counter()
+        for message in messages[:200]:
+            naive(message)
+        elapsed = time.perf_counter() - start
+        self.log_result("Symptom naive keyword scan", 200 / elapsed, "msg/s")
+
+        start = time.perf_counter()
+        for message in messages:
+            service.check_symptoms(message)
+        elapsed = time.perf_counter() - start
+        self.log_result("Symptom matcher (uncached)", n_messages / elapsed, "msg/s")
+
+        start = time.perf_counter()
+        for message in messages:
+            service.check_symptoms(message.upper())
+        elapsed = time.perf_counter() - start
+        self.log_result("Symptom matcher (cached)", n_messages / elapsed, "msg/s",
+                        f"hits={service.get_stats()['cache_hits']:,}")
+
+    def bench_chat_streaming(self, n_sessions=5_000, arrival_window=2.0, chunk_delay=0.5):
+        """Time-to-first-delta for thousands of overlapping chat streams on one event loop"""
+        import asyncio
+        from services.symptom_service import SymptomService
+        from services.chat_service import ChatService, RuleBasedResponder
+
+        service = ChatService(RuleBasedResponder(SymptomService(), chunk_delay=chunk_delay),
+                              max_sessions=n_sessions)
+        peak = 0
+
+        async def session(message, arrival):
+            nonlocal peak
+            await asyncio.sleep(arrival)
+            start = time.perf_counter()
+            first = None
+            async for event in service.stream(message):
+                peak = max(peak, service.active_sessions)
+                if first is None and '"delta"' in event:
+                    first = time.perf_counter() - start
+            return first * 1e6
+
+        async def run():
+            messages = ["I have a fever and a cough", "chest pain since morning", "hello"]
+            return await asyncio.gather(*[
+                session(messages[i % 3], arrival_window * i / n_sessions) for i in range(n_sessions)
+            ])
+
+        start = time.perf_counter()
+        ttfb = asyncio.run(run())
+        elapsed = time.perf_counter() - start
+
+        self.log_latencies("Chat time-to-first-delta", ttfb, f"peak {peak:,} concurrent sessions")
+        self.log_result("Chat all sessions completed", elapsed, "s",
+                        f"{n_sessions:,} sessions, {chunk_delay * 1000:.0f} ms between chunks")
+
+    def bench_doctor_search(self, n_doctors=100_000, n_queries=500):
+        """Doctor directory search and typeahead over 10^5 doctors"""
+        import random
+        from services.doctor_search_service import DoctorSearchService
+
+        rng = random.Random(11)
+        specializations = ["Cardiology", "Dermatology", "Neurology", "Orthopedics", "Pediatrics",
+                           "General Medicine", "Gynecology", "Psychiatry", "Oncology", "Radiology",
+                           "Endocrinology", "Gastroenterology", "Nephrology", "Pulmonology",
+                           "Ophthalmology", "ENT", "Urology", "Rheumatology", "Cardiac Surgery",
+                           "Pediatric Neurology"]
+        cities = [f"{name} {suffix}".strip() for name in
+                  ["Mumbai", "Delhi", "Bengaluru", "Chennai", "Kolkata", "Hyderabad", "Pune",
+                   "Ahmedabad", "Jaipur", "Lucknow", "Kochi", "Nagpur", "Indore", "Bhopal", "Surat"]
+                  for suffix in ["", "North", "South", "East", "West", "Central", "Cantonment"]]
+        doctors = [{"id": f"doctor_{i}", "name": f"Dr. Test {i}", "phone": f"+91{9000000000 + i}",
+                    "specialization": rng.choice(specializations), "location": rng.choice(cities)}
+                   for i in range(n_doctors)]
+
+        start = time.perf_counter()
+        service = DoctorSearchService(doctors)
+        self.log_result("Doctor index build", time.perf_counter() - start, "s", f"{n_doctors:,} doctors")
+
+        self.log_latencies("Doctor search specialization+location", self.time_calls(
+            lambda s, l: service.search(specialization=s, location=l),
+            [(rng.choice(specializations), rng.choice(cities)) for _ in range(n_queries)]))
+        self.log_latencies("Doctor search free text", self.time_calls(
+            lambda q: service.search(query=q),
+            [(f"{rng.choice(specializations)} {rng.choice(cities)}",) for _ in range(n_queries)]))
+        self.log_latencies("Doctor search prefix 'card mum'", self.time_calls(
+            lambda q: service.search(query=q), [("card mum",)] * n_queries))
+        self.log_latencies("Doctor typeahead", self.time_calls(
+            service.suggest, [("specialization", rng.choice(specializations)[:3]) for _ in range(n_queries)]))
+
+        start = time.perf_counter()
+        for i in range(1_000):
+            service.add_doctor({**doctors[i], "phone": f"+91{8000000000 + i}"})
+        self.log_result("Doctor incremental add", (time.perf_counter() - start) * 1e3, "µs/doctor")
+
+    def bench_pathology_ingest(self, n_batches=10, batch_size=5_000, n_patients=2_000):
+        """Bulk lab report ingestion throughput and per-patient trend queries"""
+        import random
+        from services.pathology_service import PathologyService
+
+        rng = random.Random(5)
+        templates = [
+            "Complete Blood Count: Hemoglobin: {:.1f} g/dL, WBC: {:,}/μL, Platelets: {:,}/μL.",
+            "Lipid Profile: Total Cholesterol: {} mg/dL, HDL: {} mg/dL, LDL: {} mg/dL, Triglycerides: {} mg/dL.",
+            "Thyroid Function Test: TSH: {:.1f} mIU/L, T3: {:.1f} ng/mL, T4: {:.1f} μg/dL."
+        ]
+
+        def make_report(i):
+            kind = i % 3
+            if kind == 0:
+                summary = templates[0].format(rng.uniform(9, 18), rng.randint(3000, 14000), rng.randint(100000, 500000))
+            elif kind == 1:
+                summary = templates[1].format(*(rng.randint(20, 260) for _ in range(4)))
+            else:
+                summary = templates[2].format(rng.uniform(0.1, 8), rng.uniform(0.5, 2.5), rng.uniform(3, 14))
+            return {"patient_id": f"patient_{rng.randrange(n_patients)}",
+                    "date": f"20{rng.randint(15, 25)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+                    "summary": summary, "lab_name": "Bench Labs"}
+
+        batches = [[make_report(b * batch_size + i) for i in range(batch_size)] for b in range(n_batches)]
+        service = PathologyService()
+
+        start = time.perf_counter()
+        results = 0
+        for batch in batches:
+            results += service.ingest_reports(batch)["results_parsed"]
+        elapsed = time.perf_counter() - start
+        self.log_result("Pathology ingest", n_batches * batch_size / elapsed, "reports/s",
+                        f"{results / elapsed:,.0f} results/s, batches of {batch_size:,}")
+
+        rows = service.results.size
+        analyte, value, unit = service.results["analyte"], service.results["value"], service.results["unit"]
+        start = time.perf_counter()
+        service.flag_values(analyte, value, unit)
+        self.log_result("Pathology vectorized flagging", rows / (time.perf_counter() - start) / 1e6,
+                        "M results/s", f"{rows:,} rows")
+
+        self.log_latencies("Pathology trend query", self.time_calls(
+            service.get_trend, [(f"patient_{rng.randrange(n_patients)}", "TSH") for _ in range(1_000)]))
+
+    def bench_consent_waiters(self, n_waiters=10_000, idle_seconds=1.0):
+        """CPU cost of idle long-poll waiters and wake-up latency when consent is decided"""
+        import asyncio
+        import contextlib
+        import io
+        import tracemalloc
+        from services.notification_hub import NotificationHub
+        from services.consent_service import ConsentService
+
+        service = ConsentService(NotificationHub())
+        with contextlib.redirect_stdout(io.StringIO()):
+            requests = [service.create_request(f"doctor_{i}", f"patient_{i}") for i in range(n_waiters)]
+
+        async def run():
+            tracemalloc.start()
+            woken = {}
+
+            async def waiter(request_id):
+                await service.wait_for_decision(request_id, timeout=60)
+                woken[request_id] = time.perf_counter()
+
+            tasks = [asyncio.create_task(waiter(r["id"])) for r in requests]
+            await asyncio.sleep(0.1)
+            memory = tracemalloc.get_traced_memory()[0]
+
+            cpu_start = time.process_time()
+            await asyncio.sleep(idle_seconds)
+            idle_cpu = time.process_time() - cpu_start
+
+            decided = {}
+            with contextlib.redirect_stdout(io.StringIO()):
+                for r in requests:
+                    decided[r["id"]] = time.perf_counter()
+                    service.decide(r["id"], r["patient_id"], True)
+                    await asyncio.sleep(0)
+                await asyncio.gather(*tasks)
+            tracemalloc.stop()
+            return memory, idle_cpu, [(woken[k] - decided[k]) * 1e6 for k in decided]
+
+        memory, idle_cpu, latencies = asyncio.run(run())
+        self.log_result("Consent idle waiter memory", memory / n_waiters, "bytes/waiter", f"{n_waiters:,} waiters")
+        self.log_result("Consent idle CPU", idle_cpu / idle_seconds * 100, "% of one core", f"{n_waiters:,} waiters")
+        self.log_latencies("Consent decision-to-wake", latencies)
+
+    def bench_session_tokens(self, n_sessions=10_000, n_requests=50_000):
+        """Authenticated request overhead: cold (HMAC) vs cached token verification, and the full dependency"""
+        import contextlib
+        import io
+        import random
+        from fastapi import FastAPI, Depends
+        from fastapi.testclient import TestClient
+        from services.session_service import SessionService
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            service = SessionService(secret="benchmark", cache_size=n_sessions)
+        tokens = [
+            service.create_session({"id": f"patient_{i}", "phone": f"+91{9000000000 + i}"}, "patient")["access_token"]
+            for i in range(n_sessions)
+        ]
+        lookups = [random.choice(tokens) for _ in range(n_requests)]
+
+        cold = self.time_calls(service.verify, [(t,) for t in tokens])
+        self.log_latencies("Session verify (cold, HMAC)", cold, f"{n_sessions:,} tokens")
+        warm = self.time_calls(service.verify, [(t,) for t in lookups])
+        self.log_latencies("Session verify (cached)", warm, f"{n_requests:,} lookups")
+
+        # Same endpoint with and without the bearer dependency, through the full ASGI stack
+        with contextlib.redirect_stdout(io.StringIO()):
+            import server
+        server.session_service = service
+        app = FastAPI()
+
+        @app.get("/open")
+        async def open_endpoint():
+            return {"ok": True}
+
+        @app.get("/protected")
+        async def protected_endpoint(session=Depends(server.require_session)):
+            return {"ok": True}
+
+        client = TestClient(app)
+        n_http = 2_000
+        open_lat = self.time_calls(client.get, [("/open",)] * n_http)
+        protected_lat = self.time_calls(
+            lambda t: client.get("/protected", headers={"Authorization": f"Bearer {t}"}),
+            [(t,) for t in lookups[:n_http]]
+        )
+        self.log_latencies("Unauthenticated request", open_lat)
+        self.log_latencies("Authenticated request", protected_lat)
+        overhead = sorted(protected_lat)[n_http // 2] - sorted(open_lat)[n_http // 2]
+        self.log_result("Session dependency overhead (p50)", overhead, "µs")
+
+    def bench_profile_reads(self, n_profiles=10_000, n_reads=100_000):
+        """Profile read cost: serialize every time vs cached body vs If-None-Match 304"""
+        import contextlib
+        import io
+        import json
+        import random
+        from services.auth_service import AuthService
+        from services.profile_service import ProfileService
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            auth = AuthService()
+            profiles = ProfileService(auth, cache_size=n_profiles)
+        template = next(iter(auth.patients.values()))
+        phones = [f"+91{9000000000 + i}" for i in range(n_profiles)]
+        for i, phone in enumerate(phones):
+            auth.patients[phone] = {**template, "id": f"patient_{i}", "phone": phone}
+        reads = [random.choice(phones) for _ in range(n_reads)]
+        etags = {phone: profiles.etag(auth.patients[phone]) for phone in phones}
+
+        def serialize(phone):
+            record = dict(auth.patients[phone])
+            record.pop('password_hash', None)
+            return json.dumps({"success": True, "profile": record}).encode()
+
+        uncached = self.time_calls(serialize, [(p,) for p in reads])
+        for phone in phones:
+            profiles.get_profile("patient", phone)
+        cached = self.time_calls(profiles.get_profile, [("patient", p) for p in reads])
+        not_modified = self.time_calls(profiles.get_profile, [("patient", p, etags[p]) for p in reads])
+
+        self.log_latencies("Profile read (serialize each time)", uncached, f"{n_reads:,} reads")
+        self.log_latencies("Profile read (cached body)", cached)
+        self.log_latencies("Profile read (If-None-Match 304)", not_modified)
+        self.log_result("Profile body size", len(serialize(phones[0])), "bytes", "vs 0 bytes for 304")
+
+    def bench_request_timing(self, n_requests=20_000):
+        """Overhead of stage timing: span() calls and the middleware, disabled and enabled"""
+        import asyncio
+        import contextlib
+        import io
+        from fastapi import FastAPI
+        from services.timing_service import TimingService, TimingMiddleware, TimedRoute, span
+
+        def spans(n):
+            for _ in range(n):
+                with span("stage"):
+                    pass
+
+        start = time.perf_counter()
+        spans(n_requests * 10)
+        self.log_result("span() with timing off", (time.perf_counter() - start) / (n_requests * 10) * 1e9, "ns/span")
+
+        def build(timed, timing=None):
+            app = FastAPI()
+            if timed:
+                app.router.route_class = TimedRoute
+
+            @app.get("/ping")
+            async def ping():
+                with span("work"):
+                    return {"ok": True}
+
+            if timing is not None:
+                app.add_middleware(TimingMiddleware, timing_service=timing)
+            return app
+
+        async def call(app):
+            scope = {"type": "http", "method": "GET", "path": "/ping", "raw_path": b"/ping",
+                     "query_string": b"", "headers": [], "root_path": "", "scheme": "http",
+                     "server": ("bench", 80), "client": ("bench", 1), "http_version": "1.1"}
+
+            async def receive():
+                return {"type": "http.request", "body": b"", "more_body": False}
+
+            async def send(message):
+                pass
+
+            await app(scope, receive, send)
+
+        async def run(apps):
+            # Interleave the variants so drift (GC, allocator, CPU clocks) hits them equally
+            latencies = [[] for _ in apps]
+            for _ in range(n_requests):
+                for app, sample in zip(apps, latencies):
+                    start = time.perf_counter()
+                    await call(app)
+                    sample.append((time.perf_counter() - start) * 1e6)
+            return latencies
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            disabled, enabled = TimingService(enabled=False), TimingService(enabled=True)
+        names = ["Request without timing", "Request with timing disabled", "Request with timing enabled"]
+        apps = [build(False), build(True, disabled), build(True, enabled)]
+        asyncio.run(run(apps))  # warm up
+        for name, latencies in zip(names, asyncio.run(run(apps))):
+            self.log_latencies(name, latencies, f"{n_requests:,} requests")
+
+    def bench_sms_routing(self, n_messages=2_000, rate=500):
+        """Simulated OTP send latency with one degraded provider: single provider vs failover vs hedging"""
+        import asyncio
+        import random
+        from services.sms_service import SMSRouter, SimulatedProvider
+
+        def providers():
+            # "primary" is normally the fastest but 20% of its sends stall for ~0.5 s
+            return [
+                SimulatedProvider("primary", latency=0.015, jitter=0.3, spike_rate=0.2, spike_latency=0.5),
+                SimulatedProvider("secondary", latency=0.025, jitter=0.3)
+            ]
+
+        async def run(router):
+            latencies = []
+
+            async def one(i):
+                start = time.perf_counter()
+                await router.send(f"+91{9000000000 + i}", "Your MediSync OTP is: 123456")
+                latencies.append((time.perf_counter() - start) * 1e6)
+
+            tasks = []
+            for i in range(n_messages):
+                tasks.append(asyncio.create_task(one(i)))
+                await asyncio.sleep(random.expovariate(rate))
+            await asyncio.gather(*tasks)
+            return latencies
+
+        variants = [
+            ("SMS send, degraded provider only", SMSRouter(providers()[:1], hedge_budget=0.1, hedge=False)),
+            ("SMS send, health-ranked failover", SMSRouter(providers(), hedge_budget=0.1, hedge=False)),
+            ("SMS send, hedged after p95", SMSRouter(providers(), hedge_budget=0.1))
+        ]
+        for name, router in variants:
+            latencies = asyncio.run(run(router))
+            ordered = sorted(latencies)
+            self.log_latencies(name, latencies, f"{n_messages:,} messages")
+            self.log_result(f"{name} p99.9", ordered[int(len(ordered) * 0.999)], "µs")
+            self.log_result(f"{name} hedged", router.stats["hedged"], "messages")
+
+    def bench_sms_admission(self, n_messages=1_000, rate=1_000):
+        """Provider outage: time to answer a send and peak in-flight calls, without vs with admission control"""
+        import asyncio
+        import random
+        from services.sms_service import SMSRouter, SimulatedProvider, SMSUnavailableError
+
+        async def run(router):
+            latencies, peak, fast = [], 0, 0
+
+            async def one(i):
+                nonlocal peak, fast
+                start = time.perf_counter()
+                try:
+                    await router.send(f"+91{9000000000 + i}", "Your MediSync OTP is: 123456")
+                except SMSUnavailableError:
+                    pass
+                latencies.append((time.perf_counter() - start) * 1e6)
+                fast += latencies[-1] < 10_000
+                peak = max(peak, router.in_flight)
+
+            tasks = []
+            for i in range(n_messages):
+                tasks.append(asyncio.create_task(one(i)))
+                peak = max(peak, router.in_flight)
+                await asyncio.sleep(random.expovariate(rate))
+            await asyncio.gather(*tasks)
+            return latencies, peak, fast
+
+        def hung_provider():
+            # Provider is down: every call hangs until the router's timeout
+            return [SimulatedProvider("down", latency=5.0, jitter=0)]
+
+        variants = [
+            ("SMS outage, no admission control",
+             SMSRouter(hung_provider(), timeout=0.5, hedge=False, max_in_flight=10 ** 6, failure_threshold=10 ** 6)),
+            ("SMS outage, breaker + in-flight cap",
+             SMSRouter(hung_provider(), timeout=0.5, hedge=False, max_in_flight=20, max_queue=20,
+                       queue_timeout=0.2, failure_threshold=5))
+        ]
+        for name, router in variants:
+            latencies, peak, fast = asyncio.run(run(router))
+            self.log_latencies(name, latencies, f"{n_messages:,} sends")
+            self.log_result(f"{name} peak in-flight", peak, "calls")
+            self.log_result(f"{name} answered in <10 ms", fast, "sends")
+
+    def bench_delivery_callbacks(self, n_messages=20_000, n_callbacks=100_000):
+        """Delivery-status callback burst: acknowledgement latency through the app and batched apply throughput"""
+        import asyncio
+        import contextlib
+        import io
+        import random
+        from services.delivery_service import DeliveryStatusService
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            import server
+            service = DeliveryStatusService(batch_size=10 ** 9, buffer_size=10 ** 7)
+        server.delivery_service = service
+        message_ids = [f"SM{i:032x}" for i in range(n_messages)]
+        for message_id in message_ids:
+            service.track(message_id, f"+91{random.choice('6789')}{random.randint(0, 999999999):09d}", "twilio")
+
+        statuses = ["queued", "sent", "delivered", "delivered", "delivered", "undelivered"]
+        bodies = [
+            f"MessageSid={random.choice(message_ids)}&MessageStatus={random.choice(statuses)}&To=%2B919000000000".encode()
+            for _ in range(n_callbacks)
+        ]
+
+        async def burst():
+            scope = {"type": "http", "method": "POST", "path": "/api/sms/status-callback",
+                     "raw_path": b"/api/sms/status-callback", "query_string": b"", "root_path": "",
+                     "headers": [(b"content-type", b"application/x-www-form-urlencoded")],
+                     "scheme": "http", "server": ("bench", 80), "client": ("bench", 1), "http_version": "1.1"}
+            latencies = []
+            for body in bodies:
+                async def receive(body=body):
+                    return {"type": "http.request", "body": body, "more_body": False}
+
+                async def send(message):
+                    pass
+
+                start = time.perf_counter()
+                await server.app(scope, receive, send)
+                latencies.append((time.perf_counter() - start) * 1e6)
+            return latencies
+
+        latencies = asyncio.run(burst())
+        self.log_latencies("Delivery callback acknowledgement", latencies, f"{n_callbacks:,} callbacks")
+
+        start = time.perf_counter()
+        applied = service.apply_batch()
+        elapsed = time.perf_counter() - start
+        self.log_result("Delivery callback batch apply", applied / elapsed, "callbacks/s", f"{applied:,} in one batch")
+        start = time.perf_counter()
+        rows = service.get_prefix_stats()
+        self.log_result("Delivery stats query", (time.perf_counter() - start) * 1e3, "ms", f"{len(rows):,} prefixes")
+
+    def bench_abuse_sketch(self, n_events=10_000_000, n_keys=1_000_000, n_checks=100_000):
+        """Abuse detection sketches: bulk ingest and accuracy at 10^7 events, per-request check cost, heavy-hitter recall"""
+        import contextlib
+        import io
+        import numpy as np
+        from services.abuse_service import AbuseDetectionService, CountMinSketch
+
+        rng = np.random.default_rng(38)
+        # Zipf-distributed keys: a few very hot IPs/phones over a long tail
+        keys = (rng.zipf(1.2, size=n_events) % n_keys).astype(np.uint64)
+
+        sketch = CountMinSketch()
+        start = time.perf_counter()
+        for chunk in range(0, n_events, 1_000_000):
+            sketch.add_hashes(keys[chunk:chunk + 1_000_000], now=sketch._epoch)
+        elapsed = time.perf_counter() - start
+        self.log_result("Abuse sketch bulk ingest", n_events / elapsed, "events/s",
+                        f"{n_events:,} events, {sketch.memory_bytes // 1024} KiB fixed")
+
+        unique, counts = np.unique(keys, return_counts=True)
+        estimates = sketch.estimate_hashes(unique, now=sketch._epoch)
+        overcount = estimates - counts
+        heavy = counts >= 1000
+        bound = np.e / sketch.width * n_events
+        self.log_result("Abuse sketch overcount (keys with >=1000 events)",
+                        float(np.mean(overcount[heavy] / counts[heavy]) * 100), "%",
+                        f"{int(heavy.sum()):,} keys, max {int(overcount[heavy].max())} events")
+        self.log_result("Abuse sketch keys within e/w bound", float(np.mean(overcount <= bound) * 100), "%",
+                        f"{len(unique):,} distinct keys, bound {bound:,.0f} events")
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            service = AbuseDetectionService(limits={
+                "send": {"ip": 1e12, "phone": 1e12, "prefix": 1e12},
+                "verify": {"ip": 1e12, "phone": 1e12, "prefix": 1e12}
+            })
+        ips = [f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}" for i in rng.integers(0, n_keys, size=n_checks)]
+        phones = [f"+91{p}" for p in rng.integers(6_000_000_000, 9_999_999_999, size=n_checks)]
+        latencies = []
+        for ip, phone in zip(ips, phones):
+            start = time.perf_counter()
+            service.check_send(ip, phone, "patient_login")
+            service.record_send(ip, phone, "patient_login")
+            latencies.append((time.perf_counter() - start) * 1e6)
+        self.log_latencies("Abuse check + record per send", latencies, f"{n_checks:,} sends, 3 keys each")
+
+        sample = keys[:1_000_000].tolist()
+        sketch = CountMinSketch()
+        start = time.perf_counter()
+        for key in sample:
+            sketch.add(key)
+        elapsed = time.perf_counter() - start
+        self.log_result("Abuse sketch per-event add", elapsed / len(sample) * 1e6, "µs/event",
+                        f"{len(sample):,} events with conservative update and top-{sketch.top_k}")
+        sample_unique, sample_counts = np.unique(keys[:1_000_000], return_counts=True)
+        true_top = set(sample_unique[np.argsort(sample_counts)[-20:]].tolist())
+        found_top = {key for key, _ in sketch.top(20)}
+        self.log_result("Abuse heavy-hitter recall (top 20)", len(true_top & found_top) / 20 * 100, "%")
+
+    def bench_state_restart(self, n_users=1_000_000, n_mutations=100_000):
+        """Warm restart with 10^6 users: WAL append cost, background snapshot, and restart-to-ready time"""
+        import asyncio
+        import contextlib
+        import io
+        import shutil
+        import tempfile
+        from services.persistence_service import PersistenceService
+
+        directory = tempfile.mkdtemp(prefix="medisync-state-")
+
+        def make_user(i):
+            return {
+                "id": f"patient_{i}", "name": f"Patient {i}", "email": f"patient{i}@example.com",
+                "phone": f"+91{7000000000 + i}", "gender": "Female", "address": f"{i} Main St, Mumbai",
+                "password_hash": f"{i:064x}", "age": 30, "sex": "Female", "weight": "N/A", "height": "N/A",
+                "allergies": "None", "chronic": "None", "created_at": 1.7e9 + i, "version": 1
+            }
+
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                service = PersistenceService(directory)
+                patients = {f"+91{7000000000 + i}": make_user(i) for i in range(n_users)}
+                service.register("patients", patients)
+                service.load()
+
+            async def write_state():
+                start = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    await service.snapshot()
+                snapshot_ms = (time.perf_counter() - start) * 1000
+
+                latencies = []
+                for i in range(n_mutations):
+                    phone = f"+91{7000000000 + (i * 7919) % n_users}"
+                    patients[phone]["version"] += 1
+                    start = time.perf_counter()
+                    service.record("patients", phone)
+                    latencies.append((time.perf_counter() - start) * 1e6)
+                # Simulate a crash: no final snapshot, so the restart has to replay the WAL
+                await service.stop(final_snapshot=False)
+                return snapshot_ms, latencies
+
+            snapshot_ms, latencies = asyncio.run(write_state())
+            size_mb = os.path.getsize(os.path.join(directory, "snapshot")) / 1e6
+            self.log_result("State snapshot (background, chunked)", snapshot_ms, "ms", f"{n_users:,} users, {size_mb:.0f} MB")
+            self.log_latencies("State WAL append", latencies, f"{n_mutations:,} profile updates")
+
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                restarted = PersistenceService(directory)
+                restored = {}
+                restarted.register("patients", restored)
+                stats = restarted.load()
+            ready_ms = (time.perf_counter() - start) * 1000
+            self.log_result("State restart-to-ready", ready_ms, "ms",
+                            f"{stats['loaded_records']:,} from snapshot + {stats['replayed_records']:,} WAL records")
+            if restored != patients:
+                self.log_result("State restore mismatch", 1, "error", "restored stores differ from live state")
+            asyncio.run(restarted.stop(final_snapshot=False))
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    def bench_twilio_transport(self, n_messages=1_000, concurrency=10, latency=0.005):
+        """Twilio sends against a loopback stub: pooled httpx vs the SDK in a thread pool vs a connection per send"""
+        import asyncio
+        import httpx
+        from twilio.rest import Client
+        from backend_test import TwilioStubServer
+        from services.sms_service import TwilioProvider
+
+        account_sid, from_number = "AC" + "0" * 32, "+15005550006"
+        phones = [f"+9190000{i:05d}" for i in range(n_messages)]
+
+        async def run(send):
+            semaphore = asyncio.Semaphore(concurrency)
+            latencies = []
+
+            async def one(phone):
+                async with semaphore:
+                    start = time.perf_counter()
+                    await send(phone)
+                    latencies.append((time.perf_counter() - start) * 1000)
+
+            start = time.perf_counter()
+            await asyncio.gather(*(one(phone) for phone in phones))
+            return n_messages / (time.perf_counter() - start), latencies
+
+        with TwilioStubServer(latency=latency) as stub:
+            # Twilio SDK: blocking requests transport, one worker thread per in-flight send
+            client = Client(account_sid, "token")
+            client.api.base_url = stub.url
+
+            async def sdk_send(phone):
+                await asyncio.to_thread(client.messages.create, body="Your OTP is 123456", from_=from_number, to=phone)
+
+            # httpx without pooling: a new connection for every send
+            async def unpooled_send(phone):
+                async with httpx.AsyncClient(base_url=stub.url, auth=(account_sid, "token")) as fresh:
+                    response = await fresh.post(f"/2010-04-01/Accounts/{account_sid}/Messages.json",
+                                                data={"To": phone, "From": from_number, "Body": "Your OTP is 123456"})
+                    response.raise_for_status()
+
+            pooled = TwilioProvider(account_sid, "token", from_number, base_url=stub.url,
+                                    max_connections=concurrency, max_keepalive=concurrency)
+
+            async def pooled_send(phone):
+                await pooled.send(phone, "Your OTP is 123456")
+
+            async def pooled_run():
+                try:
+                    return await run(pooled_send)
+                finally:
+                    await pooled.close()
+
+            for label, runner in [("SDK (requests in thread pool)", lambda: run(sdk_send)),
+                                  ("httpx, connection per send", lambda: run(unpooled_send)),
+                                  ("httpx pooled keep-alive", pooled_run)]:
+                connections_before = stub.connections
+                throughput, latencies = asyncio.run(runner())
+                opened = stub.connections - connections_before
+                self.log_result(f"Twilio send throughput - {label}", throughput, "msgs/s",
+                                f"{n_messages:,} sends, {concurrency} concurrent, {opened:,} connections")
+                self.log_latencies(f"Twilio send latency - {label}", [ms * 1000 for ms in latencies])
+
+    def bench_otp_lock_striping(self, n_threads=8, n_verifies=20_000):
+        """OTP compare-and-consume from worker threads: striped per-phone locks vs one global lock"""
+        import contextlib
+        import io
+        import threading
+        from services.otp_service import OTPService
+        from services.sms_service import SMSRouter, ConsoleProvider
+        from services.striped_locks import StripedLock
+
+        class OffloadedCode(str):
+            # Comparison that releases the GIL, as hashing codes off the event loop would
+            __hash__ = str.__hash__
+
+            def __eq__(self, other):
+                time.sleep(0)
+                return str.__eq__(self, other)
+
+        for stripes in (1, 64):
+            with contextlib.redirect_stdout(io.StringIO()):
+                service = OTPService(sms_router=SMSRouter([ConsoleProvider()]))
+                service._locks = StripedLock(stripes)
+                # The per-call expiry sweep is not what is being measured
+                service._cleanup_expired_otps = lambda: None
+                phones = [f"+9190{i:08d}" for i in range(n_verifies)]
+                for phone in phones:
+                    service.otp_store[phone] = {"otp": OffloadedCode("123456"), "timestamp": time.time(),
+                                                "type": "patient_login", "attempts": 0}
+                barrier = threading.Barrier(n_threads + 1)
+
+                def worker(chunk):
+                    barrier.wait()
+                    for phone in chunk:
+                        service._check_otp(phone, "123456", "patient_login")
+
+                workers = [threading.Thread(target=worker, args=(phones[i::n_threads],)) for i in range(n_threads)]
+                for thread in workers:
+                    thread.start()
+                barrier.wait()
+                start = time.perf_counter()
+                for thread in workers:
+                    thread.join()
+                elapsed = time.perf_counter() - start
+            label = "global lock" if stripes == 1 else f"{stripes} stripes"
+            self.log_result(f"OTP verify throughput - {label}", n_verifies / elapsed, "verifies/s",
+                            f"{n_threads} threads, {len(service.otp_store)} left unconsumed")
+
+    def bench_idempotent_retries(self, n_clients=500, retries=3, retry_interval=0.02):
+        """Client retry storm on send-otp through the app: SMS sent with and without Idempotency-Key"""
+        import asyncio
+        import contextlib
+        import io
+        import json
+        from services.sms_service import SMSRouter, SimulatedProvider
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            import server
+        server.otp_service.abuse_service = None
+
+        class CountingProvider(SimulatedProvider):
+            sent = 0
+
+            async def send(self, to, body):
+                CountingProvider.sent += 1
+                return await super().send(to, body)
+
+        async def client(i, use_key, latencies):
+            body = json.dumps({"phone": f"+919{i:09d}"}).encode()
+            headers = [(b"content-type", b"application/json")]
+            if use_key:
+                headers.append((b"idempotency-key", f"bench-{i}".encode()))
+            scope = {"type": "http", "method": "POST", "path": "/api/patient/send-otp",
+                     "raw_path": b"/api/patient/send-otp", "query_string": b"", "root_path": "",
+                     "headers": headers, "scheme": "http", "server": ("bench", 80),
+                     "client": ("bench", 1), "http_version": "1.1"}
+            statuses = []
+
+            async def attempt():
+                async def receive():
+                    return {"type": "http.request", "body": body, "more_body": False}
+
+                async def send(message):
+                    if message["type"] == "http.response.start":
+                        statuses.append(message["status"])
+
+                start = time.perf_counter()
+                await server.app(scope, receive, send)
+                latencies.append((time.perf_counter() - start) * 1e6)
+
+            # The client gives up waiting and resends while the first send is still with the provider,
+            # then once more after it has answered
+            attempts = []
+            for _ in range(retries):
+                attempts.append(asyncio.create_task(attempt()))
+                await asyncio.sleep(retry_interval)
+            await asyncio.gather(*attempts)
+            await attempt()
+            return statuses
+
+        for use_key in (False, True):
+            with contextlib.redirect_stdout(io.StringIO()):
+                server.otp_service.sms_router = SMSRouter(
+                    [CountingProvider("bench", latency=0.05, jitter=0.3)], max_in_flight=10 ** 4, max_queue=10 ** 4)
+                CountingProvider.sent = 0
+                latencies = []
+
+                async def storm():
+                    return await asyncio.gather(*(client(i, use_key, latencies) for i in range(n_clients)))
+
+                results = asyncio.run(storm())
+            ok = sum(status == 200 for statuses in results for status in statuses)
+            label = "with Idempotency-Key" if use_key else "without key"
+            self.log_result(f"SMS sent per client - {label}", CountingProvider.sent / n_clients, "SMS",
+                            f"{n_clients} clients x {retries + 1} requests, {ok} OK")
+            self.log_latencies(f"send-otp request - {label}", latencies)
+        self.log_result("Idempotency cache", server.idempotency_service.get_stats()["replayed"], "replays",
+                        str(server.idempotency_service.get_stats()))
+
+    def bench_patient_export(self, n_reports=100_000):
+        """Streamed export of a long-history patient: time to first byte, throughput and peak memory"""
+        import contextlib
+        import io
+        import random
+        import tracemalloc
+        from services.auth_service import AuthService
+        from services.consent_service import ConsentService
+        from services.export_service import ExportService
+        from services.notification_hub import NotificationHub
+        from services.pathology_service import PathologyService
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            auth = AuthService()
+            pathology = PathologyService()
+            consent = ConsentService(NotificationHub())
+            service = ExportService(auth, pathology, consent)
+            phone = "+917894561230"
+            patient_id = auth.patients[phone]['id']
+            for start in range(0, n_reports, 10_000):
+                pathology.ingest_reports([
+                    {"patient_id": patient_id, "date": f"20{10 + i % 14}-{1 + i % 12:02d}-{1 + i % 28:02d}",
+                     "summary": f"Hemoglobin: {random.uniform(10, 17):.1f} g/dL, WBC: {random.randint(3000, 12000):,}/μL, "
+                                f"TSH: {random.uniform(0.2, 6):.2f} mIU/L",
+                     "lab_name": "City Diagnostics", "test_type": "Routine panel"}
+                    for i in range(start, min(start + 10_000, n_reports))
+                ])
+            for i in range(1_000):
+                consent.create_request(f"doctor{i}", patient_id)
+
+        snapshot = service.snapshot(phone)
+        start = time.perf_counter()
+        chunks = service.archive(snapshot)
+        size = len(next(chunks))
+        first_byte = time.perf_counter() - start
+        for chunk in chunks:
+            size += len(chunk)
+        elapsed = time.perf_counter() - start
+
+        # Memory is measured on separate runs: tracemalloc slows allocation-heavy code several-fold
+        tracemalloc.start()
+        for chunk in service.archive(snapshot):
+            pass
+        _, streamed_peak = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        # The same archive built in one buffer, as a non-streaming endpoint would
+        body = b"".join(service.archive(snapshot))
+        _, buffered_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        records = f"{snapshot.reports:,} reports, {snapshot.results:,} results"
+        self.log_result("Patient export time to first byte", first_byte * 1e3, "ms", records)
+        self.log_result("Patient export throughput", size / elapsed / 2 ** 20, "MiB/s", f"{size / 2 ** 20:.1f} MiB archive in {elapsed:.2f} s")
+        self.log_result("Patient export peak memory - streamed", streamed_peak / 2 ** 20, "MiB", f"{service.chunk_size // 1024} KiB chunks")
+        self.log_result("Patient export peak memory - buffered", buffered_peak / 2 ** 20, "MiB", f"{len(body) / 2 ** 20:.1f} MiB body")
+
+        start = time.perf_counter()
+        tail = b"".join(service.byte_range(snapshot, size // 2, size - 1))
+        self.log_result("Patient export resume from midpoint", (time.perf_counter() - start) * 1e3, "ms",
+                        f"{len(tail) / 2 ** 20:.1f} MiB, matches: {tail == body[size // 2:]}")
+
+    def bench_record_search(self, n_records=1_000_000, n_patients=10_000, n_queries=1_000):
+        """BM25 record search over a million records: build, scoped/global/phrase query latency, restart"""
+        import contextlib
+        import io
+        import itertools
+        import random
+        import shutil
+        import tempfile
+        from services.record_search_service import RecordSearchService
+
+        rng = random.Random(44)
+        terms = ["fever", "headache", "cough", "chest", "pain", "ecg", "paracetamol", "azithromycin", "throat",
+                 "sore", "breath", "shortness", "hypertension", "diabetes", "metformin", "insulin", "cbc", "mri",
+                 "x", "ray", "follow", "up", "rest", "fluids", "allergy", "asthma", "inhaler", "fracture"]
+        vocabulary = terms + [f"term{i}" for i in range(20_000)]
+        # Zipf-like word frequencies, as in clinical text
+        cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(vocabulary))))
+
+        def text(n):
+            return " ".join(rng.choices(vocabulary, cum_weights=cum_weights, k=n))
+
+        records = {}
+        for i in range(n_records):
+            record_id = f"record_{i:08x}"
+            records[record_id] = {"id": record_id, "patient_id": f"patient_{i % n_patients}", "version": 1,
+                                  "title": text(3), "description": text(12), "prescription": text(4),
+                                  "tests_recommended": text(2), "notes": text(10)}
+
+        directory = tempfile.mkdtemp(prefix="medisync-index-")
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                start = time.perf_counter()
+                service = RecordSearchService(records, directory=directory)
+                build = time.perf_counter() - start
+            stats = service.get_stats()
+            on_disk = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+            self.log_result("Record index build", n_records / build, "records/s",
+                            f"{n_records:,} records, {len(stats['segments'])} segments, {stats['tail_documents']:,} in tail")
+            self.log_result("Record index size", on_disk / 2 ** 20, "MiB on disk",
+                            f"{stats['segment_bytes'] / 2 ** 20:.0f} MiB in memory, "
+                            f"{sum(s['postings'] for s in stats['segments']):,} postings")
+
+            queries = [f"{rng.choice(terms)} {rng.choice(terms)}" for _ in range(n_queries)]
+            patients = [f"patient_{rng.randrange(n_patients)}" for _ in range(n_queries)]
+            self.log_latencies("Record search - one patient", self.time_calls(
+                service.search, [(q, p, 20) for q, p in zip(queries, patients)]), f"{n_records // n_patients} records each")
+            self.log_latencies("Record search - phrase, one patient", self.time_calls(
+                service.search, [(f'"{q}"', p, 20) for q, p in zip(queries, patients)]))
+            self.log_latencies("Record search - all records", self.time_calls(
+                service.search, [(q, None, 20) for q in queries[:200]]), f"{n_records:,} records")
+            self.log_latencies("Record search - phrase, all records", self.time_calls(
+                service.search, [(f'"{q}"', None, 20) for q in queries[:200]]))
+
+            updates = [dict(records[f"record_{rng.randrange(n_records):08x}"], version=2, notes=text(10))
+                       for _ in range(5_000)]
+            self.log_latencies("Record index incremental update", self.time_calls(
+                service.add_record, [(record,) for record in updates]), "replace one record")
+            for record in updates:
+                records[record['id']] = record
+
+            with contextlib.redirect_stdout(io.StringIO()):
+                start = time.perf_counter()
+                reloaded = RecordSearchService(records, directory=directory)
+                load = time.perf_counter() - start
+            self.log_result("Record index restart", load, "s",
+                            f"{reloaded.stats['loaded_docs']:,} from segments, "
+                            f"{reloaded.live_docs - reloaded.stats['loaded_docs']:,} re-indexed")
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    def bench_event_bus(self, n_registrations=500, side_effect=0.002, n_events=20_000):
+        """Registration completion with a slow side effect inline vs in a bus subscriber; bus throughput and backpressure"""
+        import asyncio
+        import contextlib
+        import io
+        from services.auth_service import AuthService
+        from services.event_bus import EventBus, PatientRegistered, RecordSaved
+
+        async def welcome_sms(event):
+            # Stand-in for a provider round trip, e.g. a welcome SMS
+            await asyncio.sleep(side_effect)
+
+        async def register_all(bus, started):
+            auth = AuthService(event_bus=bus)
+            if started:
+                bus.start()
+            latencies = []
+            for i in range(n_registrations):
+                phone = f"+9170{i:08d}"
+                await auth.store_temp_patient_data(phone, {"name": "Bench", "email": f"b{i}@example.com", "phone": phone,
+                                                           "gender": "Female", "address": "Mumbai", "password": "x"})
+                start = time.perf_counter()
+                await auth.complete_patient_registration(phone)
+                latencies.append((time.perf_counter() - start) * 1e6)
+            drain = time.perf_counter()
+            await bus.stop()
+            return latencies, time.perf_counter() - drain
+
+        for started in (False, True):
+            with contextlib.redirect_stdout(io.StringIO()):
+                bus = EventBus(queue_size=10_000)
+                bus.subscribe("welcome_sms", [PatientRegistered], welcome_sms)
+                latencies, drain = asyncio.run(register_all(bus, started))
+            label = "subscriber on event bus" if started else "side effect inline"
+            self.log_latencies(f"complete_patient_registration - {label}", latencies,
+                               f"{side_effect * 1000:.0f} ms side effect" + (f", drained in {drain:.2f} s" if started else ""))
+
+        async def flood(bus, count):
+            bus.start()
+            start = time.perf_counter()
+            for i in range(count):
+                await bus.publish(RecordSaved({"id": i}))
+            published = time.perf_counter() - start
+            await bus.stop(timeout=60)
+            return published, time.perf_counter() - start
+
+        failures = set()
+
+        def flaky_index(event):
+            # Every 100th event fails once, then succeeds on the retry
+            if event.record["id"] % 100 == 0 and event.record["id"] not in failures:
+                failures.add(event.record["id"])
+                raise Exception("index busy")
+
+        async def slow_index(event):
+            await asyncio.sleep(0.0005)
+
+        for name, handler, queue_size, count in (("fast handler", flaky_index, 1_000, n_events),
+                                                 ("slow handler", slow_index, 256, n_events // 10)):
+            with contextlib.redirect_stdout(io.StringIO()):
+                bus = EventBus(queue_size=queue_size, retry_delay=0.001)
+                bus.subscribe("index", [RecordSaved], handler)
+                published, total = asyncio.run(flood(bus, count))
+            stats = bus.get_stats()["subscribers"][0]
+            self.log_result(f"Event bus throughput - {name}", count / total, "events/s",
+                            f"{stats['delivered']:,} delivered, {stats['retried']:,} retried, "
+                            f"{stats['dead_lettered']} dead-lettered, lag p95 {stats['lag_p95_ms']} ms")
+            self.log_result(f"Event bus backpressure - {name}", stats["blocked_publishes"], "blocked publishes",
+                            f"queue {queue_size}, high water {stats['high_water']}, "
+                            f"publishers waited {stats['blocked_seconds']:.2f} s of {published:.2f} s")
+
+    def bench_sms_emulator_soak(self, n_sends=2_000, concurrency=200):
+        """Offline OTP send soak through the local Twilio emulator: healthy vs injected errors, throttling and latency spikes"""
+        import asyncio
+        import contextlib
+        import io
+        from services.otp_service import OTPService
+        from services.sms_emulator import SMSEmulator
+        from services.sms_service import SMSRouter, EmulatorProvider
+
+        phases = [
+            ("healthy", dict(latency=0.08, latency_distribution="lognormal", jitter=0.5, spike_rate=0.01,
+                             spike_latency=1.5)),
+            ("degraded", dict(latency=0.08, latency_distribution="lognormal", jitter=0.5, spike_rate=0.01,
+                              spike_latency=1.5, error_rate=0.05, throttle_rate=0.05, max_rps=400)),
+        ]
+        for label, faults in phases:
+            with contextlib.redirect_stdout(io.StringIO()):
+                emulator = SMSEmulator(seed=46, **faults)
+                provider = EmulatorProvider(emulator, max_connections=concurrency)
+                otp_service = OTPService(SMSRouter([provider], max_in_flight=concurrency, max_queue=n_sends))
+
+                async def soak():
+                    semaphore = asyncio.Semaphore(concurrency)
+                    latencies, failures = [], 0
+
+                    async def one(i):
+                        nonlocal failures
+                        async with semaphore:
+                            start = time.perf_counter()
+                            try:
+                                await otp_service.send_otp(f"+9196{i:08d}", "patient_login")
+                            except Exception:
+                                failures += 1
+                            latencies.append((time.perf_counter() - start) * 1e6)
+
+                    start = time.perf_counter()
+                    try:
+                        await asyncio.gather(*(one(i) for i in range(n_sends)))
+                    finally:
+                        await otp_service.sms_router.close()
+                    return latencies, failures, time.perf_counter() - start
+
+                latencies, failures, elapsed = asyncio.run(soak())
+            stats = emulator.get_stats()
+            self.log_result(f"SMS emulator soak - {label}", n_sends / elapsed, "OTPs/s",
+                            f"{n_sends - failures:,}/{n_sends:,} sent, {stats['created']:,} captured, "
+                            f"{stats['throttled']:,} throttled, {stats['errors']:,} errors, "
+                            f"{provider.stats['retries']:,} client retries")
+            self.log_latencies(f"send_otp via emulator - {label}", latencies, f"{concurrency} concurrent")
+
+    def bench_memory_accounting(self, n_entries=200_000):
+        """Memory report cost and accuracy (sampled vs exact), watchdog eviction, tracemalloc overhead"""
+        import contextlib
+        import io
+        import tracemalloc
+        from services.memory_service import MemoryService, process_rss
+
+        now = time.time()
+        rss_before = process_rss() or 0
+        otp_store = {f"+9190{i:08d}": {"otp": f"{i % 900000 + 100000}", "timestamp": now - i * 0.001,
+                                       "type": "login", "attempts": 0} for i in range(n_entries)}
+        patients = {f"+9180{i:08d}": {"id": f"patient_{i}", "name": f"Patient {i}", "email": f"p{i}@example.com",
+                                      "phone": f"+9180{i:08d}", "gender": "Female", "address": "Mumbai",
+                                      "password_hash": "0" * 64, "created_at": now, "version": 1}
+                    for i in range(n_entries)}
+        rss_grown = (process_rss() or 0) - rss_before
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            memory = MemoryService(budgets={"otp_store": 64 * 2 ** 20})
+        memory.register("otp_store", otp_store)
+        memory.register("patients", patients)
+
+        start = time.perf_counter()
+        exact = memory.report(exact=True)
+        exact_time = time.perf_counter() - start
+        exact_bytes = {s["name"]: s["bytes"] for s in exact["stores"]}
+        self.log_result("Memory report - exact", exact_time * 1000, "ms",
+                        f"{2 * n_entries:,} entries, {exact['total_store_bytes'] / 2 ** 20:.0f} MiB measured, "
+                        f"RSS grew {rss_grown / 2 ** 20:.0f} MiB")
+
+        errors = []
+        latencies = []
+        for _ in range(20):
+            start = time.perf_counter()
+            sampled = memory.report()
+            latencies.append((time.perf_counter() - start) * 1e6)
+            errors += [abs(s["bytes"] - exact_bytes[s["name"]]) / exact_bytes[s["name"]] for s in sampled["stores"]]
+        self.log_latencies("Memory report - sampled", latencies,
+                           f"sample {memory.sample_size}, estimate error mean {statistics.mean(errors):.2%}, "
+                           f"max {max(errors):.2%}")
+
+        # Budget at half the store: the watchdog evicts the oldest OTPs down to the low watermark
+        budget = exact_bytes["otp_store"] // 2
+
+        def evict_oldest(count):
+            for phone in sorted(otp_store, key=lambda p: otp_store[p]["timestamp"])[:count]:
+                del otp_store[phone]
+            return count
+
+        memory.register("otp_store", otp_store, evict_oldest)
+        memory.stores["otp_store"].budget = budget
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            alerts = memory.check()
+            check_time = time.perf_counter() - start
+        after = memory.measure("otp_store", exact=True)["bytes"]
+        self.log_result("Memory watchdog - check with eviction", check_time * 1000, "ms",
+                        f"evicted {alerts[0]['evicted']:,}, store at {after / budget:.0%} of budget")
+
+        def churn():
+            scratch = {}
+            for i in range(50_000):
+                scratch[i] = {"otp": str(i), "timestamp": now}
+            return scratch
+
+        start = time.perf_counter()
+        churn()
+        untraced = time.perf_counter() - start
+        with contextlib.redirect_stdout(io.StringIO()):
+            first = memory.take_snapshot()
+            start = time.perf_counter()
+            kept = churn()
+            traced = time.perf_counter() - start
+            start = time.perf_counter()
+            second = memory.take_snapshot()
+            snapshot_time = time.perf_counter() - start
+            diff = memory.diff(first["snapshot_id"], second["snapshot_id"])
+            memory.stop_tracing()
+        del kept
+        self.log_result("tracemalloc - allocation overhead", traced / untraced, "x",
+                        f"{untraced * 1000:.0f} ms untraced vs {traced * 1000:.0f} ms traced")
+        self.log_result("tracemalloc - snapshot", snapshot_time * 1000, "ms",
+                        f"{second['traced_bytes'] / 2 ** 20:.1f} MiB traced, top growth {diff['top'][0]['site'] if diff['top'] else 'none'}")
+
+    def bench_vitals(self, n_readings=1_000_000, queries=50):
+        """Vitals for one patient with 10^6 readings: ingest, compression, downsampled and raw range queries"""
+        import contextlib
+        import io
+        import numpy as np
+        from services.vitals_service import VitalsService, parse_vital
+
+        rng = np.random.default_rng(7)
+        # A reading every ~5 minutes from a wearable scale/monitor: about 9.5 years
+        times = 1_400_000_000 + np.cumsum(rng.integers(240, 360, n_readings))
+        weights = np.round(72 + np.cumsum(rng.normal(0, 0.02, n_readings)), 2)
+        span = int(times[-1] - times[0])
+
+        texts = [f"{w} kg" for w in weights[:100_000].tolist()]
+        start = time.perf_counter()
+        for text in texts:
+            parse_vital("weight", text)
+        self.log_result("Vitals - parse \"65 kg\"", len(texts) / (time.perf_counter() - start), "readings/s")
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            vitals = VitalsService()
+        start = time.perf_counter()
+        for chunk in range(0, n_readings, 10_000):
+            vitals.append_arrays("patient_bench", {"weight": (times[chunk:chunk + 10_000], weights[chunk:chunk + 10_000])})
+        ingest = time.perf_counter() - start
+        stats = vitals.get_stats()
+        self.log_result("Vitals - bulk ingest", n_readings / ingest, "readings/s",
+                        f"{n_readings:,} readings over {span / 86400 / 365:.1f} years in batches of 10,000")
+        self.log_result("Vitals - encoded size", stats["encoded_bytes"] / n_readings, "bytes/reading",
+                        f"{stats['encoded_bytes'] / 2 ** 20:.1f} MiB, {stats['compression_ratio']}x smaller than int64+float64, "
+                        f"{stats['blocks']} blocks")
+
+        self.log_latencies("Vitals - record one reading", self.time_calls(
+            lambda i: vitals.record("patient_single", "weight", "70.5 kg", times[0] + i), [(i,) for i in range(20_000)]))
+
+        def full_history(buckets):
+            return vitals.downsample("patient_bench", "weight", buckets=buckets)
+
+        result = full_history(100)
+        mask = (times - result["start"]) // result["bucket_seconds"] == 50
+        assert result["buckets"][50]["count"] == mask.sum() and result["buckets"][50]["max"] == weights[mask].max()
+        for buckets in (100, 1000):
+            self.log_latencies(f"Vitals - full history, {buckets} buckets", self.time_calls(full_history, [(buckets,)] * queries),
+                               f"{n_readings:,} readings")
+
+        starts = rng.integers(times[0], times[-1] - 365 * 86400, queries)
+        self.log_latencies("Vitals - one year, daily buckets", self.time_calls(
+            lambda s: vitals.downsample("patient_bench", "weight", s, s + 365 * 86400, bucket_seconds=86400), [(s,) for s in starts.tolist()]),
+            "~105,000 readings in range")
+        self.log_latencies("Vitals - one week, raw readings", self.time_calls(
+            lambda s: vitals.get_readings("patient_bench", "weight", s, s + 7 * 86400, limit=5000), [(s,) for s in starts.tolist()]),
+            "~2,000 readings returned")
+
+        # The same full-history query over plain uncompressed arrays, decoding nothing and using no block summaries
+        def plain(buckets):
+            width = -(-(span + 1) // buckets)
+            index = (times - times[0]) // width
+            firsts = np.flatnonzero(np.r_[True, index[1:] != index[:-1]])
+            return np.minimum.reduceat(weights, firsts), np.maximum.reduceat(weights, firsts), np.add.reduceat(weights, firsts)
+
+        self.log_latencies("Vitals - full history, 100 buckets, plain float64 arrays", self.time_calls(plain, [(100,)] * queries),
+                           f"{n_readings * 16 / 2 ** 20:.1f} MiB uncompressed")
+
+    def bench_appointments(self, n_doctors=10_000, group_size=400, queries=500):
+        """First-free-slot search and booking over 10^4 doctors with a year of booked slots each"""
+        import contextlib
+        import io
+        import threading
+        import numpy as np
+        from services.appointment_service import AppointmentService, DoctorCalendar, SlotConflictError
+
+        rng = np.random.default_rng(11)
+        groups = [(f"Specialty {g % 5}", f"City {g // 5}") for g in range(n_doctors // group_size)]
+        doctors = [{"id": f"doctor_b{i}", "name": f"Dr. {i}", "specialization": groups[i % len(groups)][0],
+                    "location": groups[i % len(groups)][1]} for i in range(n_doctors)]
+        with contextlib.redirect_stdout(io.StringIO()):
+            service = AppointmentService(doctors)
+
+        # Every working slot of the coming year; days fill up the nearer they are (95% booked tomorrow, 5% in a year)
+        now = service._align(int(time.time()))
+        slots = []
+        t = service._first_free(None, now, service.slot, now + service.horizon)
+        while t is not None:
+            slots.append(t)
+            t = service._first_free(None, t + service.slot, service.slot, now + service.horizon)
+        slots = np.array(slots, dtype=np.int64)
+        booked_share = 0.9 * np.exp(-(slots - now) / (30 * 86400)) + 0.05
+
+        # Appointments for 10^4 doctors x a year would be ~10^7 dicts, so the calendars are loaded directly
+        calendars = service._calendars = {}
+        start = time.perf_counter()
+        total = 0
+        for doctor in doctors:
+            taken = slots[rng.random(len(slots)) < booked_share]
+            calendar = calendars[doctor["id"]] = DoctorCalendar(doctor["id"])
+            calendar.load(taken, taken + service.slot)
+            total += len(taken)
+        build = time.perf_counter() - start
+        stats = service.get_stats()
+        index_bytes = 16 * stats["runs"]
+        self.log_result("Appointments - calendar bulk load", total / build, "bookings/s",
+                        f"{total:,} booked slots of {len(slots) * n_doctors:,}, merged into {stats['runs']:,} runs "
+                        f"({index_bytes / 2 ** 20:.0f} MiB)")
+
+        def first_free(g, offset):
+            return service.first_free_slot(groups[g][0], groups[g][1], now + offset, 30)
+
+        args = [(int(g), int(o)) for g, o in zip(rng.integers(0, len(groups), queries), rng.integers(0, 60 * 86400, queries))]
+        service.stats.update(searches=0, doctors_scanned=0)
+        self.log_latencies("Appointments - first free slot (cold hints)", self.time_calls(first_free, args),
+                           f"{group_size} doctors per specialization+city, "
+                           f"{service.stats['doctors_scanned'] / service.stats['searches']:.1f} doctors searched per query")
+        args = [(int(g), int(o)) for g, o in zip(rng.integers(0, len(groups), queries), rng.integers(0, 60 * 86400, queries))]
+        service.stats.update(searches=0, doctors_scanned=0)
+        self.log_latencies("Appointments - first free slot (warm hints)", self.time_calls(first_free, args),
+                           f"{service.stats['doctors_scanned'] / service.stats['searches']:.1f} doctors searched per query")
+
+        # The same query over a plain list of booked slots per doctor, stepping slot by slot
+        booked_sets = {d["id"]: set(slots[rng.random(len(slots)) < booked_share].tolist()) for d in doctors[0::len(groups)] + doctors[1::len(groups)]}
+
+        def naive(g, offset):
+            best = None
+            for doctor in doctors[g::len(groups)]:
+                booked = booked_sets.get(doctor["id"])
+                t = service._align(now + offset)
+                while not service._in_hours(t, t + 1800) or t in booked or t + service.slot in booked:
+                    t += service.slot
+                best = t if best is None else min(best, t)
+            return best
+
+        naive_args = [(g % 2, o) for g, o in args[:20]]
+        self.log_latencies("Appointments - first free slot, naive slot scan", self.time_calls(naive, naive_args),
+                           f"{group_size} doctors, every doctor walked slot by slot")
+
+        patients = iter(range(10 ** 9))
+        self.log_latencies("Appointments - book first available", self.time_calls(
+            lambda g, offset: service.book_first_available(groups[g][0], groups[g][1], f"patient_{next(patients)}",
+                                                           now + offset, 30), args[:2000]))
+
+        # Racing threads: each slot goes to exactly one of them
+        winners = []
+        target = service.next_free(doctors[0]["id"], now + 5 * 86400)
+
+        def race():
+            try:
+                winners.append(service.book(doctors[0]["id"], "patient_race", target["start"]))
+            except SlotConflictError:
+                pass
+
+        threads = [threading.Thread(target=race) for _ in range(16)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        def book_many():
+            for _ in range(250):
+                service.book_first_available(groups[0][0], groups[0][1], "patient_load", now + 86400)
+
+        threads = [threading.Thread(target=book_many) for _ in range(4)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        mine = sorted((a["doctor_id"], a["start"], a["end"]) for a in service.appointments.values()
+                      if a["patient_id"] == "patient_load")
+        overlaps = sum(1 for a, b in zip(mine, mine[1:]) if a[0] == b[0] and b[1] < a[2])
+        self.log_result("Appointments - concurrent first-available booking", len(mine) / elapsed, "bookings/s",
+                        f"4 threads, {len(mine)} booked, {overlaps} overlaps; race for one slot: {len(winners)} of 16 won")
+
+    def bench_otp_generator(self, n_codes=1_000_000):
+        """OTP codes/s: random.randint and per-call secrets vs the pooled generator, plus digit uniformity"""
+        import contextlib
+        import io
+        import random
+        import secrets
+        import numpy as np
+        from services.otp_generator import OTPGenerator
+
+        def chi_square(counts):
+            """Statistic and its p = 0.001 critical value (Wilson-Hilferty) for uniform counts"""
+            expected = counts.sum() / len(counts)
+            df = len(counts) - 1
+            critical = df * (1 - 2 / (9 * df) + 3.09 * (2 / (9 * df)) ** 0.5) ** 3
+            return float(((counts - expected) ** 2 / expected).sum()), critical
+
+        def digit_uniformity(codes):
+            """Worst per-position chi-square over the digits, and chi-square over the first three digits"""
+            digits = (np.frombuffer("".join(codes).encode(), dtype=np.uint8) - 48).reshape(len(codes), -1).astype(np.int64)
+            positions = [chi_square(np.bincount(digits[:, p], minlength=10)) for p in range(digits.shape[1])]
+            prefixes = chi_square(np.bincount(digits[:, 0] * 100 + digits[:, 1] * 10 + digits[:, 2], minlength=1000))
+            return max(positions), prefixes
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            generator = OTPGenerator(length=6, alphabet="0123456789")
+        candidates = [
+            ("random.randint", lambda: str(random.randint(100000, 999999))),
+            ("secrets per call", lambda: f"{secrets.randbelow(1_000_000):06d}"),
+            ("pooled generator", generator.next_code),
+        ]
+        samples = {}
+        for name, generate in candidates:
+            start = time.perf_counter()
+            codes = [generate() for _ in range(n_codes)]
+            elapsed = time.perf_counter() - start
+            samples[name] = codes
+            self.log_result(f"OTP generation - {name}", n_codes / elapsed, "codes/s", f"{n_codes:,} codes")
+
+        self.log_latencies("OTP generation - pooled next_code", self.time_calls(generator.next_code, [()] * 100_000),
+                           f"pools from {generator.buffer_size:,}-byte reads")
+        stats = generator.get_stats()
+        self.log_result("OTP generation - rejected bytes", stats["rejection_rate"] * 100, "%",
+                        f"{stats['background_refills']} background / {stats['sync_refills']} sync refills")
+
+        for name in ("random.randint", "pooled generator"):
+            (position, position_critical), (prefix, prefix_critical) = digit_uniformity(samples[name])
+            distinct = len(set(samples[name]))
+            # Draws from all 10^6 codes should leave about n(1 - e^-1) distinct
+            expected = 10 ** 6 * (1 - (1 - 10 ** -6) ** n_codes)
+            self.log_result(f"OTP uniformity - {name} worst digit position", position, "chi²",
+                            f"p=0.001 critical {position_critical:.1f}, "
+                            f"{'uniform' if position < position_critical else 'NOT uniform'}")
+            self.log_result(f"OTP uniformity - {name} 3-digit prefixes", prefix, "chi²",
+                            f"p=0.001 critical {prefix_critical:.1f}, {distinct:,} distinct codes, "
+                            f"~{expected:,.0f} expected")
+
+    def run_all_benchmarks(self):
+        """Run all backend benchmarks"""
+        print("🔍 Starting MediSync Backend Benchmarks...")
+        print("=" * 60)
+
+        self.bench_hospital_index()
+        self.bench_symptom_matcher()
+        self.bench_chat_streaming()
+        self.bench_doctor_search()
+        self.bench_pathology_ingest()
+        self.bench_consent_waiters()
+        self.bench_session_tokens()
+        self.bench_profile_reads()
+        self.bench_request_timing()
+        self.bench_sms_routing()
+        self.bench_sms_admission()
+        self.bench_delivery_callbacks()
+        self.bench_abuse_sketch()
+        self.bench_state_restart()
+        self.bench_twilio_transport()
+        self.bench_otp_lock_striping()
+        self.bench_idempotent_retries()
+        self.bench_patient_export()
+        self.bench_record_search()
+        self.bench_event_bus()
+        self.bench_sms_emulator_soak()
+        self.bench_memory_accounting()
+        self.bench_vitals()
+        self.bench_appointments()
+        self.bench_otp_generator()
+
+        print("\n" + "=" * 60)
+        print(f"📊 Benchmark Summary: {len(self.results)} measurements recorded")
+        return True
+
+def main():
+    """Main benchmark execution"""
+    benchmark = MediSyncBenchmark()
+    benchmark.run_all_benchmarks()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -11,6 +11,40 @@ const handleApiError = (error) => {
   throw new Error(error.message || 'An error occurred');
 };
 
+// Over a phone-prefix abuse limit the backend asks for proof of work instead of
+// blocking: find a suffix whose SHA-256 starts with the requested zero bits
+const solveAbuseChallenge = async (token) => {
+  const bits = parseInt(token.split('.')[0], 10);
+  if (!(bits >= 0 && bits <= 32)) {
+    throw new Error('Unexpected abuse challenge');
+  }
+  const encoder = new TextEncoder();
+  for (let i = 0; ; i++) {
+    const answer = `${token}:${i.toString(36)}`;
+    const digest = new Uint8Array(await crypto.subtle.digest('SHA-256', encoder.encode(answer)));
+    let zeros = 0;
+    for (const byte of digest) {
+      if (byte !== 0) {
+        zeros += Math.clz32(byte) - 24;
+        break;
+      }
+      zeros += 8;
+    }
+    if (zeros >= bits) {
+      return answer;
+    }
+  }
+};
+
+// Access token from the last OTP login or signup, sent as a Bearer token on every call
+const ACCESS_TOKEN_KEY = 'medisync-access-token';
+
+const storeSession = (result) => {
+  if (result.tokens && result.tokens.access_token) {
+    localStorage.setItem(ACCESS_TOKEN_KEY, result.tokens.access_token);
+  }
+};
+
 // Utility function to make API calls
 const apiCall = async (endpoint, method = 'GET', data = null) => {
   const url = `${BACKEND_URL}${endpoint}`;
@@ -22,12 +56,22 @@ const apiCall = async (endpoint, method = 'GET', data = null) => {
     },
   };
   
+  const accessToken = localStorage.getItem(ACCESS_TOKEN_KEY);
+  if (accessToken) {
+    options.headers['Authorization'] = `Bearer ${accessToken}`;
+  }
+  
   if (data) {
     options.body = JSON.stringify(data);
   }
   
   try {
-    const response = await fetch(url, options);
+    let response = await fetch(url, options);
+    const challenge = response.headers.get('X-Abuse-Challenge');
+    if (response.status === 429 && challenge) {
+      options.headers['X-Abuse-Challenge-Response'] = await solveAbuseChallenge(challenge);
+      response = await fetch(url, options);
+    }
     const result = await response.json();
     
     if (!response.ok) {
@@ -64,6 +108,7 @@ export async function verifyOtp(phoneOrId, otp) {
       phone: phoneOrId,
       otp: otp
     });
+    storeSession(result);
     
     return result.user_data;
   } catch (error) {
@@ -90,6 +135,7 @@ export async function verifySignupOtp(phone, otp) {
       phone: phone,
       otp: otp
     });
+    storeSession(result);
     
     return result.user_data;
   } catch (error) {
@@ -122,6 +168,7 @@ export async function verifyDoctorOtp(doctorId, otp) {
       phone: doctorId,
       otp: otp
     });
+    storeSession(result);
     
     return { doctor: result.user_data };
   } catch (error) {
@@ -148,6 +195,7 @@ export async function verifyDoctorSignupOtp(phone, otp) {
       phone: phone,
       otp: otp
     });
+    storeSession(result);
     
     return { doctor: result.user_data };
   } catch (error) {
@@ -272,79 +320,81 @@ export async function uploadRecord(patientId, record) {
 
 // Enhanced AI Chat
 export async function askAI(message) {
-  console.log("Mock: AI Query:", message);
-  
-  const responses = {
-    'fever': "Based on your symptoms, you might have a viral infection. Monitor your temperature, stay hydrated, and rest. If fever persists above 100.4°F (38°C) for more than 3 days, consult a doctor.",
-    'headache': "Headaches can have various causes. Try rest, hydration, and over-the-counter pain relievers. If severe or persistent, or accompanied by vision changes, seek medical attention.",
-    'cough': "A persistent cough could indicate respiratory infection. Stay hydrated, use honey for throat relief. If cough persists more than 2 weeks or accompanied by blood, consult a healthcare provider.",
-    'chest pain': "Chest pain should be taken seriously. If sudden, severe, or accompanied by shortness of breath, sweating, or nausea, seek immediate medical attention.",
-    'stomach': "For stomach discomfort, try bland foods, stay hydrated, and avoid spicy foods. If severe pain, vomiting, or fever occurs, consult a doctor.",
-    'default': "I understand you're concerned about your health. While I can provide general information, it's important to consult with a healthcare professional for proper diagnosis and treatment. Would you like me to help you find nearby medical facilities?"
-  };
-
-  const lowerMessage = message.toLowerCase();
-  let response = responses.default;
+  console.log("Real API: AI Query:", message);
   
-  for (const [keyword, reply] of Object.entries(responses)) {
-    if (lowerMessage.includes(keyword) && keyword !== 'default') {
-      response = reply;
-      break;
-    }
+  try {
+    const result = await apiCall('/api/ai/symptom-check', 'POST', {
+      message
+    });
+    
+    return result;
+  } catch (error) {
+    throw new Error(error.message || 'Failed to get AI response');
   }
+}
 
-  return new Promise((resolve) => {
-    setTimeout(() => resolve({ response }), 1000);
+// Streaming AI Chat (Server-Sent Events)
+export function streamAI(message, { onDelta, onDone, onError } = {}) {
+  const params = new URLSearchParams({ message });
+  const source = new EventSource(`${BACKEND_URL}/api/ai/chat/stream?${params.toString()}`);
+  
+  source.onmessage = (event) => {
+    const data = JSON.parse(event.data);
+    if (onDelta) onDelta(data.delta);
+  };
+  source.addEventListener('done', () => {
+    source.close();
+    if (onDone) onDone();
   });
+  source.addEventListener('error', (event) => {
+    source.close();
+    const detail = event.data ? JSON.parse(event.data).message : 'Chat stream interrupted';
+    if (onError) onError(new Error(detail));
+  });
+  
+  // Closing the stream cancels the response on the server
+  return () => source.close();
 }
 
 // Enhanced Hospital finder
-export async function getHospitals(lat, lng) {
+export async function getHospitals(lat, lng, specialty = null) {
   if (typeof lat !== 'number' || typeof lng !== 'number') {
     return [];
   }
   
-  return [
-    { 
-      name: 'City General Hospital', 
-      address: '123 Main Street, Downtown', 
-      phone: '+1-555-0101',
-      distance: '0.8 km',
-      specialty: 'Emergency Care, General Medicine',
-      rating: '4.5/5'
-    },
-    { 
-      name: 'St. Mary\'s Medical Center', 
-      address: '456 Oak Avenue, Midtown', 
-      phone: '+1-555-0202',
-      distance: '1.2 km',
-      specialty: 'Cardiology, Emergency Care',
-      rating: '4.7/5'
-    },
-    { 
-      name: 'Green Valley Emergency Clinic', 
-      address: '789 Pine Road, Suburbs', 
-      phone: '+1-555-0303',
-      distance: '2.1 km',
-      specialty: '24/7 Emergency, Urgent Care',
-      rating: '4.3/5'
-    },
-    { 
-      name: 'Metro Health Complex', 
-      address: '321 Elm Street, City Center', 
-      phone: '+1-555-0404',
-      distance: '2.8 km',
-      specialty: 'Multi-Specialty Hospital',
-      rating: '4.6/5'
-    }
-  ];
+  const params = new URLSearchParams({ lat, lng, limit: 10 });
+  if (specialty) {
+    params.append('specialty', specialty);
+  }
+  
+  try {
+    const result = await apiCall(`/api/hospitals/nearby?${params.toString()}`);
+    return result.hospitals;
+  } catch (error) {
+    throw new Error(error.message || 'Failed to fetch nearby hospitals');
+  }
 }
 
 // Keep existing doctor API functions for other features
 export const requestPatientConsent = async (patientId) => {
-  console.debug("Mock: request consent for patient", patientId);
-  await new Promise(r => setTimeout(r, 2000));
-  return Promise.resolve({ patient: { id: patientId, name: "John Smith" } });
+  console.debug("Real API: request consent for patient", patientId);
+  
+  // The requesting doctor is taken from the signed-in session
+  const created = await apiCall('/api/consent/requests', 'POST', {
+    patient_id: patientId
+  });
+  
+  // Long-poll: each call returns as soon as the patient decides, or after ~25s
+  let consent = created.request;
+  while (consent.status === 'pending') {
+    const result = await apiCall(`/api/consent/requests/${consent.id}/wait?timeout=25`);
+    consent = result.request;
+  }
+  
+  if (consent.status !== 'approved') {
+    throw new Error(`Consent ${consent.status}`);
+  }
+  return { patient: { id: patientId }, consent };
 };
 
 export const fetchRecords = async (doctorId, patientId) => {